@@ -1,10 +1,12 @@
 from urllib.request import urlopen
 from bs4 import BeautifulSoup
+from crawlFrontier import CrawlFrontier
 import re
 
-pages = set()
+#Pages to visit and visited pages are kept on disk, the crawl goes on after a restart
+frontierFile = "wikipediaFrontier.sqlite"
+
 def getLinks(pageUrl):
-    global pages
     html = urlopen("http://en.wikipedia.org"+pageUrl)
     bsObj = BeautifulSoup(html, "html.parser")
     try:
@@ -13,13 +15,14 @@ def getLinks(pageUrl):
         print(bsObj.find(id="ca-edit").find("span").find("a").attrs['href'])
     except AttributeError:
         print("This page is missing something! No worries though!")
-    
-    for link in bsObj.findAll("a", href=re.compile("^(/wiki/)")):
-        if 'href' in link.attrs:
-            if link.attrs['href'] not in pages:
+    return [link.attrs['href'] for link in bsObj.findAll("a", href=re.compile("^(/wiki/)"))]
+
+with CrawlFrontier(frontierFile) as pages:
+    pages.push("")
+    pageUrl = pages.pop()
+    while pageUrl is not None:
+        for newPage in getLinks(pageUrl):
+            if pages.push(newPage):
                 #We have encountered a new page
-                newPage = link.attrs['href']
                 print("----------------\n"+newPage)
-                pages.add(newPage)
-                getLinks(newPage)
-getLinks("") 
\ No newline at end of file
+        pageUrl = pages.pop()
@@ -1,7 +1,7 @@
-from urllib.request import urlopen
-from urllib.parse import urlparse
+from urllib.request import Request, urlopen
 from bs4 import BeautifulSoup
-import re
+from linkExtractor import LinkExtractor, canonicalUrl, getLinks
+from politeScheduler import PoliteScheduler, userAgent
 import datetime
 import random
 
@@ -9,68 +9,63 @@ pages = set()
 random.seed(datetime.datetime.now())
 
 #Retrieves a list of all Internal links found on a page
-def getInternalLinks(bsObj, includeUrl):
-    includeUrl = urlparse(includeUrl).scheme+"://"+urlparse(includeUrl).netloc
-    internalLinks = []
-    #Finds all links that begin with a "/"
-    for link in bsObj.findAll("a", href=re.compile("^(/|.*"+includeUrl+")")):
-        if link.attrs['href'] is not None:
-            if link.attrs['href'] not in internalLinks:
-                if(link.attrs['href'].startswith("/")):
-                    internalLinks.append(includeUrl+link.attrs['href'])
-                else:
-                    internalLinks.append(link.attrs['href'])
-    return internalLinks
+def getInternalLinks(bsObj, pageUrl):
+    return getLinks(bsObj, pageUrl)[0]
             
 #Retrieves a list of all external links found on a page
-def getExternalLinks(bsObj, excludeUrl):
-    externalLinks = []
-    #Finds all links that start with "http" or "www" that do
-    #not contain the current URL
-    for link in bsObj.findAll("a", href=re.compile("^(http|www)((?!"+excludeUrl+").)*$")):
-        if link.attrs['href'] is not None:
-            if link.attrs['href'] not in externalLinks:
-                externalLinks.append(link.attrs['href'])
-    return externalLinks
+def getExternalLinks(bsObj, pageUrl):
+    return getLinks(bsObj, pageUrl)[1]
 
 
-def getRandomExternalLink(startingPage):
-    html = urlopen(startingPage)
-    bsObj = BeautifulSoup(html, "html.parser")
-    externalLinks = getExternalLinks(bsObj, urlparse(startingPage).netloc)
-    if len(externalLinks) == 0:
-        print("No external links, looking around the site for one")
-        domain = urlparse(startingPage).scheme+"://"+urlparse(startingPage).netloc
-        internalLinks = getInternalLinks(bsObj, domain)
-        return getRandomExternalLink(internalLinks[random.randint(0,len(internalLinks)-1)])
-    else:
-        return externalLinks[random.randint(0, len(externalLinks)-1)]
-    
+def getPage(url):
+    request = Request(url, headers={"User-Agent": userAgent})
+    with urlopen(request, timeout=10) as response:
+        return response.read().decode(response.headers.get_content_charset() or "utf-8", "replace")
+
+#Random walk over sites: the scheduler checks robots.txt and waits for the crawl delay of the site
 def followExternalOnly(startingSite):
-    externalLink = getRandomExternalLink(startingSite)
-    print("Random external link is: "+externalLink)
-    followExternalOnly(externalLink)
+    walk = PoliteScheduler(getPage, concurrency=1)
+    walk.add(startingSite)
+    for pageUrl, html, error in walk.results():
+        if error is not None:
+            print("Can't get "+pageUrl+": "+str(error))
+            continue
+        internalLinks, externalLinks = getLinks(BeautifulSoup(html, "html.parser"), pageUrl)
+        if len(externalLinks) > 0:
+            nextLink = externalLinks[random.randint(0, len(externalLinks)-1)]
+            print("Random external link is: "+nextLink)
+        elif len(internalLinks) > 0:
+            print("No external links, looking around the site for one")
+            nextLink = internalLinks[random.randint(0, len(internalLinks)-1)]
+        else:
+            continue
+        walk.add(nextLink)
+    print("The walk has stopped, pages disallowed by robots.txt: "+str(walk.disallowed))
             
 #Collects a list of all external URLs found on the site
 allExtLinks = set()
 allIntLinks = set()
 def getAllExternalLinks(siteUrl):
-    html = urlopen(siteUrl)
-    domain = urlparse(siteUrl).scheme+"://"+urlparse(siteUrl).netloc
-    bsObj = BeautifulSoup(html, "html.parser")
-    internalLinks = getInternalLinks(bsObj,domain)
-    externalLinks = getExternalLinks(bsObj,domain)
+    siteLinks = LinkExtractor(siteUrl)
+    crawl = PoliteScheduler(getPage)
+    allIntLinks.add(canonicalUrl(siteUrl, siteUrl))
+    crawl.add(siteUrl)
+    for pageUrl, html, error in crawl.results():
+        if error is not None:
+            print("Can't get "+pageUrl+": "+str(error))
+            continue
+        #Document tree isn't needed here, only the links
+        internalLinks, externalLinks = siteLinks.linksFromHtml(html, pageUrl)
 
-    for link in externalLinks:
-        if link not in allExtLinks:
-            allExtLinks.add(link)
-            print(link)
-    for link in internalLinks:
-        if link not in allIntLinks:
-            allIntLinks.add(link)
-            getAllExternalLinks(link)
+        for link in externalLinks:
+            if link not in allExtLinks:
+                allExtLinks.add(link)
+                print(link)
+        for link in internalLinks:
+            if link not in allIntLinks:
+                allIntLinks.add(link)
+                crawl.add(link)
 
 followExternalOnly("http://oreilly.com")
 
-allIntLinks.add("http://oreilly.com")
 getAllExternalLinks("http://oreilly.com")
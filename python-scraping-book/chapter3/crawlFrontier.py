@@ -0,0 +1,178 @@
+"""
+Persistent crawl frontier for crawlers that visit millions of pages.
+
+URLs to visit are kept in a SQLite table (FIFO, or by priority first), not in memory. Seen URLs
+(every URL pushed once) are kept in a scalable Bloom filter: a chain of Bloom filters where each
+next one is twice larger and has a tighter error rate, so the false positive rate stays below
+errorRate however many URLs are added (Almeida et al., "Scalable Bloom Filters"). Memory is about
+2 bytes per seen URL for errorRate=0.001. A false positive means a new URL is taken for a seen one
+and isn't crawled.
+
+The queue and the filter are saved in the same file and committed together every checkpointEvery
+operations (and at close), so after a restart the crawl goes on from the last checkpoint: pages
+popped after it are popped again, links pushed after it are pushed again. Bits of the Bloom filter
+change in random places, so a checkpoint rewrites the whole last filter (the older ones are full and
+don't change) - checkpoints shouldn't be too frequent.
+"""
+import math
+import sqlite3
+import hashlib
+
+
+class BloomFilter:
+    """Bloom filter for capacity items with the false positive rate errorRate."""
+    def __init__(self, capacity, errorRate, bits=None, count=0):
+        self.capacity = capacity
+        self.errorRate = errorRate
+        self.numBits = max(8, int(math.ceil(-capacity * math.log(errorRate) / math.log(2) ** 2)))
+        self.numHashes = max(1, int(round(self.numBits / capacity * math.log(2))))
+        self.bits = bytearray((self.numBits + 7) // 8) if bits is None else bytearray(bits)
+        self.count = count
+
+    def positions(self, hashes):
+        #Double hashing: k positions from two 64-bit hashes
+        h1, h2 = hashes
+        numBits = self.numBits
+        return [(h1 + i * h2) % numBits for i in range(self.numHashes)]
+
+    def contains(self, hashes):
+        bits = self.bits
+        for position in self.positions(hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, hashes):
+        bits = self.bits
+        for position in self.positions(hashes):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+def itemHashes(item):
+    digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class ScalableBloomFilter:
+    """Bloom filter that grows: a new filter is added when the last one is full."""
+    growth = 2
+    tightening = 0.9
+
+    def __init__(self, capacity=100000, errorRate=0.001, filters=None):
+        self.initialCapacity = capacity
+        self.errorRate = errorRate
+        self.filters = filters or []
+        #Indexes of filters changed since the last save
+        self.changed = set()
+
+    def __contains__(self, item):
+        hashes = itemHashes(item)
+        return any(bloom.contains(hashes) for bloom in reversed(self.filters))
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def add(self, item):
+        """Adds the item, returns False if it's already (probably) in the filter."""
+        hashes = itemHashes(item)
+        for bloom in reversed(self.filters):
+            if bloom.contains(hashes):
+                return False
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            level = len(self.filters)
+            #Errors of the filters are a geometric series, their sum is below errorRate
+            self.filters.append(BloomFilter(self.initialCapacity * self.growth ** level,
+                                            self.errorRate * (1 - self.tightening) * self.tightening ** level))
+        self.filters[-1].add(hashes)
+        self.changed.add(len(self.filters) - 1)
+        return True
+
+    def memorySize(self):
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+
+class CrawlFrontier:
+    """Queue of URLs to visit and the set of seen URLs, saved in the SQLite file path."""
+    def __init__(self, path, capacity=100000, errorRate=0.001, checkpointEvery=10000):
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS frontier (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                                 url TEXT NOT NULL, priority INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS frontierOrder ON frontier (priority, id);
+            CREATE TABLE IF NOT EXISTS bloomFilters (level INTEGER PRIMARY KEY, capacity INTEGER,
+                                                     errorRate REAL, count INTEGER, bits BLOB);
+            CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value);
+        """)
+        settings = dict(self.connection.execute("SELECT name, value FROM settings"))
+        #Filter parameters of the existing frontier can't be changed
+        capacity = settings.get("capacity", capacity)
+        errorRate = settings.get("errorRate", errorRate)
+        filters = [BloomFilter(filterCapacity, filterErrorRate, bits, count)
+                   for filterCapacity, filterErrorRate, count, bits in self.connection.execute(
+                       "SELECT capacity, errorRate, count, bits FROM bloomFilters ORDER BY level")]
+        self.seen = ScalableBloomFilter(capacity, errorRate, filters)
+        self.size = self.connection.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+        self.checkpointEvery = checkpointEvery
+        self.operations = 0
+        self.connection.execute("BEGIN")
+        self.connection.executemany("INSERT OR IGNORE INTO settings (name, value) VALUES (?, ?)",
+                                    [("capacity", capacity), ("errorRate", errorRate)])
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, url):
+        return url in self.seen
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def push(self, url, priority=0):
+        """Adds the URL if it wasn't seen before, returns True if it was added.
+        URLs with lower priority are popped first, URLs with the same priority - in FIFO order."""
+        if not self.seen.add(url):
+            return False
+        self.connection.execute("INSERT INTO frontier (url, priority) VALUES (?, ?)", (url, priority))
+        self.size += 1
+        self.tick()
+        return True
+
+    def pop(self):
+        """Takes the next URL to visit, None if the frontier is empty."""
+        row = self.connection.execute("SELECT id, url FROM frontier ORDER BY priority, id LIMIT 1").fetchone()
+        if row is None:
+            return None
+        self.connection.execute("DELETE FROM frontier WHERE id = ?", (row[0],))
+        self.size -= 1
+        self.tick()
+        return row[1]
+
+    def tick(self):
+        self.operations += 1
+        if self.operations >= self.checkpointEvery:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Saves changed filters and commits the queue with them."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO bloomFilters (level, capacity, errorRate, count, bits) VALUES (?, ?, ?, ?, ?)",
+            [(level, self.seen.filters[level].capacity, self.seen.filters[level].errorRate,
+              self.seen.filters[level].count, bytes(self.seen.filters[level].bits))
+             for level in sorted(self.seen.changed)])
+        self.connection.execute("COMMIT")
+        self.seen.changed.clear()
+        self.operations = 0
+        self.connection.execute("BEGIN")
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.checkpoint()
+        self.connection.execute("COMMIT")
+        self.connection.close()
+        self.connection = None
@@ -0,0 +1,86 @@
+"""
+Benchmark of crawlFrontier on a simulated crawl: every popped page has 20 links, a quarter of them
+are new pages. Reports speed, size of the seen-set (Bloom filter vs Python set of the same URLs),
+peak memory of the process, measured false positive rate and checks that the frontier is the same
+after a restart.
+
+Usage: python frontierBenchmark.py [seen URLs]   (default: 2000000)
+"""
+import os
+import math
+import sys
+import time
+import random
+import resource
+import tempfile
+from crawlFrontier import CrawlFrontier
+
+linksPerPage = 20
+
+
+def pageUrl(number):
+    return "/wiki/Article_{}_{}".format(number, number * 7919 % 100003)
+
+
+def crawl(frontier, seenUrls):
+    #Links go to new pages and to the pages seen before
+    rnd = random.Random(1)
+    pushed = len(frontier.seen)
+    nextPage = pushed
+    while pushed < seenUrls:
+        page = frontier.pop()
+        if page is None and pushed:
+            break
+        for i in range(linksPerPage):
+            if i % 4 == 0 or not nextPage:
+                number = nextPage
+                nextPage += 1
+            else:
+                number = rnd.randrange(nextPage)
+            if frontier.push(pageUrl(number)):
+                pushed += 1
+    return pushed
+
+
+def main():
+    seenUrls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    path = os.path.join(tempfile.mkdtemp(prefix="frontier"), "frontier.sqlite")
+    try:
+        frontier = CrawlFrontier(path)
+        start = time.perf_counter()
+        pushed = crawl(frontier, seenUrls)
+        seconds = time.perf_counter() - start
+        print("seen URLs:            {}".format(pushed))
+        print("in queue:             {}".format(len(frontier)))
+        print("pages per second:     {:.0f} ({} links each)".format(pushed / (linksPerPage // 4) / seconds,
+                                                                  linksPerPage))
+        print("Bloom filter, MB:     {:.1f} ({} filters)".format(frontier.seen.memorySize() / 2 ** 20,
+                                                                 len(frontier.seen.filters)))
+        print("peak RSS, MB:         {:.1f}".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+        #A set keeps the strings and a hash table of 16-byte entries, at most 60% full
+        urlsSize = sum(sys.getsizeof(pageUrl(number)) for number in range(0, pushed, 100)) * 100
+        tableSize = 16 * 2 ** math.ceil(math.log2(pushed / 0.6))
+        print("set of URLs, MB:      {:.1f} (estimate)".format((urlsSize + tableSize) / 2 ** 20))
+        probes = 200000
+        falsePositives = sum(1 for number in range(probes) if "/wiki/Unseen_{}".format(number) in frontier)
+        print("false positive rate:  {:.5f} (errorRate {})".format(falsePositives / probes, frontier.seen.errorRate))
+        queued = len(frontier)
+        frontier.close()
+
+        start = time.perf_counter()
+        frontier = CrawlFrontier(path)
+        print("reopen, s:            {:.2f}".format(time.perf_counter() - start))
+        assert len(frontier) == queued
+        assert all(pageUrl(number) in frontier for number in range(0, pushed, 997))
+        assert not frontier.push(pageUrl(0))
+        frontier.close()
+        print("file, MB:             {:.1f}".format(os.path.getsize(path) / 2 ** 20))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
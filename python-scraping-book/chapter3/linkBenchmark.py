@@ -0,0 +1,88 @@
+"""
+Benchmark of link extraction on pages with many anchors: the previous functions of this chapter
+(regular expression compiled for every call, list lookups for duplicates) vs linkExtractor
+(sets, urljoin canonicalization) on the BeautifulSoup tree and on the raw HTML.
+
+Usage: python linkBenchmark.py [anchors ...]   (default: 10000 50000)
+"""
+import re
+import sys
+import time
+import random
+from bs4 import BeautifulSoup
+from linkExtractor import LinkExtractor
+
+pageUrl = "http://www.site.com/dir/page.html"
+hrefTemplates = [
+    "/articles/{}", "articles/{}#comments", "../docs/{}?page=2", "http://site.com/items/{}",
+    "http://WWW.site.com:80/items/{}", "https://site.com/secure/{}", "www.site.com/old/{}",
+    "http://other{}.org/", "https://cdn.net/files/{}.js", "www.partner.com/ref/{}",
+    "mailto:user{}@site.com", "#section{}", "javascript:show({})",
+]
+
+
+def makePage(anchors, seed=1):
+    #About a half of the anchors repeat links that are already on the page
+    rnd = random.Random(seed)
+    distinct = anchors // 2
+    links = []
+    for i in range(anchors):
+        number = rnd.randrange(distinct) if i >= distinct else i
+        links.append('<li><a class="link" href="{}">link {}</a></li>'.format(
+            rnd.choice(hrefTemplates).format(number), i))
+    return "<html><head><title>Links</title></head><body><ul>\n{}\n</ul></body></html>".format(
+        "\n".join(links))
+
+
+#Previous functions of 4-getExternalLinks.py
+def oldInternalLinks(bsObj, includeUrl):
+    internalLinks = []
+    for link in bsObj.find_all("a", href=re.compile("^(/|.*"+includeUrl+")")):
+        if link.attrs['href'] is not None:
+            if link.attrs['href'] not in internalLinks:
+                if(link.attrs['href'].startswith("/")):
+                    internalLinks.append(includeUrl+link.attrs['href'])
+                else:
+                    internalLinks.append(link.attrs['href'])
+    return internalLinks
+
+
+def oldExternalLinks(bsObj, excludeUrl):
+    externalLinks = []
+    for link in bsObj.find_all("a", href=re.compile("^(http|www)((?!"+excludeUrl+").)*$")):
+        if link.attrs['href'] is not None:
+            if link.attrs['href'] not in externalLinks:
+                externalLinks.append(link.attrs['href'])
+    return externalLinks
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 50000]
+    extractor = LinkExtractor(pageUrl)
+    print("{:>8} {:<34} {:>10} {:>10} {:>10} {:>10}".format(
+        "anchors", "method", "links, ms", "total, ms", "internal", "external"))
+    for anchors in sizes:
+        html = makePage(anchors)
+        parseTime, bsObj = timed(lambda: BeautifulSoup(html, "html.parser"))
+        methods = [
+            ("regex + list (old, tree built)", lambda: (oldInternalLinks(bsObj, "http://www.site.com"),
+                                                        oldExternalLinks(bsObj, "www.site.com"))),
+            ("linkExtractor (tree built)", lambda: extractor.linksFromSoup(bsObj, pageUrl)),
+            ("linkExtractor (raw html)", lambda: extractor.linksFromHtml(html, pageUrl)),
+        ]
+        for name, method in methods:
+            seconds, (internalLinks, externalLinks) = timed(method)
+            #Total time includes building of the tree if the method needs it
+            total = seconds + (parseTime if "tree" in name else 0)
+            print("{:>8} {:<34} {:>10.1f} {:>10.1f} {:>10} {:>10}".format(
+                anchors, name, seconds * 1000, total * 1000, len(internalLinks), len(externalLinks)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Link extraction for the crawlers of this chapter.
+
+Every href is turned into a canonical absolute URL: it is joined with the page URL (or <base href>),
+fragment is removed, scheme and host are lowercased, default port and "www." are removed and empty
+path becomes "/". So "/about", "about#team", "http://WWW.Site.com:80/about" on the page
+http://site.com/ are the same link. Links are deduplicated with sets (order of the page is kept) and
+classified as internal (same host as the page) or external.
+"""
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+#Only web pages are followed (no mailto:, javascript:, tel: ...)
+followedSchemes = {"http", "https"}
+defaultPorts = {"http": "80", "https": "443"}
+#"www." of host; links like "www.site.com/page" (no scheme) are absolute, not relative
+wwwPrefix = re.compile(r"^www\.", re.IGNORECASE)
+
+
+def canonicalHost(scheme, netloc):
+    netloc = netloc.lower()
+    host, colon, port = netloc.rpartition(":")
+    if colon and port in ("", defaultPorts.get(scheme)):
+        netloc = host
+    return wwwPrefix.sub("", netloc)
+
+
+def canonicalUrl(href, baseUrl):
+    """Canonical absolute URL for the href on the page with baseUrl, None if link isn't followed."""
+    href = href.strip()
+    if not href or href.startswith("#"):
+        return None
+    if wwwPrefix.match(href):
+        href = "http://" + href
+    scheme, netloc, path, query, fragment = urlsplit(urljoin(baseUrl, href))
+    scheme = scheme.lower()
+    if scheme not in followedSchemes or not netloc:
+        return None
+    return urlunsplit((scheme, canonicalHost(scheme, netloc), path or "/", query, ""))
+
+
+class LinkExtractor:
+    """Extracts links of pages of one site (host of siteUrl)."""
+    def __init__(self, siteUrl):
+        parts = urlsplit(canonicalUrl(siteUrl, siteUrl) or siteUrl)
+        self.siteHost = parts.netloc
+
+    def extract(self, hrefs, pageUrl):
+        """Returns (internal links, external links) for the hrefs of the page, without duplicates."""
+        internalLinks = []
+        externalLinks = []
+        seenHrefs = set()
+        seenUrls = set()
+        for href in hrefs:
+            #The same href on the page gives the same URL - it is joined only once
+            if href is None or href in seenHrefs:
+                continue
+            seenHrefs.add(href)
+            url = canonicalUrl(href, pageUrl)
+            if url is None or url in seenUrls:
+                continue
+            seenUrls.add(url)
+            if urlsplit(url).netloc == self.siteHost:
+                internalLinks.append(url)
+            else:
+                externalLinks.append(url)
+        return internalLinks, externalLinks
+
+    def linksFromSoup(self, bsObj, pageUrl):
+        base = bsObj.find("base", href=True)
+        if base is not None:
+            pageUrl = urljoin(pageUrl, base.attrs["href"])
+        return self.extract((link.attrs["href"] for link in bsObj.find_all("a", href=True)), pageUrl)
+
+    def linksFromHtml(self, html, pageUrl):
+        """The same as linksFromSoup() without building of the document tree (much faster)."""
+        parser = AnchorParser()
+        parser.feed(html)
+        parser.close()
+        if parser.base is not None:
+            pageUrl = urljoin(pageUrl, parser.base)
+        return self.extract(parser.hrefs, pageUrl)
+
+
+class AnchorParser(HTMLParser):
+    """Collects href of <a> tags and <base href> of the page."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+        self.base = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href":
+                    self.hrefs.append(value)
+                    break
+        elif tag == "base" and self.base is None:
+            for name, value in attrs:
+                if name == "href":
+                    self.base = value
+                    break
+
+
+def getLinks(bsObj, pageUrl):
+    """Returns (internal links, external links) of the page."""
+    return LinkExtractor(pageUrl).linksFromSoup(bsObj, pageUrl)
@@ -0,0 +1,175 @@
+"""
+Polite crawling of many sites at once.
+
+Every site (scheme and host of URL) has its own queue of URLs. A site has at most one request at a
+time, and the next request starts not earlier than crawl delay after the previous one has finished:
+the Crawl-delay (or Request-rate) of its robots.txt, but not less than defaultDelay. Sites that may
+be requested are served in the order of the time they became ready, so the requests go round-robin
+across sites and up to concurrency requests run at once. URLs disallowed by robots.txt aren't
+requested. Parsed robots.txt files are kept in an LRU cache, robots.txt is requested in the site
+slot like any other page.
+"""
+import time
+import heapq
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+from urllib.robotparser import RobotFileParser
+
+userAgent = "PythonScrapingBook"
+
+
+def siteOf(url):
+    parts = urlsplit(url)
+    return parts.scheme + "://" + parts.netloc
+
+
+class RobotsCache:
+    """Parsed robots.txt of the last maxSize sites; a file is requested again after maxAge seconds.
+    If robots.txt can't be requested because of a server or network error, the site is
+    disallowed for errorAge seconds."""
+    def __init__(self, maxSize=1000, maxAge=24 * 3600, errorAge=600, timeout=10):
+        self.maxSize = maxSize
+        self.maxAge = maxAge
+        self.errorAge = errorAge
+        self.timeout = timeout
+        #site -> (parser, expiration time)
+        self.entries = OrderedDict()
+
+    def get(self, site):
+        """Parser of robots.txt of the site, None if it isn't cached."""
+        entry = self.entries.get(site)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.entries[site]
+            return None
+        self.entries.move_to_end(site)
+        return entry[0]
+
+    def fetch(self, site):
+        """Requests and parses robots.txt of the site (it's done in a worker thread)."""
+        parser = RobotFileParser(site + "/robots.txt")
+        maxAge = self.maxAge
+        try:
+            request = Request(parser.url, headers={"User-Agent": userAgent})
+            with urlopen(request, timeout=self.timeout) as response:
+                parser.parse(response.read().decode("utf-8", "replace").splitlines())
+        except HTTPError as e:
+            #The same as RobotFileParser.read(), but server errors don't allow everything
+            if e.code in (401, 403):
+                parser.disallow_all = True
+            elif 400 <= e.code < 500:
+                parser.allow_all = True
+            else:
+                parser.disallow_all = True
+                maxAge = self.errorAge
+        except (OSError, ValueError):
+            parser.disallow_all = True
+            maxAge = self.errorAge
+        return parser, maxAge
+
+    def put(self, site, parser, maxAge):
+        self.entries[site] = (parser, time.monotonic() + maxAge)
+        self.entries.move_to_end(site)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+
+def crawlDelay(parser, defaultDelay):
+    delay = parser.crawl_delay(userAgent)
+    rate = parser.request_rate(userAgent)
+    if rate is not None and rate.requests:
+        delay = max(delay or 0, rate.seconds / rate.requests)
+    return max(float(delay or 0), defaultDelay)
+
+
+class PoliteScheduler:
+    """Calls fetch(url) in concurrency threads, politely for every site.
+    New URLs can be added while results() is iterated."""
+    def __init__(self, fetch, concurrency=8, defaultDelay=1.0, robots=None):
+        self.fetch = fetch
+        self.concurrency = concurrency
+        self.defaultDelay = defaultDelay
+        self.robots = robots if robots is not None else RobotsCache()
+        #site -> URLs to request
+        self.queues = {}
+        #(time when the site may be requested, order, site) of sites without request in progress
+        self.ready = []
+        self.order = 0
+        #site -> time when the site may be requested next time
+        self.nextTime = {}
+        self.disallowed = 0
+
+    def add(self, url):
+        site = siteOf(url)
+        queue = self.queues.get(site)
+        if queue is None:
+            queue = self.queues[site] = deque()
+            self.schedule(site, self.nextTime.pop(site, 0))
+        queue.append(url)
+
+    def schedule(self, site, readyTime):
+        self.order += 1
+        heapq.heappush(self.ready, (readyTime, self.order, site))
+
+    def start(self, executor, running):
+        """Starts requests of the sites that are ready, while there are free threads."""
+        now = time.monotonic()
+        while self.ready and self.ready[0][0] <= now and len(running) < self.concurrency:
+            readyTime, order, site = heapq.heappop(self.ready)
+            parser = self.robots.get(site)
+            if parser is None:
+                running[executor.submit(self.robots.fetch, site)] = (site, None)
+                continue
+            queue = self.queues[site]
+            url = queue.popleft()
+            if parser.can_fetch(userAgent, url):
+                running[executor.submit(self.fetch, url)] = (site, url)
+            else:
+                #Nothing is requested, the site is still ready
+                self.disallowed += 1
+                self.finish(site, readyTime)
+
+    def finish(self, site, readyTime):
+        if self.queues[site]:
+            self.schedule(site, readyTime)
+        else:
+            del self.queues[site]
+            self.nextTime[site] = readyTime
+
+    def results(self):
+        """Yields (url, result of fetch, None) or (url, None, exception) as requests finish."""
+        running = {}
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            while self.ready or running:
+                self.start(executor, running)
+                timeout = None
+                if self.ready and len(running) < self.concurrency:
+                    timeout = max(0, self.ready[0][0] - time.monotonic())
+                if not running:
+                    #All ready sites may have had only disallowed URLs
+                    if timeout is not None:
+                        time.sleep(timeout)
+                    continue
+                done, _ = wait(running, timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    site, url = running.pop(future)
+                    if url is None:
+                        parser, maxAge = future.result()
+                        self.robots.put(site, parser, maxAge)
+                    else:
+                        parser = self.robots.get(site)
+                    delay = crawlDelay(parser, self.defaultDelay) if parser is not None else self.defaultDelay
+                    self.finish(site, time.monotonic() + delay)
+                    self.forgetIdleSites()
+                    if url is not None:
+                        error = future.exception()
+                        yield url, None if error else future.result(), error
+
+    def forgetIdleSites(self):
+        if len(self.nextTime) > self.robots.maxSize:
+            now = time.monotonic()
+            self.nextTime = {site: readyTime for site, readyTime in self.nextTime.items() if readyTime > now}
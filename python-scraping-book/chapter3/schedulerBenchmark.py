@@ -0,0 +1,76 @@
+"""
+Benchmark of politeScheduler on local test sites: every site answers in 50 ms and asks for
+Crawl-delay: 1 in its robots.txt. Reports pages per second for different concurrency and checks that
+no site was requested more often than its crawl delay allows. A polite crawler without a scheduler
+(one request at a time, waiting for the crawl delay of every page) gets under 1 page per second.
+
+Usage: python schedulerBenchmark.py [sites] [pages per site]   (default: 40 5)
+"""
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import urlopen
+from politeScheduler import PoliteScheduler
+
+responseTime = 0.05
+crawlDelay = 1
+#(port, start of request, end of request) of every page request
+requests = []
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        start = time.monotonic()
+        if self.path == "/robots.txt":
+            body = "User-agent: *\nCrawl-delay: {}\n".format(crawlDelay).encode()
+        else:
+            time.sleep(responseTime)
+            body = "<html><body>{}</body></html>".format(self.path).encode()
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(body)
+        requests.append((self.server.server_port, start, time.monotonic()))
+
+
+def fetch(url):
+    with urlopen(url, timeout=10) as response:
+        return response.read()
+
+
+def minimalGap():
+    #The smallest time between the end of a request to a site and the start of the next one
+    gaps = []
+    for port in set(request[0] for request in requests):
+        siteRequests = sorted(request for request in requests if request[0] == port)
+        gaps.extend(later[1] - earlier[2] for earlier, later in zip(siteRequests, siteRequests[1:]))
+    return min(gaps)
+
+
+def main():
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    servers = [ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler) for _ in range(sites)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print("{:>12} {:>10} {:>10} {:>12} {:>18}".format("concurrency", "pages", "time, s", "pages/s", "min site gap, s"))
+    for concurrency in (1, 8, 32):
+        del requests[:]
+        scheduler = PoliteScheduler(fetch, concurrency=concurrency, defaultDelay=0)
+        for page in range(pages):
+            for server in servers:
+                scheduler.add("http://127.0.0.1:{}/page{}".format(server.server_port, page))
+        start = time.monotonic()
+        fetched = sum(1 for url, html, error in scheduler.results() if error is None)
+        seconds = time.monotonic() - start
+        print("{:>12} {:>10} {:>10.2f} {:>12.1f} {:>18.3f}".format(
+            concurrency, fetched, seconds, fetched / seconds, minimalGap()))
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,53 +2,32 @@ from bs4 import BeautifulSoup
 import re
 import pymysql
 from urllib.request import urlopen
+from linkGraphStore import LinkGraphStore
 
 conn = pymysql.connect(host='127.0.0.1', port=3306, user='root', password=None, db='mysql', charset='utf8')
 cur = conn.cursor()
 cur.execute("USE wikipedia")
-
-def pageScraped(url):
-    cur.execute("SELECT * FROM pages WHERE url = %s", (url))
-    if cur.rowcount == 0:
-        return False
-    page = cur.fetchone()
-    
-    cur.execute("SELECT * FROM links WHERE fromPageId = %s", (int(page[0])))
-    if cur.rowcount == 0:
-        return False
-    return True
-
-def insertPageIfNotExists(url):
-    cur.execute("SELECT * FROM pages WHERE url = %s", (url))
-    if cur.rowcount == 0:
-        cur.execute("INSERT INTO pages (url) VALUES (%s)", (url))
-        conn.commit()
-        return cur.lastrowid
-    else:
-        return cur.fetchone()[0]
-
-def insertLink(fromPageId, toPageId):
-    cur.execute("SELECT * FROM links WHERE fromPageId = %s AND toPageId = %s", (int(fromPageId), int(toPageId)))
-    if cur.rowcount == 0:
-        cur.execute("INSERT INTO links (fromPageId, toPageId) VALUES (%s, %s)", (int(fromPageId), int(toPageId)))
-        conn.commit()
+#Pages and links are written in batches, ids of pages are cached
+store = LinkGraphStore(conn)
 
 def getLinks(pageUrl, recursionLevel):
     global pages
     if recursionLevel > 4:
         return
-    pageId = insertPageIfNotExists(pageUrl)
     html = urlopen("http://en.wikipedia.org"+pageUrl)
     bsObj = BeautifulSoup(html, "html.parser")
-    for link in bsObj.findAll("a", href=re.compile("^(/wiki/)((?!:).)*$")):
-        insertLink(pageId, insertPageIfNotExists(link.attrs['href']))
-        if not pageScraped(link.attrs['href']):
+    links = [link.attrs['href'] for link in bsObj.findAll("a", href=re.compile("^(/wiki/)((?!:).)*$"))]
+    store.addLinks(pageUrl, links)
+    for newPage in links:
+        if not store.pageScraped(newPage):
             #We have encountered a new page, add it and search it for links
-            newPage = link.attrs['href']
             print(newPage)
             getLinks(newPage, recursionLevel+1)
         else: 
-            print("Skipping: "+str(link.attrs['href'])+" found on "+pageUrl)
-getLinks("/wiki/Kevin_Bacon", 0) 
-cur.close()
-conn.close()
+            print("Skipping: "+str(newPage)+" found on "+pageUrl)
+try:
+    getLinks("/wiki/Kevin_Bacon", 0) 
+finally:
+    store.close()
+    cur.close()
+    conn.close()
@@ -0,0 +1,98 @@
+"""
+Benchmark of storing the link graph in SQLite (a local stand-in for the MySQL database of the
+chapter): the previous functions of 6-6DegreesCrawlWiki.py (SELECT + INSERT + commit for every
+link) vs linkGraphStore. Pages are synthetic: 150 links each, popular pages are linked more often.
+Reports edges per second and checks that both ways store the same graph.
+
+Usage: python linkGraphBenchmark.py [pages]   (default: 1000)
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+from linkGraphStore import LinkGraphStore
+
+linksPerPage = 150
+articles = 50000
+
+
+def makePages(count, seed=1):
+    rnd = random.Random(seed)
+    return [("/wiki/Article_{}".format(page),
+             ["/wiki/Article_{}".format(int(rnd.paretovariate(0.7)) % articles) for _ in range(linksPerPage)])
+            for page in range(count)]
+
+
+#Previous functions of 6-6DegreesCrawlWiki.py with SQLite placeholders
+def insertPageIfNotExists(conn, url):
+    cur = conn.execute("SELECT * FROM pages WHERE url = ?", (url,))
+    row = cur.fetchone()
+    if row is None:
+        cur.execute("INSERT INTO pages (url) VALUES (?)", (url,))
+        conn.commit()
+        return cur.lastrowid
+    return row[0]
+
+
+def insertLink(conn, fromPageId, toPageId):
+    cur = conn.execute("SELECT * FROM links WHERE fromPageId = ? AND toPageId = ?", (fromPageId, toPageId))
+    if cur.fetchone() is None:
+        cur.execute("INSERT INTO links (fromPageId, toPageId) VALUES (?, ?)", (fromPageId, toPageId))
+        conn.commit()
+
+
+def storeBefore(conn, pages):
+    for pageUrl, links in pages:
+        pageId = insertPageIfNotExists(conn, pageUrl)
+        for link in links:
+            insertLink(conn, pageId, insertPageIfNotExists(conn, link))
+
+
+def storeAfter(conn, pages):
+    store = LinkGraphStore(conn)
+    for pageUrl, links in pages:
+        store.addLinks(pageUrl, links)
+    store.close()
+
+
+def graph(conn):
+    return set(conn.execute("SELECT f.url, t.url FROM links JOIN pages f ON f.id = fromPageId "
+                            "JOIN pages t ON t.id = toPageId"))
+
+
+def run(path, store, pages):
+    conn = sqlite3.connect(path)
+    LinkGraphStore(conn).createTables()
+    start = time.perf_counter()
+    store(conn, pages)
+    seconds = time.perf_counter() - start
+    return conn, seconds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    pages = makePages(count)
+    directory = tempfile.mkdtemp(prefix="linkGraph")
+    #Every link is committed separately before, so it gets a smaller part of the pages
+    beforePages = pages[:max(1, count // 50)]
+    print("{:<34} {:>8} {:>10} {:>12}".format("method", "pages", "time, s", "edges/s"))
+    for name, store, storedPages in (("SELECT + INSERT + commit per link", storeBefore, beforePages),
+                                     ("linkGraphStore, same pages", storeAfter, beforePages),
+                                     ("linkGraphStore", storeAfter, pages)):
+        path = os.path.join(directory, name.replace(" ", "_").replace(",", "") + ".sqlite")
+        conn, seconds = run(path, store, storedPages)
+        edges = sum(len(links) for pageUrl, links in storedPages)
+        print("{:<34} {:>8} {:>10.2f} {:>12.0f}".format(name, len(storedPages), seconds, edges / seconds))
+        if store is storeBefore:
+            expected = graph(conn)
+        elif storedPages is beforePages:
+            assert graph(conn) == expected, "graphs differ"
+        conn.close()
+        os.remove(path)
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Storage of the link graph (tables pages and links of the wikipedia database) for crawlers.
+
+Instead of SELECT + INSERT + commit for every link, all links of a page are stored at once: ids of
+the pages are taken from an LRU cache (url -> id), unknown pages are inserted with one executemany()
+and their ids are read with one SELECT ... IN, links are buffered and inserted with executemany()
+every batchSize links, with one commit. Works with pymysql (MySQL) and sqlite3 connections.
+
+INSERT IGNORE skips existing rows only with unique keys on pages (url) and links (fromPageId,
+toPageId). The keys are looked up (SHOW INDEX, PRAGMA index_list) before the first insert; tables
+without them (the MySQL tables of the chapter) get the existing urls and links selected first and
+only the missing ones inserted, which is correct with one crawler writing at a time. The keys make
+the inserts cheaper and safe for several crawlers (binary collation of url: the default ones
+compare urls ignoring case and trailing spaces, and /wiki/Apple and /wiki/APPLE are different pages):
+    ALTER TABLE pages MODIFY url VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL;
+    ALTER TABLE pages ADD UNIQUE (url);
+    ALTER TABLE links ADD UNIQUE (fromPageId, toPageId);
+Without the binary collation, a url is mapped to the page stored with another case of it. A url that
+isn't stored as it is (longer than the column) has no id, it's skipped.
+"""
+import sqlite3
+from collections import OrderedDict
+
+#Placeholder of parameters and INSERT that skips existing rows
+dialects = {
+    "mysql": ("%s", "INSERT IGNORE"),
+    "sqlite": ("?", "INSERT OR IGNORE"),
+}
+#Not more parameters in one SELECT ... IN (SQLite allows 999 in old versions)
+selectChunk = 500
+
+
+def urlKey(url):
+    """Url as the default MySQL collations compare it: case and trailing spaces don't matter."""
+    return url.rstrip(" ").lower()
+
+sqliteTables = """
+    CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL UNIQUE,
+                                      created TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE IF NOT EXISTS links (id INTEGER PRIMARY KEY AUTOINCREMENT, fromPageId INTEGER NOT NULL,
+                                      toPageId INTEGER NOT NULL, created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                      UNIQUE (fromPageId, toPageId));
+"""
+
+
+class LinkGraphStore:
+    def __init__(self, conn, cacheSize=100000, batchSize=1000):
+        self.conn = conn
+        self.cur = conn.cursor()
+        param, insertIgnore = dialects["sqlite" if isinstance(conn, sqlite3.Connection) else "mysql"]
+        self.param = param
+        self.insertPage = insertIgnore + " INTO pages (url) VALUES (" + param + ")"
+        self.insertLink = insertIgnore + " INTO links (fromPageId, toPageId) VALUES (" + param + ", " + param + ")"
+        self.cacheSize = cacheSize
+        self.batchSize = batchSize
+        #url -> page id, the least recently used urls are first
+        self.ids = OrderedDict()
+        #Links not written yet
+        self.links = []
+        #Ids of pages whose links are known to be stored
+        self.scraped = set()
+        #Unique keys of pages (url) and links (fromPageId, toPageId) exist, see checkKeys()
+        self.uniqueUrls = None
+        self.uniqueLinks = None
+
+    def createTables(self):
+        """Creates the tables in SQLite database (MySQL tables are created as in the chapter)."""
+        self.conn.executescript(sqliteTables)
+
+    def uniqueKeys(self, table):
+        """Columns (lower case) of the unique keys of the table."""
+        keys = {}
+        if isinstance(self.conn, sqlite3.Connection):
+            for index in self.conn.execute("PRAGMA index_list(" + table + ")").fetchall():
+                if index[2]:
+                    keys[index[1]] = [row[2] for row in self.conn.execute("PRAGMA index_info(" + index[1] + ")")]
+        else:
+            self.cur.execute("SHOW INDEX FROM " + table)
+            for row in self.cur.fetchall():
+                #Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+                if not row[1]:
+                    keys.setdefault(row[2], []).append(row[4])
+        return [frozenset(column.lower() for column in columns) for columns in keys.values()]
+
+    def checkKeys(self):
+        """Finds out if INSERT IGNORE skips existing pages and links (see the module docstring)."""
+        if self.uniqueUrls is None:
+            self.uniqueUrls = frozenset(["url"]) in self.uniqueKeys("pages")
+            self.uniqueLinks = frozenset(["frompageid", "topageid"]) in self.uniqueKeys("links")
+
+    def cacheId(self, url, pageId):
+        self.ids[url] = pageId
+        if len(self.ids) > self.cacheSize:
+            self.ids.popitem(last=False)
+
+    def pageIds(self, urls):
+        """Ids of the pages with the urls, pages that aren't in the database are added. Id of a url that
+        can't be stored (see the module docstring) is None."""
+        ids = self.ids
+        found = {}
+        missing = []
+        for url in dict.fromkeys(urls):
+            pageId = ids.get(url)
+            if pageId is None:
+                missing.append(url)
+            else:
+                ids.move_to_end(url)
+                found[url] = pageId
+        if missing:
+            self.checkKeys()
+            if self.uniqueUrls:
+                self.cur.executemany(self.insertPage, [(url,) for url in missing])
+            else:
+                stored = self.selectIds(missing)
+                new = [(url,) for url in missing if url not in stored]
+                if new:
+                    self.cur.executemany(self.insertPage, new)
+            for url, pageId in self.selectIds(missing).items():
+                found[url] = pageId
+                self.cacheId(url, pageId)
+        return [found.get(url) for url in urls]
+
+    def selectIds(self, urls):
+        """Ids of the stored pages with the urls (url -> id)."""
+        found = {}
+        for start in range(0, len(urls), selectChunk):
+            chunk = urls[start:start + selectChunk]
+            self.cur.execute("SELECT id, url FROM pages WHERE url IN (" +
+                             ", ".join([self.param] * len(chunk)) + ")", chunk)
+            rows = self.cur.fetchall()
+            for pageId, url in rows:
+                found[url] = pageId
+            #Rows of urls matched by the collation, not exactly
+            keys = {urlKey(url): pageId for pageId, url in rows}
+            for url in chunk:
+                if url not in found and urlKey(url) in keys:
+                    found[url] = keys[urlKey(url)]
+        return found
+
+    def newLinks(self, links):
+        """Links that aren't stored yet (for links table without the unique key)."""
+        links = list(dict.fromkeys(links))
+        fromIds = list(dict.fromkeys(fromPageId for fromPageId, toPageId in links))
+        stored = set()
+        for start in range(0, len(fromIds), selectChunk):
+            chunk = fromIds[start:start + selectChunk]
+            self.cur.execute("SELECT fromPageId, toPageId FROM links WHERE fromPageId IN (" +
+                             ", ".join([self.param] * len(chunk)) + ")", chunk)
+            stored.update(tuple(row) for row in self.cur.fetchall())
+        return [link for link in links if link not in stored]
+
+    def pageId(self, url):
+        return self.pageIds([url])[0]
+
+    def addLinks(self, fromUrl, toUrls):
+        """Stores the links of the page fromUrl, returns ids of the linked pages (None for urls that can't
+        be stored, their links are skipped)."""
+        ids = self.pageIds([fromUrl] + list(toUrls))
+        fromPageId = ids[0]
+        if fromPageId is not None:
+            self.links.extend((fromPageId, toPageId) for toPageId in ids[1:] if toPageId is not None)
+            self.scraped.add(fromPageId)
+        if len(self.links) >= self.batchSize:
+            self.flush()
+        return ids[1:]
+
+    def pageScraped(self, url):
+        """True if links of the page are stored. A page that can't be stored counts as scraped, so crawlers
+        skip it."""
+        pageId = self.pageId(url)
+        if pageId is None or pageId in self.scraped:
+            return True
+        self.cur.execute("SELECT 1 FROM links WHERE fromPageId = " + self.param + " LIMIT 1", (pageId,))
+        if self.cur.fetchone() is None:
+            return False
+        self.scraped.add(pageId)
+        return True
+
+    def flush(self):
+        """Writes buffered links and commits."""
+        if self.links:
+            self.checkKeys()
+            links = self.links if self.uniqueLinks else self.newLinks(self.links)
+            if links:
+                self.cur.executemany(self.insertLink, links)
+            self.links = []
+        self.conn.commit()
+
+    def close(self):
+        self.flush()
+        self.cur.close()
@@ -2,7 +2,7 @@ from urllib.request import urlopen
 from bs4 import BeautifulSoup
 import re
 import string
-from collections import OrderedDict
+from collections import OrderedDict, Counter
 
 def cleanInput(input):
     input = re.sub('\n+', " ", input)
@@ -18,16 +18,10 @@ def cleanInput(input):
             cleanInput.append(item)
     return cleanInput
 
+#Counts are kept under tuples of words, n-grams aren't joined into strings while counting
 def getNgrams(input, n):
     input = cleanInput(input)
-    output = dict()
-    for i in range(len(input)-n+1):
-        newNGram = " ".join(input[i:i+n])
-        if newNGram in output:
-            output[newNGram] += 1
-        else:
-            output[newNGram] = 1
-    return output
+    return Counter(zip(*[input[i:] for i in range(n)]))
 
 html = urlopen("http://en.wikipedia.org/wiki/Python_(programming_language)")
 bsObj = BeautifulSoup(html, "html.parser")
@@ -37,5 +31,5 @@ content = bsObj.find("div", {"id":"mw-content-text"}).get_text()
 #print("2-grams count is: "+str(len(ngrams)))
 
 ngrams = getNgrams(content, 2)
-ngrams = OrderedDict(sorted(ngrams.items(), key=lambda t: t[1], reverse=True))
+ngrams = OrderedDict((" ".join(ngram), count) for ngram, count in ngrams.most_common())
 print(ngrams)
\ No newline at end of file
@@ -2,7 +2,7 @@ from urllib.request import urlopen
 from bs4 import BeautifulSoup
 import re
 import string
-import operator
+from ngramCounter import NgramCounter
 
 
 def cleanInput(input):
@@ -19,17 +19,14 @@ def cleanInput(input):
             cleanInput.append(item)
     return cleanInput
 
+#Counts are kept under word ids, not under strings of the n-grams
 def getNgrams(input, n):
-    input = cleanInput(input)
-    output = {}
-    for i in range(len(input)-n+1):
-        ngramTemp = " ".join(input[i:i+n])
-        if ngramTemp not in output:
-            output[ngramTemp] = 0
-        output[ngramTemp] += 1
-    return output
+    ngrams = NgramCounter(n, cleanInput)
+    ngrams.addText(input)
+    return ngrams
 
 content = str(urlopen("http://pythonscraping.com/files/inaugurationSpeech.txt").read(),'utf-8')
 ngrams = getNgrams(content, 2)
-sortedNGrams = sorted(ngrams.items(), key = operator.itemgetter(1), reverse=True)
+#All n-grams by count, sorted as an array of counts
+sortedNGrams = ngrams.mostCommon()
 print(sortedNGrams)
\ No newline at end of file
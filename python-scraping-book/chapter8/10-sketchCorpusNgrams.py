@@ -0,0 +1,17 @@
+import sys
+from ngramSketch import NgramSketch
+
+#Usage: python 10-sketchCorpusNgrams.py n (memory in MB, e.g. 64MB | error bound, e.g. 0.00001) file1.txt ...
+#Approximate counts in bounded memory, for corpora whose exact counts don't fit in it
+if __name__ == "__main__":
+    n = int(sys.argv[1])
+    if sys.argv[2].upper().endswith("MB"):
+        ngrams = NgramSketch(n, memory=int(float(sys.argv[2][:-2]) * 2 ** 20))
+    else:
+        ngrams = NgramSketch(n, epsilon=float(sys.argv[2]))
+    for path in sys.argv[3:]:
+        ngrams.addFile(path)
+    print("{} {}-grams, counts are at most {:.0f} too high (99%)".format(
+        ngrams.sketch.total, n, ngrams.sketch.errorBound()))
+    for ngram, count, error in ngrams.mostCommon(50):
+        print(count, "(+-" + str(error) + ")", ngram)
@@ -2,7 +2,8 @@ from urllib.request import urlopen
 from bs4 import BeautifulSoup
 import re
 import string
-import operator
+from ngramCounter import NgramCounter
+from ngramIndex import PositionalIndex
 
 def isCommon(ngram):
     commonWords = ["the", "be", "and", "of", "a", "in", "to", "have", "it", "i", "that", "for", "you", "he", "with", "on", "do", "say", "this", "they", "is", "an", "at", "but","we", "his", "from", "that", "not", "by", "she", "or", "as", "what", "go", "their","can", "who", "get", "if", "would", "her", "all", "my", "make", "about", "know", "will","as", "up", "one", "time", "has", "been", "there", "year", "so", "think", "when", "which", "them", "some", "me", "people", "take", "out", "into", "just", "see", "him", "your", "come", "could", "now", "than", "like", "other", "how", "then", "its", "our", "two", "more", "these", "want", "way", "look", "first", "also", "new", "because", "day", "more", "use", "no", "man", "find", "here", "thing", "give", "many", "well"]
@@ -30,27 +31,23 @@ def cleanInput(input):
             cleanInput.append(item)
     return cleanInput
 
+#Counts are kept under word ids, not under strings of the n-grams
 def getNgrams(input, n):
-    input = cleanInput(input)
-    output = {}
-    for i in range(len(input)-n+1):
-        ngramTemp = " ".join(input[i:i+n])
-        if ngramTemp not in output:
-            output[ngramTemp] = 0
-        output[ngramTemp] += 1
-    return output
+    ngrams = NgramCounter(n, cleanInput)
+    ngrams.addText(input)
+    return ngrams
 
-def getFirstSentenceContaining(ngram, content):
-    #print(ngram)
-    sentences = content.split(".")
-    for sentence in sentences: 
-        if ngram in sentence:
-            return sentence
-    return ""
+#Sentences are split and indexed once, not for every n-gram
+def getFirstSentenceContaining(ngram, index):
+    return index.firstSentence(ngram.split(" "))
 
 content = str(urlopen("http://pythonscraping.com/files/space.txt").read(), 'utf-8')
 ngrams = getNgrams(content, 2)
-sortedNGrams = sorted(ngrams.items(), key = operator.itemgetter(1), reverse = True)
+#All n-grams by count, sorted as an array of counts
+sortedNGrams = ngrams.mostCommon()
 print(sortedNGrams)
 
-
+index = PositionalIndex.fromSentences(content.split("."), cleanInput)
+for ngram, count in sortedNGrams:
+    if not isCommon(ngram.split(" ")):
+        print(ngram, count, getFirstSentenceContaining(ngram, index))
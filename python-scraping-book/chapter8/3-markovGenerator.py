@@ -1,57 +1,26 @@
+import os
 from urllib.request import urlopen
-from random import randint
-
-def wordListSum(wordList):
-    sum = 0
-    for word, value in wordList.items():
-        sum += value
-    return sum
-
-def retrieveRandomWord(wordList):
-
-    randIndex = randint(1, wordListSum(wordList))
-    for word, value in wordList.items():
-        randIndex -= value
-        if randIndex <= 0:
-            return word
-
-def buildWordDict(text):
-    #Remove newlines and quotes
-    text = text.replace("\n", " ")
-    text = text.replace("\"", "")
-
-    #Make sure puncuation are treated as their own "word," so they will be included
-    #in the Markov chain
-    punctuation = [',','.',';',':']
-    for symbol in punctuation:
-        text = text.replace(symbol, " "+symbol+" ")
-
-    words = text.split(" ")
-    #Filter out empty words
-    words = [word for word in words if word != ""]
-
-    wordDict = {}
-    for i in range(1, len(words)):
-        if words[i-1] not in wordDict:
-            #Create a new dictionary for this word
-            wordDict[words[i-1]] = {}
-        if words[i] not in wordDict[words[i-1]]:
-            wordDict[words[i-1]][words[i]] = 0
-        wordDict[words[i-1]][words[i]] += 1
-
-    return wordDict
-
-text = str(urlopen("http://pythonscraping.com/files/inaugurationSpeech.txt").read(), 'utf-8')
-wordDict = buildWordDict(text)
+from markovModel import MarkovModel
+
+#Counts of pairs of words are compiled into a model (order 1: the next word depends on one word),
+#a next word is drawn by binary search in the running sums of counts, not by a walk of a dictionary
+def buildWordDict(text, order=1):
+    return MarkovModel.train([text], order)
+
+#The model of the speech is built once and saved, next runs map the file instead of downloading the text
+modelPath = "inaugurationSpeech.markov"
+if os.path.exists(modelPath):
+    wordDict = MarkovModel.load(modelPath)
+else:
+    text = str(urlopen("http://pythonscraping.com/files/inaugurationSpeech.txt").read(), 'utf-8')
+    wordDict = buildWordDict(text)
+    wordDict.save(modelPath)
 
 #Generate a Markov chain of length 100
 length = 100
 chain = ""
-currentWord = "I"
-for i in range(0, length):
-    chain += currentWord+" "
-    #print(wordDict[currentWord])
-    currentWord = retrieveRandomWord(wordDict[currentWord])
+for word in wordDict.generate(length, ["I"]):
+    chain += word+" "
 
 print(chain)
 
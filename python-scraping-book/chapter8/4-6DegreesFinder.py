@@ -1,6 +1,7 @@
 from urllib.request import urlopen
 from bs4 import BeautifulSoup
 import pymysql
+from linkGraph import LinkGraph
 
 
 conn = pymysql.connect(host='127.0.0.1', port=3306, user='root', password=None, db='mysql', charset='utf8')
@@ -13,36 +14,16 @@ def getUrl(pageId):
         return None
     return cur.fetchone()[0]
 
-def getLinks(fromPageId):
-    cur.execute("SELECT toPageId FROM links WHERE fromPageId = %s", (int(fromPageId)))
-    if cur.rowcount == 0:
-        return None
-    return [x[0] for x in cur.fetchall()]
-
-def searchBreadth(targetPageId, currentPageId, depth, nodes):
-    if nodes is None or len(nodes) == 0:
-        return None
-    if depth <= 0:
-        for node in nodes:
-            if node == targetPageId:
-                return [node]
-        return None
-    #depth is greater than 0 -- go deeper!
-    for node in nodes:
-        found = searchBreadth(targetPageId, node, depth-1, getLinks(node))
-        if found is not None:
-            return found.append(currentPageId)
-    return None
-
-nodes = getLinks(1)
+#All links are loaded once, the search doesn't query the database
+graph = LinkGraph.fromDatabase(cur)
 targetPageId = 123428
-for i in range(0,4):
-    found = searchBreadth(targetPageId, 1, i, nodes)
-    if found is not None:
-        print(found)
-        for node in found:
-            print(getUrl(node))
-        break
-    else:
-        print("No path found")
-
+#Paths of up to 4 links, as the depth-limited search did
+found = graph.shortestPath(1, targetPageId, maxLength=4)
+if found is not None:
+    print(found)
+    for node in found:
+        print(getUrl(node))
+else:
+    print("No path found")
+cur.close()
+conn.close()
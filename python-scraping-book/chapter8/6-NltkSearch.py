@@ -1,6 +1,13 @@
+import os
 from nltk.book import *
-from nltk import ngrams
-fourgrams = ngrams(text6, 4)
-for fourgram in fourgrams: 
-    if fourgram[0] == "coconut": 
-        print(fourgram)
\ No newline at end of file
+from ngramIndex import PositionalIndex
+
+#The index of the text is built once and saved, lookups only read the postings of "coconut"
+indexPath = "text6Index.npz"
+if os.path.exists(indexPath):
+    index = PositionalIndex.load(indexPath)
+else:
+    index = PositionalIndex.fromSentences([text6.tokens])
+    index.save(indexPath)
+for fourgram in index.ngramsStartingWith("coconut", 4):
+    print(fourgram)
\ No newline at end of file
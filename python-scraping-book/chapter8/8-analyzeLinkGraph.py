@@ -0,0 +1,34 @@
+import pymysql
+import numpy as np
+from linkGraph import LinkGraph
+import linkAnalysis
+
+conn = pymysql.connect(host='127.0.0.1', port=3306, user='root', password=None, db='mysql', charset='utf8')
+cur = conn.cursor()
+cur.execute("USE wikipedia")
+
+def getUrl(pageId):
+    cur.execute("SELECT url FROM pages WHERE id = %s", (int(pageId)))
+    if cur.rowcount == 0:
+        return None
+    return cur.fetchone()[0]
+
+graph = LinkGraph.fromDatabase(cur)
+attributes, present = linkAnalysis.analyze(graph)
+#Table pageAttributes is created if it doesn't exist (see linkAnalysis.attributesTable)
+linkAnalysis.writeAttributes(conn, attributes, present)
+
+print("Most important pages:")
+pageIds = np.flatnonzero(present)
+for pageId in pageIds[attributes["pageRank"][pageIds].argsort()[::-1][:10]]:
+    print(getUrl(pageId), attributes["pageRank"][pageId])
+for name in ("weakComponent", "strongComponent"):
+    sizes = np.bincount(attributes[name][present])
+    print(name+": "+str(int((sizes > 0).sum()))+" components, the largest has "+str(sizes.max())+" pages")
+for name in ("inDegree", "outDegree"):
+    print(name+" distribution (degree: pages):")
+    for degree, count in enumerate(linkAnalysis.degreeDistribution(attributes[name], present)):
+        if count > 0:
+            print(degree, count)
+cur.close()
+conn.close()
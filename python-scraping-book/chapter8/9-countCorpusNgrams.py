@@ -0,0 +1,11 @@
+import sys
+from ngramCounter import countFiles
+
+#Usage: python 9-countCorpusNgrams.py n file1.txt file2.txt ...
+#Files are counted in a pool of processes, big files by parts
+if __name__ == "__main__":
+    n = int(sys.argv[1])
+    ngrams = countFiles(sys.argv[2:], n)
+    print(str(len(ngrams))+" different "+str(n)+"-grams")
+    for ngram, count in ngrams.mostCommon(50):
+        print(count, ngram)
@@ -0,0 +1,61 @@
+"""
+Benchmark of linkAnalysis on a synthetic link graph (the same as in pathBenchmark): time of every
+analysis and of writing the attributes to SQLite.
+
+Usage: python analysisBenchmark.py [pages] [links]   (default: 1000000 10000000)
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import numpy as np
+import linkAnalysis
+from linkGraph import LinkGraph
+
+
+def timed(name, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print("{:<26} {:>8.2f} s".format(name, time.perf_counter() - start))
+    return result
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    links = int(sys.argv[2]) if len(sys.argv) > 2 else 10000000
+    rng = np.random.default_rng(1)
+    fromIds = rng.integers(1, pages, links, dtype=np.int32)
+    toIds = (1 + (pages - 1) * rng.random(links) ** 3).astype(np.int32)
+    graph = timed("build graph", LinkGraph, fromIds, toIds)
+    del fromIds, toIds
+
+    inDegree, outDegree = timed("degrees", linkAnalysis.degrees, graph)
+    present = (inDegree + outDegree) > 0
+    attributes = {
+        "inDegree": inDegree,
+        "outDegree": outDegree,
+        "pageRank": timed("PageRank", linkAnalysis.pageRank, graph, present),
+        "weakComponent": timed("weak components", linkAnalysis.weakComponents, graph),
+        "strongComponent": timed("strong components", linkAnalysis.strongComponents, graph),
+    }
+    path = os.path.join(tempfile.mkdtemp(prefix="linkAnalysis"), "wikipedia.sqlite")
+    conn = sqlite3.connect(path)
+    timed("write to SQLite", linkAnalysis.writeAttributes, conn, attributes, present)
+    conn.close()
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+    print("pages {}, links {}".format(int(present.sum()), graph.edgeCount))
+    for name in ("weakComponent", "strongComponent"):
+        sizes = np.bincount(attributes[name][present])
+        print("{}: {} components, the largest has {} pages".format(name, int((sizes > 0).sum()), sizes.max()))
+    top = np.argsort(-attributes["pageRank"])[:3]
+    print("top PageRank: " + ", ".join("{} ({:.2e})".format(page, attributes["pageRank"][page]) for page in top))
+    print("in-degree distribution (degree: pages): " + ", ".join(
+        "{}: {}".format(degree, count) for degree, count in
+        enumerate(linkAnalysis.degreeDistribution(inDegree, present)[:6])) + ", ...")
+
+
+if __name__ == "__main__":
+    main()
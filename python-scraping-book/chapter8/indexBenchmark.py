@@ -0,0 +1,83 @@
+"""
+Benchmark of ngramIndex on a synthetic text (the corpus of ngramBenchmark, a sentence per line):
+the previous lookups of the scripts (splitting of the text for every n-gram, scan of all 4-grams)
+vs lookups in the index (median times), and time of building, saving and loading of the index.
+
+Usage: python indexBenchmark.py [text MB] [queries]   (default: 20 200)
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import statistics
+from ngramBenchmark import makeCorpus
+from ngramCounter import cleanInput
+from ngramIndex import PositionalIndex
+
+
+#Previous getFirstSentenceContaining of chapter8/2-countUncommon2Grams.py
+def getFirstSentenceContaining(ngram, content):
+    sentences = content.split(".")
+    for sentence in sentences:
+        if ngram in sentence:
+            return sentence
+    return ""
+
+
+#Previous search of chapter8/6-NltkSearch.py
+def fourgramsStartingWith(word, tokens):
+    return [tuple(tokens[i:i + 4]) for i in range(len(tokens) - 3) if tokens[i] == word]
+
+
+def timed(function, queries):
+    times = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(function(query))
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, results
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    queryCount = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    directory = tempfile.mkdtemp(prefix="index")
+    try:
+        content = open(makeCorpus(directory, megabytes, 1)[0]).read()
+        start = time.perf_counter()
+        index = PositionalIndex.fromSentences(content.split("."), cleanInput)
+        buildSeconds = time.perf_counter() - start
+        path = os.path.join(directory, "index.npz")
+        start = time.perf_counter()
+        index.save(path)
+        saveSeconds = time.perf_counter() - start
+        start = time.perf_counter()
+        index = PositionalIndex.load(path)
+        loadSeconds = time.perf_counter() - start
+        print("{} words, {} sentences: build {:.1f} s, save {:.1f} s, load {:.1f} s, {:.0f} MB".format(
+            len(index.tokens), len(index.texts), buildSeconds, saveSeconds, loadSeconds,
+            os.path.getsize(path) / 2 ** 20))
+
+        rnd = random.Random(2)
+        positions = [rnd.randrange(len(index.tokens) - 1) for query in range(queryCount)]
+        ngrams = [index.words[index.tokens[i]] + " " + index.words[index.tokens[i + 1]] for i in positions]
+        #The old lookups are slow, they get fewer queries
+        oldMs, oldResults = timed(lambda ngram: getFirstSentenceContaining(ngram, content), ngrams[:10])
+        newMs, newResults = timed(lambda ngram: index.firstSentence(ngram.split(" ")), ngrams)
+        print("first sentence with a 2-gram: split {:.2f} ms, index {:.3f} ms".format(oldMs, newMs))
+
+        tokens = [index.words[wordId] for wordId in index.tokens.tolist()]
+        words = [tokens[i] for i in positions]
+        oldMs, oldResults = timed(lambda word: fourgramsStartingWith(word, tokens), words[:10])
+        newMs, newResults = timed(lambda word: index.ngramsStartingWith(word, 4), words)
+        print("4-grams starting with a word: scan {:.2f} ms, index {:.3f} ms ({:.0f} 4-grams per query)".format(
+            oldMs, newMs, sum(len(result) for result in newResults) / len(newResults)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
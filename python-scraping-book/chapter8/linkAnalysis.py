@@ -0,0 +1,172 @@
+"""
+Analysis of the crawled link graph (see linkGraph): PageRank, weakly and strongly connected
+components, in- and out-degrees. Results are written back to the database as attributes of the
+pages (table pageAttributes).
+
+Page ids that have no links at all (ids never used, deleted pages) aren't a part of the graph: they
+get no PageRank and no attributes. A component is identified by the smallest page id in it.
+"""
+import sqlite3
+import numpy as np
+
+#Placeholder of parameters and INSERT that replaces existing rows
+dialects = {
+    "mysql": ("%s", "REPLACE"),
+    "sqlite": ("?", "INSERT OR REPLACE"),
+}
+#Rows written with one executemany()
+writeBatch = 10000
+
+attributesTable = """
+    CREATE TABLE IF NOT EXISTS pageAttributes (pageId INTEGER PRIMARY KEY, pageRank DOUBLE,
+                                               inDegree INTEGER, outDegree INTEGER,
+                                               weakComponent INTEGER, strongComponent INTEGER)
+"""
+
+
+def degrees(graph):
+    """(in-degrees, out-degrees) of all pages."""
+    return np.diff(graph.backward[0]), np.diff(graph.forward[0])
+
+
+def degreeDistribution(degree, present):
+    """Number of pages with the degree 0, 1, 2, ... (only pages of the graph)."""
+    return np.bincount(degree[present])
+
+
+def pageRank(graph, present, damping=0.85, tolerance=1e-9, maxIterations=100):
+    """PageRank by power iteration: rank of pages without links out goes to all pages.
+    Stops when the sum of changes of ranks is below tolerance."""
+    offsets, targets = graph.forward
+    outDegree = np.diff(offsets)
+    sources = np.repeat(np.arange(graph.nodeCount, dtype=np.int32), outDegree)
+    pageCount = int(present.sum())
+    dangling = present & (outDegree == 0)
+    inverseOut = np.zeros(graph.nodeCount)
+    np.divide(1.0, outDegree, out=inverseOut, where=outDegree > 0)
+    teleport = np.where(present, (1 - damping) / pageCount, 0.0)
+    rank = present / pageCount
+    for iteration in range(maxIterations):
+        #Every page gives its rank to its links in equal parts
+        newRank = np.bincount(targets, weights=(rank * inverseOut)[sources], minlength=graph.nodeCount)
+        newRank = damping * (newRank + rank[dangling].sum() / pageCount * present) + teleport
+        change = np.abs(newRank - rank).sum()
+        rank = newRank
+        if change < tolerance:
+            break
+    return rank
+
+
+def smallestIds(labels):
+    """Replaces every label by the smallest page id with the same label."""
+    smallest = np.full(len(labels), len(labels), dtype=np.int64)
+    np.minimum.at(smallest, labels, np.arange(len(labels)))
+    return smallest[labels]
+
+
+def weakComponents(graph):
+    """Component of every page, links are taken as undirected."""
+    offsets, targets = graph.forward
+    sources = np.repeat(np.arange(graph.nodeCount, dtype=np.int32), np.diff(offsets))
+    labels = np.arange(graph.nodeCount)
+    while True:
+        #Both ends of a link are hooked to the smaller label, then labels point to their roots
+        sourceLabels = labels[sources]
+        targetLabels = labels[targets]
+        smaller = np.minimum(sourceLabels, targetLabels)
+        changed = smaller != np.maximum(sourceLabels, targetLabels)
+        if not changed.any():
+            return labels
+        np.minimum.at(labels, np.maximum(sourceLabels, targetLabels)[changed], smaller[changed])
+        while True:
+            roots = labels[labels]
+            if np.array_equal(roots, labels):
+                break
+            labels = roots
+
+
+def strongComponents(graph):
+    """Component of every page: pages that can be reached from each other (Tarjan's algorithm
+    without recursion, the graph can have long chains of links)."""
+    offsets = graph.forward[0].tolist()
+    targets = graph.forward[1].tolist()
+    nodeCount = graph.nodeCount
+    index = [-1] * nodeCount
+    low = [0] * nodeCount
+    onStack = [False] * nodeCount
+    component = [0] * nodeCount
+    stack = []
+    counter = 0
+    componentCount = 0
+    for root in range(nodeCount):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        onStack[root] = True
+        #(page, position of its next link)
+        work = [(root, offsets[root])]
+        while work:
+            node, position = work[-1]
+            end = offsets[node + 1]
+            while position < end:
+                target = targets[position]
+                position += 1
+                if index[target] == -1:
+                    work[-1] = (node, position)
+                    index[target] = low[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    onStack[target] = True
+                    work.append((target, offsets[target]))
+                    break
+                if onStack[target] and index[target] < low[node]:
+                    low[node] = index[target]
+            else:
+                #All links of the page are followed
+                work.pop()
+                if low[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        onStack[member] = False
+                        component[member] = componentCount
+                        if member == node:
+                            break
+                    componentCount += 1
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+    return smallestIds(np.array(component, dtype=np.int64))
+
+
+def analyze(graph):
+    """Dictionary of arrays (indexed by page id) of the attributes and the mask of pages of the graph."""
+    inDegree, outDegree = degrees(graph)
+    present = (inDegree + outDegree) > 0
+    return {
+        "pageRank": pageRank(graph, present),
+        "inDegree": inDegree,
+        "outDegree": outDegree,
+        "weakComponent": weakComponents(graph),
+        "strongComponent": strongComponents(graph),
+    }, present
+
+
+def writeAttributes(conn, attributes, present):
+    """Writes the attributes of the pages of the graph to the table pageAttributes (it's created if it
+    doesn't exist, attributesTable is valid in SQLite and MySQL)."""
+    param, replace = dialects["sqlite" if isinstance(conn, sqlite3.Connection) else "mysql"]
+    cur = conn.cursor()
+    cur.execute(attributesTable)
+    names = ["pageRank", "inDegree", "outDegree", "weakComponent", "strongComponent"]
+    query = (replace + " INTO pageAttributes (pageId, " + ", ".join(names) + ") VALUES (" +
+             ", ".join([param] * (len(names) + 1)) + ")")
+    pageIds = np.flatnonzero(present)
+    for start in range(0, len(pageIds), writeBatch):
+        chunk = pageIds[start:start + writeBatch]
+        columns = [chunk.tolist()] + [attributes[name][chunk].tolist() for name in names]
+        cur.executemany(query, list(zip(*columns)))
+    conn.commit()
+    cur.close()
@@ -0,0 +1,127 @@
+"""
+Link graph of the wikipedia database in memory, for shortest path queries.
+
+The links table is loaded once into compressed sparse row (CSR) arrays: links of page i are
+targets[offsets[i]:offsets[i + 1]], the same arrays are built for the reversed links. A shortest path
+is searched with bidirectional BFS: a level of the side with fewer links to follow is expanded with
+NumPy operations on the whole frontier, the search stops at the level where both sides meet. Arrays
+of the search are allocated once, only the visited pages are reset after a query.
+"""
+import numpy as np
+
+#Rows fetched from the database at once
+fetchSize = 100000
+
+
+def csr(fromIds, toIds, nodeCount):
+    """(offsets, targets) of the links fromIds[i] -> toIds[i]."""
+    order = np.argsort(fromIds)
+    offsets = np.zeros(nodeCount + 1, dtype=np.int64)
+    np.cumsum(np.bincount(fromIds, minlength=nodeCount), out=offsets[1:])
+    return offsets, toIds[order]
+
+
+def neighbors(offsets, targets, frontier):
+    """(links, pages they go from) for all pages of the frontier."""
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return targets[:0], frontier[:0]
+    #Index of every link: start of its page + position in the page
+    positions = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return targets[np.repeat(starts, counts) + positions], np.repeat(frontier, counts)
+
+
+class LinkGraph:
+    def __init__(self, fromIds, toIds):
+        fromIds = np.asarray(fromIds, dtype=np.int32)
+        toIds = np.asarray(toIds, dtype=np.int32)
+        self.nodeCount = int(max(fromIds.max(initial=0), toIds.max(initial=0))) + 1
+        self.edgeCount = len(fromIds)
+        self.forward = csr(fromIds, toIds, self.nodeCount)
+        self.backward = csr(toIds, fromIds, self.nodeCount)
+        #Search state: parent in the path and distance from the start of the side, -1 if not visited
+        self.parents = [np.full(self.nodeCount, -1, dtype=np.int32) for side in range(2)]
+        self.distances = [np.full(self.nodeCount, -1, dtype=np.int32) for side in range(2)]
+
+    @classmethod
+    def fromDatabase(cls, cur):
+        """Loads all links of the links table (pymysql or sqlite3 cursor)."""
+        cur.execute("SELECT fromPageId, toPageId FROM links")
+        chunks = []
+        rows = cur.fetchmany(fetchSize)
+        while rows:
+            chunks.append(np.array(rows, dtype=np.int32).reshape(-1, 2))
+            rows = cur.fetchmany(fetchSize)
+        links = np.concatenate(chunks) if chunks else np.zeros((0, 2), dtype=np.int32)
+        return cls(links[:, 0], links[:, 1])
+
+    def outLinks(self, pageId):
+        offsets, targets = self.forward
+        return targets[offsets[pageId]:offsets[pageId + 1]]
+
+    def shortestPath(self, fromPageId, toPageId, maxLength=None):
+        """Page ids of a shortest path from fromPageId to toPageId, None if there is no path
+        (not longer than maxLength links)."""
+        if not (0 <= fromPageId < self.nodeCount and 0 <= toPageId < self.nodeCount):
+            return None
+        if fromPageId == toPageId:
+            return [fromPageId]
+        graphs = (self.forward, self.backward)
+        frontiers = [np.array([fromPageId], dtype=np.int32), np.array([toPageId], dtype=np.int32)]
+        depths = [0, 0]
+        visited = [[frontiers[0]], [frontiers[1]]]
+        for side in range(2):
+            self.parents[side][frontiers[side]] = frontiers[side]
+            self.distances[side][frontiers[side]] = 0
+        try:
+            while len(frontiers[0]) and len(frontiers[1]):
+                if maxLength is not None and depths[0] + depths[1] >= maxLength:
+                    return None
+                #Expand the side with fewer links to follow
+                offsets = [graphs[side][0] for side in range(2)]
+                work = [int((offsets[side][frontiers[side] + 1] - offsets[side][frontiers[side]]).sum())
+                        for side in range(2)]
+                side = 0 if work[0] <= work[1] else 1
+                meeting = self.expand(side, graphs[side], frontiers, depths, visited)
+                if meeting is not None:
+                    return self.path(meeting)
+            return None
+        finally:
+            for side in range(2):
+                touched = np.concatenate(visited[side])
+                self.parents[side][touched] = -1
+                self.distances[side][touched] = -1
+
+    def expand(self, side, graph, frontiers, depths, visited):
+        """Expands one level of the side, returns the page where the sides meet or None."""
+        parents = self.parents[side]
+        pages, fromPages = neighbors(graph[0], graph[1], frontiers[side])
+        new = parents[pages] == -1
+        pages = pages[new]
+        fromPages = fromPages[new]
+        #Any of the parents of a page is on a shortest path, one of them is kept
+        parents[pages] = fromPages
+        pages = np.unique(pages)
+        depths[side] += 1
+        self.distances[side][pages] = depths[side]
+        frontiers[side] = pages
+        visited[side].append(pages)
+        otherDistances = self.distances[1 - side][pages]
+        met = otherDistances >= 0
+        if not met.any():
+            return None
+        #The shortest of the paths through the pages reached by both sides
+        return int(pages[met][np.argmin(otherDistances[met])])
+
+    def path(self, meeting):
+        forwardPath = [meeting]
+        while forwardPath[-1] != self.parents[0][forwardPath[-1]]:
+            forwardPath.append(int(self.parents[0][forwardPath[-1]]))
+        forwardPath.reverse()
+        page = meeting
+        while page != self.parents[1][page]:
+            page = int(self.parents[1][page])
+            forwardPath.append(page)
+        return forwardPath
@@ -0,0 +1,89 @@
+"""
+Benchmark of markovModel on a synthetic text (the corpus of ngramBenchmark): the previous dictionary
+of 3-markovGenerator.py (linear walk of the next words for every word) vs the compiled model, for
+training, generation, saving and loading (time to the first generated words).
+
+Usage: python markovBenchmark.py [text MB] [words]   (default: 20 10000)
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from ngramBenchmark import makeCorpus
+from markovModel import MarkovModel, markovWords
+
+
+#Previous functions of chapter8/3-markovGenerator.py
+def wordListSum(wordList):
+    sum = 0
+    for word, value in wordList.items():
+        sum += value
+    return sum
+
+
+def retrieveRandomWord(wordList):
+    randIndex = random.randint(1, wordListSum(wordList))
+    for word, value in wordList.items():
+        randIndex -= value
+        if randIndex <= 0:
+            return word
+
+
+def buildWordDict(words):
+    wordDict = {}
+    for i in range(1, len(words)):
+        if words[i-1] not in wordDict:
+            wordDict[words[i-1]] = {}
+        if words[i] not in wordDict[words[i-1]]:
+            wordDict[words[i-1]][words[i]] = 0
+        wordDict[words[i-1]][words[i]] += 1
+    return wordDict
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    directory = tempfile.mkdtemp(prefix="markov")
+    try:
+        text = open(makeCorpus(directory, megabytes, 1)[0]).read()
+        random.seed(1)
+
+        start = time.perf_counter()
+        wordDict = buildWordDict(markovWords(text))
+        trainSeconds = time.perf_counter() - start
+        #The dictionary walk is slow, it generates fewer words
+        oldLength = max(1, length // 100)
+        start = time.perf_counter()
+        currentWord = "word0"
+        for i in range(oldLength):
+            currentWord = retrieveRandomWord(wordDict[currentWord])
+        print("dictionary (before): train {:.1f} s, {:.0f} words/s".format(
+            trainSeconds, oldLength / (time.perf_counter() - start)))
+        del wordDict
+
+        for order in (1, 2, 3):
+            start = time.perf_counter()
+            model = MarkovModel.train([text], order)
+            trainSeconds = time.perf_counter() - start
+            path = os.path.join(directory, "model{}.bin".format(order))
+            start = time.perf_counter()
+            model.save(path)
+            saveSeconds = time.perf_counter() - start
+            start = time.perf_counter()
+            model = MarkovModel.load(path)
+            model.generate(10, ["word0"] * order)
+            firstSeconds = time.perf_counter() - start
+            start = time.perf_counter()
+            model.generate(length, ["word0"] * order)
+            print("compiled, order {}: train {:.1f} s, {} states, {:.0f} MB file, save {:.2f} s, "
+                  "load + 10 words {:.1f} ms, {:.0f} words/s".format(
+                      order, trainSeconds, model.stateKeys.shape[1], os.path.getsize(path) / 2 ** 20, saveSeconds,
+                      firstSeconds * 1000, length / (time.perf_counter() - start)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Compiled Markov chain of words for text generation.
+
+A model of order n is trained from the counts of (n+1)-grams (see ngramCounter): the first n words
+are a state, the last one is the next word. Counts of separate documents (or of processes of
+countFiles) are merged as counts of n-grams, then compiled into arrays: states sorted by their word
+ids, next words of every state and the running sum of their counts. A next word is drawn with a
+binary search of a random number in the running sums of the state (O(log V)), a state is found by a
+binary search in the sorted states.
+
+A model is saved to one binary file (a JSON header and the arrays) and loaded with mmap: nothing is
+read or built at the load, pages of the file are read when they're used.
+"""
+import json
+import mmap
+import random
+import numpy as np
+from ngramCounter import NgramCounter, idBits, idMask
+
+magic = b"MARKOV01"
+#Arrays in the file start at multiples of this
+alignment = 64
+arrayNames = ["stateKeys", "stateStarts", "nextIds", "cumulative", "wordBytes", "wordOffsets", "sortedWords"]
+
+
+def markovWords(text):
+    #Remove newlines and quotes
+    text = text.replace("\n", " ")
+    text = text.replace("\"", "")
+
+    #Make sure puncuation are treated as their own "word," so they will be included
+    #in the Markov chain
+    punctuation = [',', '.', ';', ':']
+    for symbol in punctuation:
+        text = text.replace(symbol, " "+symbol+" ")
+
+    words = text.split(" ")
+    #Filter out empty words
+    return [word for word in words if word != ""]
+
+
+def packStates(ids, order):
+    """Columns of packed ids (two per 64-bit integer, as in ngramCounter) of the states (rows of ids)."""
+    columns = []
+    for first in range(0, order, 2):
+        column = ids[:, first].astype(np.uint64)
+        if first + 1 < order:
+            column = column << np.uint64(idBits) | ids[:, first + 1]
+        columns.append(column)
+    return np.array(columns, dtype=np.uint64).reshape(len(columns), len(ids))
+
+
+class MarkovModel:
+    def __init__(self, order, arrays):
+        self.order = order
+        for name in arrayNames:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def counter(cls, order):
+        """Empty counts of (order+1)-grams for training (addText(), endText() between documents, merge())."""
+        if order < 1:
+            raise ValueError("order of a Markov model is at least 1")
+        return NgramCounter(order + 1, markovWords)
+
+    @classmethod
+    def train(cls, texts, order=1):
+        counter = cls.counter(order)
+        for text in texts:
+            counter.addText(text)
+            counter.endText()
+        return cls.fromCounts(counter)
+
+    @classmethod
+    def fromCounts(cls, counter):
+        """Model of order counter.n - 1 compiled from the counts of the NgramCounter."""
+        order = counter.n - 1
+        counter.mergePending()
+        #Ids of the words of the n-grams, rows are sorted by them (columns of the keys are)
+        ids = np.empty((len(counter.counts), counter.n), dtype=np.uint32)
+        for column in range(counter.columns):
+            packed = counter.keys[:, column]
+            if 2 * column + 1 < counter.n:
+                ids[:, 2 * column] = packed >> np.uint64(idBits)
+                ids[:, 2 * column + 1] = packed & np.uint64(idMask)
+            else:
+                ids[:, 2 * column] = packed
+        states = ids[:, :order]
+        starts = np.flatnonzero(np.concatenate(([True], np.any(states[1:] != states[:-1], axis=1))))
+        if len(ids) == 0:
+            starts = starts[:0]
+        words = [word.encode("utf-8") for word in counter.words()]
+        wordOffsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum([len(word) for word in words], out=wordOffsets[1:])
+        return cls(order, {
+            "stateKeys": packStates(states[starts], order),
+            "stateStarts": np.append(starts, len(ids)).astype(np.int64),
+            "nextIds": ids[:, order].copy(),
+            "cumulative": np.cumsum(counter.counts, dtype=np.int64),
+            "wordBytes": np.frombuffer(b"".join(words), dtype=np.uint8),
+            "wordOffsets": wordOffsets,
+            "sortedWords": np.array(sorted(range(len(words)), key=words.__getitem__), dtype=np.int32),
+        })
+
+    def save(self, path):
+        arrays = [np.ascontiguousarray(getattr(self, name)) for name in arrayNames]
+        entries = []
+        size = 0
+        for name, array in zip(arrayNames, arrays):
+            entries.append([name, array.dtype.str, list(array.shape), size])
+            size += -(-array.nbytes // alignment) * alignment
+        header = json.dumps({"order": self.order, "arrays": entries}).encode("utf-8")
+        dataStart = -(-(len(magic) + 8 + len(header)) // alignment) * alignment
+        with open(path, "wb") as file:
+            file.write(magic + len(header).to_bytes(8, "little") + header)
+            for (name, dtype, shape, offset), array in zip(entries, arrays):
+                file.seek(dataStart + offset)
+                file.write(array.tobytes())
+            file.truncate(dataStart + size)
+
+    @classmethod
+    def load(cls, path):
+        """Model of the file, its arrays are views of the memory-mapped file."""
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(magic)] != magic:
+            raise ValueError("{} isn't a file of a Markov model".format(path))
+        headerLength = int.from_bytes(buffer[len(magic):len(magic) + 8], "little")
+        header = json.loads(buffer[len(magic) + 8:len(magic) + 8 + headerLength].decode("utf-8"))
+        dataStart = -(-(len(magic) + 8 + headerLength) // alignment) * alignment
+        arrays = {}
+        for name, dtype, shape, offset in header["arrays"]:
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=dataStart + offset).reshape(shape)
+        return cls(header["order"], arrays)
+
+    def word(self, wordId):
+        return bytes(self.wordBytes[self.wordOffsets[wordId]:self.wordOffsets[wordId + 1]]).decode("utf-8")
+
+    def wordId(self, word):
+        """Id of the word (binary search in the sorted words), None if it isn't in the model."""
+        word = word.encode("utf-8")
+        low, high = 0, len(self.sortedWords)
+        while low < high:
+            middle = (low + high) // 2
+            wordId = int(self.sortedWords[middle])
+            found = bytes(self.wordBytes[self.wordOffsets[wordId]:self.wordOffsets[wordId + 1]])
+            if found == word:
+                return wordId
+            if found < word:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def findState(self, ids):
+        """Index of the state of the word ids (the last order ones), None if no word follows it."""
+        ids = np.array(ids[-self.order:], dtype=np.uint32).reshape(1, self.order)
+        low, high = 0, self.stateKeys.shape[1]
+        for column, key in zip(self.stateKeys, packStates(ids, self.order)[:, 0]):
+            keys = column[low:high]
+            low, high = low + int(keys.searchsorted(key, "left")), low + int(keys.searchsorted(key, "right"))
+            if low == high:
+                return None
+        return low
+
+    def randomState(self):
+        """State of a random (n+1)-gram of the text."""
+        row = int(self.cumulative.searchsorted(random.randrange(int(self.cumulative[-1])), "right"))
+        return int(self.stateStarts.searchsorted(row, "right")) - 1
+
+    def stateWords(self, state):
+        ids = []
+        for column, packed in enumerate(self.stateKeys[:, state].tolist()):
+            if 2 * column + 1 < self.order:
+                ids += [packed >> idBits, packed & idMask]
+            else:
+                ids.append(packed)
+        return ids
+
+    def nextWord(self, state):
+        """Id of a random next word of the state (weighted by the counts)."""
+        start, end = int(self.stateStarts[state]), int(self.stateStarts[state + 1])
+        base = int(self.cumulative[start - 1]) if start > 0 else 0
+        position = base + random.randrange(int(self.cumulative[end - 1]) - base)
+        return int(self.nextIds[start + int(self.cumulative[start:end].searchsorted(position, "right"))])
+
+    def generate(self, length, start=None):
+        """List of length words that start with the words start (a random state if it's None or isn't
+        in the model). At a state without next words the chain goes on from a random state. An empty model
+        (of texts shorter than order + 1 words) raises ValueError."""
+        if len(self.nextIds) == 0:
+            raise ValueError("the model is empty: its texts are shorter than {} words".format(self.order + 1))
+        ids = [self.wordId(word) for word in start] if start else []
+        if len(ids) < self.order or None in ids or self.findState(ids) is None:
+            ids = self.stateWords(self.randomState())
+        while len(ids) < length:
+            state = self.findState(ids)
+            if state is None:
+                state = self.randomState()
+            ids.append(self.nextWord(state))
+        return [self.word(wordId) for wordId in ids[:length]]
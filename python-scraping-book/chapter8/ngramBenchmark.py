@@ -0,0 +1,106 @@
+"""
+Benchmark of ngramCounter on a synthetic corpus (words with Zipf distribution, lines of 12 words):
+the previous getNgrams() of the scripts (dictionary of joined strings, full sort) vs NgramCounter
+(arrays of word ids) in one process vs countFiles() in a pool of processes. Reports speed and size of the counts.
+
+Usage: python ngramBenchmark.py [corpus MB] [files]   (default: 200 4)
+"""
+import os
+import sys
+import time
+import random
+import itertools
+import shutil
+import tempfile
+import operator
+from multiprocessing import cpu_count
+from ngramCounter import NgramCounter, cleanInput, countFiles
+
+vocabularySize = 100000
+
+
+def makeCorpus(directory, megabytes, files, seed=1):
+    rnd = random.Random(seed)
+    words = ["word{}".format(i) for i in range(vocabularySize)]
+    cumulativeWeights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(vocabularySize)))
+    paths = []
+    for number in range(files):
+        path = os.path.join(directory, "corpus{}.txt".format(number))
+        with open(path, "w") as file:
+            size = 0
+            while size < megabytes * 2 ** 20 / files:
+                lines = "\n".join(" ".join(rnd.choices(words, cum_weights=cumulativeWeights, k=12)) + "."
+                                  for _ in range(10000)) + "\n"
+                file.write(lines)
+                size += len(lines)
+        paths.append(path)
+    return paths
+
+
+#Previous getNgrams of chapter8/1-count2Grams.py
+def getNgrams(input, n):
+    input = cleanInput(input)
+    output = {}
+    for i in range(len(input)-n+1):
+        ngramTemp = " ".join(input[i:i+n])
+        if ngramTemp not in output:
+            output[ngramTemp] = 0
+        output[ngramTemp] += 1
+    return output
+
+
+def entrySize(keys):
+    #Key object and dictionary entry (8 bytes of index, 24 bytes of entry, 1/3 empty)
+    keys = list(keys)[:100000]
+    return sum(sys.getsizeof(key) for key in keys) / len(keys) + 48
+
+
+def counterSize(counter):
+    #Arrays of counts and the words with their ids (shared by all n-grams)
+    words = sum(sys.getsizeof(word) for word in counter.ids) + sys.getsizeof(counter.ids)
+    return (counter.keys.nbytes + counter.counts.nbytes + words) / len(counter)
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    directory = tempfile.mkdtemp(prefix="ngrams")
+    try:
+        paths = makeCorpus(directory, megabytes, files)
+        sampleSize = os.path.getsize(paths[0])
+        sample = open(paths[0]).read()
+        print("{:<38} {:>8} {:>8} {:>12} {:>14}".format("method", "MB", "MB/s", "2-grams", "bytes/2-gram"))
+
+        start = time.perf_counter()
+        ngrams = getNgrams(sample, 2)
+        top = sorted(ngrams.items(), key=operator.itemgetter(1), reverse=True)[:100]
+        seconds = time.perf_counter() - start
+        print("{:<38} {:>8.0f} {:>8.2f} {:>12} {:>14.0f}".format(
+            "joined strings + full sort (before)", sampleSize / 2 ** 20, sampleSize / 2 ** 20 / seconds,
+            len(ngrams), entrySize(ngrams)))
+        del ngrams
+
+        start = time.perf_counter()
+        counter = NgramCounter(2)
+        counter.addFile(paths[0])
+        assert [count for ngram, count in counter.mostCommon(100)] == [count for ngram, count in top]
+        seconds = time.perf_counter() - start
+        print("{:<38} {:>8.0f} {:>8.2f} {:>12} {:>14.0f}".format(
+            "NgramCounter, one process", sampleSize / 2 ** 20, sampleSize / 2 ** 20 / seconds,
+            len(counter), counterSize(counter)))
+        del counter
+
+        corpusSize = sum(os.path.getsize(path) for path in paths)
+        start = time.perf_counter()
+        counter = countFiles(paths, 2)
+        counter.mostCommon(100)
+        seconds = time.perf_counter() - start
+        print("{:<38} {:>8.0f} {:>8.2f} {:>12} {:>14.0f}".format(
+            "countFiles, {} processes".format(cpu_count()), corpusSize / 2 ** 20, corpusSize / 2 ** 20 / seconds,
+            len(counter), counterSize(counter)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
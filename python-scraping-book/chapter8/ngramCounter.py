@@ -0,0 +1,238 @@
+"""
+Counting of n-grams of big texts.
+
+Words are interned: every word gets an integer id, and an n-gram is a row of 64-bit integers made of
+the ids of its words (two words per integer), not a string of its words. Counts are kept in NumPy
+arrays (about 16 bytes per 2-gram instead of a dictionary entry with a string, ~110 bytes): n-grams
+of every chunk of text are sorted and counted at once, chunk counts are merged by sorting. Text is
+cleaned and counted in chunks of whole lines, n-grams that cross the chunks are counted too. Files of
+a corpus (and parts of big files) can be counted in a pool of processes and the counts merged
+(map-reduce). The most common n-grams are selected with a partial sort, not a sort of all counts.
+"""
+import os
+import re
+import string
+from multiprocessing import Pool
+import numpy as np
+
+idBits = 32
+idMask = (1 << idBits) - 1
+#Text is read and counted by chunks of this size (bytes)
+chunkSize = 16 * 2 ** 20
+#Files bigger than this are split into parts for the process pool
+segmentSize = 64 * 2 ** 20
+#Counts of chunks are merged when they have this many rows
+mergeRows = 8 * 2 ** 20
+
+
+def cleanInput(input):
+    """Words of the text, cleaned as in the scripts of the chapter."""
+    input = re.sub('\n+', " ", input).lower()
+    input = re.sub('\[[0-9]*\]', "", input)
+    input = re.sub(' +', " ", input)
+    input = bytes(input, "UTF-8")
+    input = input.decode("ascii", "ignore")
+    cleanInput = []
+    for item in input.split(' '):
+        item = item.strip(string.punctuation)
+        if len(item) > 1 or (item == 'a' or item == 'i'):
+            cleanInput.append(item)
+    return cleanInput
+
+
+def sumCounts(keys, counts):
+    """Sorted distinct rows of keys and sums of their counts."""
+    if len(keys) == 0:
+        return keys, counts
+    #The first column is the primary key of the sort
+    order = np.lexsort(keys.T[::-1])
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], np.any(keys[1:] != keys[:-1], axis=1))))
+    return keys[starts], np.add.reduceat(counts[order], starts)
+
+
+class NgramCounter:
+    def __init__(self, n, tokenize=cleanInput):
+        self.n = n
+        self.columns = (n + 1) // 2
+        self.tokenize = tokenize
+        #word -> id (ids are given in the order of words)
+        self.ids = {}
+        #Distinct n-grams (rows of packed ids) and their counts, and counts of chunks not merged yet
+        self.keys = np.zeros((0, self.columns), dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.pending = []
+        self.pendingRows = 0
+        #Ids of the last n-1 words of the text, n-grams go on with the next chunk
+        self.tail = []
+
+    def __len__(self):
+        self.mergePending()
+        return len(self.counts)
+
+    def words(self):
+        """Words by id."""
+        return list(self.ids)
+
+    def wordIds(self, words):
+        ids = self.ids
+        setdefault = ids.setdefault
+        return [setdefault(word, len(ids)) for word in words]
+
+    def packIds(self, ids, count):
+        """Rows of packed ids of the count n-grams that start in the array ids."""
+        keys = np.empty((count, self.columns), dtype=np.uint64)
+        for column in range(self.columns):
+            first = 2 * column
+            if first + 1 < self.n:
+                keys[:, column] = ids[first:first + count] << np.uint64(idBits) | ids[first + 1:first + 1 + count]
+            else:
+                keys[:, column] = ids[first:first + count]
+        return keys
+
+    def addWords(self, words):
+        """Counts n-grams of the words, they go on after the words added before."""
+        ids = self.tail + self.wordIds(words)
+        self.tail = ids[-(self.n - 1):] if self.n > 1 else []
+        count = len(ids) - self.n + 1
+        if count > 0:
+            keys = self.packIds(np.array(ids, dtype=np.uint64), count)
+            self.addCounts(*sumCounts(keys, np.ones(count, dtype=np.int64)))
+
+    def addCounts(self, keys, counts):
+        self.pending.append((keys, counts))
+        self.pendingRows += len(keys)
+        if self.pendingRows >= mergeRows:
+            self.mergePending()
+
+    def mergePending(self):
+        if self.pending:
+            keys, counts = zip(*self.pending)
+            self.keys, self.counts = sumCounts(np.concatenate((self.keys,) + keys),
+                                               np.concatenate((self.counts,) + counts))
+            self.pending = []
+            self.pendingRows = 0
+
+    def addText(self, text):
+        self.addWords(self.tokenize(text))
+
+    def endText(self):
+        """The next words don't go on after the words added before."""
+        self.tail = []
+
+    def addFile(self, path, start=0, end=None, encoding="utf-8"):
+        """Counts the lines of the file that start in bytes [start, end) (the whole file by default)."""
+        for text in readLines(path, start, end, encoding):
+            self.addText(text)
+        self.endText()
+
+    def ngram(self, key, words):
+        ids = []
+        for column, packed in enumerate(key.tolist()):
+            if 2 * column + 1 < self.n:
+                ids += [packed >> idBits, packed & idMask]
+            else:
+                ids.append(packed)
+        return " ".join(words[wordId] for wordId in ids)
+
+    def count(self, ngram):
+        words = ngram.split(" ")
+        if len(words) != self.n or any(word not in self.ids for word in words):
+            return 0
+        self.mergePending()
+        key = self.packIds(np.array([self.ids[word] for word in words], dtype=np.uint64), 1)
+        found = np.flatnonzero(np.all(self.keys == key, axis=1))
+        return int(self.counts[found[0]]) if len(found) else 0
+
+    def mostCommon(self, k=None):
+        """[(n-gram, count)] of k most common n-grams (of all n-grams if k is None)."""
+        self.mergePending()
+        if k is None or k >= len(self.counts):
+            top = np.argsort(-self.counts, kind="stable")
+        else:
+            top = np.argpartition(-self.counts, k - 1)[:k]
+            top = top[np.argsort(-self.counts[top], kind="stable")]
+        words = self.words()
+        return [(self.ngram(self.keys[i], words), int(self.counts[i])) for i in top]
+
+    def items(self):
+        self.mergePending()
+        words = self.words()
+        for key, count in zip(self.keys, self.counts.tolist()):
+            yield self.ngram(key, words), count
+
+    def merge(self, other):
+        """Adds the counts of other counter (with its own word ids)."""
+        other.mergePending()
+        mapping = np.array(self.wordIds(other.words()), dtype=np.uint64)
+        keys = np.empty_like(other.keys)
+        for column in range(self.columns):
+            packed = other.keys[:, column]
+            if 2 * column + 1 < self.n:
+                keys[:, column] = (mapping[packed >> np.uint64(idBits)] << np.uint64(idBits) |
+                                   mapping[packed & np.uint64(idMask)])
+            else:
+                keys[:, column] = mapping[packed]
+        self.addCounts(*sumCounts(keys, other.counts))
+
+
+def readLines(path, start=0, end=None, encoding="utf-8"):
+    """Yields chunks of whole lines of the file: lines that start in bytes [start, end)."""
+    with open(path, "rb") as file:
+        if end is None:
+            end = os.fstat(file.fileno()).st_size
+        if start > 0:
+            #The line that crosses start belongs to the previous part
+            file.seek(start - 1)
+            file.readline()
+        position = file.tell()
+        while position < end:
+            data = file.read(min(chunkSize, end - position))
+            if not data:
+                break
+            #The last line is read to its end
+            if not data.endswith(b"\n"):
+                data += file.readline()
+            position = file.tell()
+            yield data.decode(encoding, "ignore")
+
+
+def countSegment(args):
+    n, tokenize, path, start, end = args
+    counter = NgramCounter(n, tokenize)
+    #First and last words of the part for the n-grams that cross the parts
+    firstWords = []
+    for text in readLines(path, start, end):
+        words = tokenize(text)
+        if len(firstWords) < n - 1:
+            firstWords.extend(words[:n - 1 - len(firstWords)])
+        counter.addWords(words)
+    words = counter.words()
+    return counter, firstWords, [words[wordId] for wordId in counter.tail]
+
+
+def segments(paths):
+    for path in paths:
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), segmentSize):
+            yield path, start, min(start + segmentSize, size)
+
+
+def countFiles(paths, n, tokenize=cleanInput, processes=None):
+    """Counts n-grams of the files (every file is a separate text) in a pool of processes."""
+    parts = list(segments(paths))
+    result = NgramCounter(n, tokenize)
+    with Pool(processes) as pool:
+        previousPath = None
+        for (path, start, end), (counter, firstWords, lastWords) in zip(
+                parts, pool.imap(countSegment, [(n, tokenize, path, start, end) for path, start, end in parts])):
+            if path != previousPath:
+                result.endText()
+                previousPath = path
+            #N-grams between the end of the previous part and the start of this one
+            result.addWords(firstWords)
+            result.merge(counter)
+            #A part with fewer than n-1 words only adds to the last words of the previous parts
+            if len(firstWords) == n - 1:
+                result.tail = result.wordIds(lastWords)
+    return result
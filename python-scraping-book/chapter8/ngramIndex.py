@@ -0,0 +1,115 @@
+"""
+Positional inverted index of a text for n-gram lookups: the sentences that contain an n-gram, the
+n-grams that start with a word.
+
+The index is built once: words of all sentences are kept as one array of word ids, and the postings
+of a word (its positions in the array, in the order of the text) are a slice of one array sorted by
+word (CSR, as the link graph of linkGraph). A position is turned into (sentence, position in the
+sentence) by a binary search in the starts of sentences. An n-gram is looked up in the postings of its
+rarest word and the other words are checked in the array of words, so a lookup takes time of the
+postings of one word, not of the whole text. The index is saved to and loaded from one .npz file.
+"""
+import numpy as np
+
+
+class PositionalIndex:
+    def __init__(self, words, tokens, sentenceStarts, texts, offsets=None, positions=None):
+        #Words by id, ids of the words of the text, start of every sentence in tokens (and the end)
+        self.words = words
+        self.ids = {word: wordId for wordId, word in enumerate(words)}
+        self.tokens = tokens
+        self.sentenceStarts = sentenceStarts
+        self.texts = texts
+        #Words as an array (made at the first use) for the n-grams of many positions at once
+        self.wordArray = None
+        if offsets is None:
+            #Postings of word i are positions[offsets[i]:offsets[i + 1]]
+            positions = np.argsort(tokens, kind="stable")
+            offsets = np.zeros(len(words) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(tokens, minlength=len(words)), out=offsets[1:])
+        self.offsets = offsets
+        self.positions = positions
+
+    @classmethod
+    def fromSentences(cls, sentences, tokenize=None):
+        """Index of the sentences: lists of words, or texts split into words by tokenize."""
+        ids = {}
+        setdefault = ids.setdefault
+        tokens = []
+        sentenceStarts = [0]
+        texts = []
+        for sentence in sentences:
+            if tokenize is None:
+                words = list(sentence)
+                texts.append(" ".join(words))
+            else:
+                words = tokenize(sentence)
+                texts.append(sentence)
+            tokens.extend(setdefault(word, len(ids)) for word in words)
+            sentenceStarts.append(len(tokens))
+        return cls(list(ids), np.array(tokens, dtype=np.int32), np.array(sentenceStarts, dtype=np.int64), texts)
+
+    def save(self, path):
+        textLengths = np.array([len(text.encode("utf-8")) for text in self.texts], dtype=np.int64)
+        np.savez(path, words=np.frombuffer("\n".join(self.words).encode("utf-8"), dtype=np.uint8),
+                 tokens=self.tokens, sentenceStarts=self.sentenceStarts,
+                 texts=np.frombuffer("".join(self.texts).encode("utf-8"), dtype=np.uint8),
+                 textLengths=textLengths, offsets=self.offsets, positions=self.positions)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            words = data["words"].tobytes().decode("utf-8")
+            texts = data["texts"].tobytes()
+            ends = np.cumsum(data["textLengths"]).tolist()
+            return cls(words.split("\n") if words else [], data["tokens"], data["sentenceStarts"],
+                       [texts[start:end].decode("utf-8") for start, end in zip([0] + ends, ends)],
+                       data["offsets"], data["positions"])
+
+    def sentenceOf(self, positions):
+        return np.searchsorted(self.sentenceStarts, positions, side="right") - 1
+
+    def postings(self, word):
+        """(sentences, positions in the sentences) of the word, in the order of the text."""
+        wordId = self.ids.get(word)
+        if wordId is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        positions = self.positions[self.offsets[wordId]:self.offsets[wordId + 1]]
+        sentences = self.sentenceOf(positions)
+        return sentences, positions - self.sentenceStarts[sentences]
+
+    def find(self, words):
+        """Positions (in the order of the text) where the words start, inside of one sentence."""
+        wordIds = [self.ids.get(word) for word in words]
+        if not wordIds or None in wordIds:
+            return np.zeros(0, dtype=np.int64)
+        #Positions of the rarest word give the candidate starts
+        counts = [self.offsets[wordId + 1] - self.offsets[wordId] for wordId in wordIds]
+        rarest = int(np.argmin(counts))
+        starts = self.positions[self.offsets[wordIds[rarest]]:self.offsets[wordIds[rarest] + 1]] - rarest
+        starts = starts[(starts >= 0) & (starts + len(wordIds) <= len(self.tokens))]
+        for i, wordId in enumerate(wordIds):
+            if i != rarest:
+                starts = starts[self.tokens[starts + i] == wordId]
+        return starts[self.sentenceOf(starts) == self.sentenceOf(starts + len(wordIds) - 1)]
+
+    def firstSentence(self, words):
+        """Text of the first sentence that contains the words (n-gram), "" if there is none."""
+        starts = self.find(words)
+        return self.texts[int(self.sentenceOf(starts[0]))] if len(starts) else ""
+
+    def sentencesContaining(self, words):
+        """Numbers of the sentences that contain the words (n-gram)."""
+        return np.unique(self.sentenceOf(self.find(words)))
+
+    def ngramsStartingWith(self, word, n):
+        """Tuples of the n-grams that start with the word, in the order of the text."""
+        wordId = self.ids.get(word)
+        if wordId is None:
+            return []
+        starts = self.positions[self.offsets[wordId]:self.offsets[wordId + 1]]
+        starts = starts[starts + n <= len(self.tokens)]
+        starts = starts[self.sentenceOf(starts) == self.sentenceOf(starts + n - 1)]
+        if self.wordArray is None:
+            self.wordArray = np.array(self.words, dtype=object)
+        return list(map(tuple, self.wordArray[self.tokens[starts[:, None] + np.arange(n)]].tolist()))
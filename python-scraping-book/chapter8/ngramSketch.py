@@ -0,0 +1,241 @@
+"""
+Approximate counting of n-grams in bounded memory, for corpora whose exact counts (see ngramCounter)
+don't fit in memory.
+
+Counts of all n-grams are kept in a Count-Min Sketch: depth rows of width counters, an n-gram adds to
+one counter of every row and its count is estimated by the smallest of them. With conservative
+update a counter only grows to the new estimate of the n-gram, which cuts the error of collisions.
+An estimate is never below the true count, and it's above by at most epsilon * (number of n-grams)
+with probability 1 - delta, for width = e / epsilon and depth = ln(1 / delta). The sketch is made
+either for an error bound (epsilon) or for a memory budget (bytes).
+
+The most common n-grams are kept by Space-Saving (Metwally et al.): topK monitored n-grams with
+counts; a new n-gram replaces the one with the smallest count. Only n-grams whose estimate in the
+sketch is above that smallest count are offered, and a new one starts from its estimate, so counts of
+monitored n-grams are never below the true ones and every n-gram more common than the smallest count
+is monitored.
+
+N-grams are identified by 64-bit hashes of their words (no vocabulary is kept); the text of an
+n-gram is kept only while it is monitored.
+"""
+import math
+import heapq
+import hashlib
+import numpy as np
+from ngramCounter import cleanInput, readLines
+
+maxCount = np.iinfo(np.uint32).max
+multiplier = np.uint64(0x9E3779B97F4A7C15)
+finalMultiplier = np.uint64(0xFF51AFD7ED558CCD)
+
+
+def wordHashes(words):
+    """64-bit hash of every word (each distinct word is hashed once)."""
+    index = {}
+    positions = [index.setdefault(word, len(index)) for word in words]
+    hashes = np.array([int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                       for word in index], dtype=np.uint64)
+    return hashes[np.array(positions, dtype=np.int64)] if positions else hashes
+
+
+def ngramHashes(hashes, n):
+    """64-bit hash of every n-gram of the words with the hashes."""
+    count = len(hashes) - n + 1
+    keys = np.zeros(count, dtype=np.uint64)
+    for i in range(n):
+        keys = (keys ^ hashes[i:i + count]) * multiplier
+        keys ^= keys >> np.uint64(29)
+    #Final mixing, so that both halves of the hash depend on all bits
+    keys = (keys ^ (keys >> np.uint64(33))) * finalMultiplier
+    return keys ^ (keys >> np.uint64(33))
+
+
+class CountMinSketch:
+    def __init__(self, width, depth, table=None, total=0):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32) if table is None else table
+        #Sum of all counts added
+        self.total = total
+
+    @classmethod
+    def fromError(cls, epsilon, delta=0.01):
+        """Sketch with estimates above true counts by at most epsilon * total (with probability 1 - delta)."""
+        return cls(int(math.ceil(math.e / epsilon)), int(math.ceil(math.log(1 / delta))))
+
+    @classmethod
+    def fromMemory(cls, memory, delta=0.01):
+        """The widest sketch of memory bytes."""
+        depth = int(math.ceil(math.log(1 / delta)))
+        return cls(max(1, memory // (depth * 4)), depth)
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    def errorBound(self):
+        """Most that an estimate is above the true count (with probability 1 - delta)."""
+        return self.epsilon * self.total
+
+    def columns(self, keys):
+        #Double hashing: a column in every row from two 32-bit halves of the key
+        low = keys & np.uint64(0xFFFFFFFF)
+        high = (keys >> np.uint64(32)) | np.uint64(1)
+        return [((low + np.uint64(row) * high) % np.uint64(self.width)).astype(np.int64)
+                for row in range(self.depth)]
+
+    def estimate(self, keys, columns=None):
+        if columns is None:
+            columns = self.columns(keys)
+        estimates = self.table[0][columns[0]]
+        for row in range(1, self.depth):
+            estimates = np.minimum(estimates, self.table[row][columns[row]])
+        return estimates
+
+    def add(self, keys, counts):
+        """Adds counts of distinct keys (conservative update), returns their new estimates."""
+        columns = self.columns(keys)
+        estimates = np.minimum(self.estimate(keys, columns).astype(np.int64) + counts, maxCount).astype(np.uint32)
+        for row in range(self.depth):
+            np.maximum.at(self.table[row], columns[row], estimates)
+        self.total += int(counts.sum())
+        return self.estimate(keys, columns)
+
+    def merge(self, other):
+        """Adds the counts of other sketch of the same size."""
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("sketches of different sizes can't be merged")
+        self.table = np.minimum(self.table.astype(np.int64) + other.table, maxCount).astype(np.uint32)
+        self.total += other.total
+
+
+class SpaceSaving:
+    """topK monitored keys with counts (never below the true counts) and errors (most that a count is
+    above the true one)."""
+    def __init__(self, topK):
+        self.topK = topK
+        #key -> [count, error, text]
+        self.counters = {}
+        #(count, key) of the counters, older entries of a counter are skipped
+        self.heap = []
+
+    def __len__(self):
+        return len(self.counters)
+
+    def __contains__(self, key):
+        return key in self.counters
+
+    def minimum(self):
+        """The count an n-gram has to exceed to be monitored (0 until topK keys are monitored)."""
+        if len(self.counters) < self.topK:
+            return 0
+        heap = self.heap
+        while heap[0][0] != self.counters[heap[0][1]][0]:
+            heapq.heappop(heap)
+        return heap[0][0]
+
+    def push(self, key, count):
+        heapq.heappush(self.heap, (count, key))
+        if len(self.heap) > 4 * self.topK:
+            self.heap = [(counter[0], key) for key, counter in self.counters.items()]
+            heapq.heapify(self.heap)
+
+    def add(self, key, count, text, estimate=None):
+        """Adds count to the key; a new key starts from the estimate (the smallest count + count if
+        it's None) and replaces the key with the smallest count."""
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += count
+        else:
+            minimum = self.minimum()
+            if len(self.counters) >= self.topK:
+                del self.counters[heapq.heappop(self.heap)[1]]
+            counter = self.counters[key] = [minimum + count if estimate is None else estimate, 0, text]
+            counter[1] = counter[0] - count
+        self.push(key, counter[0])
+
+    def mostCommon(self, k=None):
+        """[(text, count, error)] by count."""
+        items = sorted(self.counters.values(), key=lambda counter: -counter[0])[:k]
+        return [(text, count, error) for count, error, text in items]
+
+    def merge(self, other):
+        """Adds the counters of other summary: a key missing in one of them counts with its minimum."""
+        minimum = self.minimum()
+        otherMinimum = other.minimum()
+        merged = {}
+        for key in set(self.counters) | set(other.counters):
+            count, error, text = self.counters.get(key, (minimum, minimum, None))
+            otherCount, otherError, otherText = other.counters.get(key, (otherMinimum, otherMinimum, None))
+            merged[key] = [count + otherCount, error + otherError, text or otherText]
+        top = heapq.nlargest(self.topK, merged.items(), key=lambda item: item[1][0])
+        self.counters = dict(top)
+        self.heap = [(counter[0], key) for key, counter in self.counters.items()]
+        heapq.heapify(self.heap)
+
+
+class NgramSketch:
+    """Approximate counts of all n-grams (Count-Min Sketch) and the topK most common ones (Space-Saving).
+    The sketch is made for the error bound epsilon, or for memory bytes if memory is given."""
+    def __init__(self, n, epsilon=1e-5, delta=0.01, memory=None, topK=1000, tokenize=cleanInput):
+        self.n = n
+        self.tokenize = tokenize
+        if memory is not None:
+            self.sketch = CountMinSketch.fromMemory(memory, delta)
+        else:
+            self.sketch = CountMinSketch.fromError(epsilon, delta)
+        self.heavyHitters = SpaceSaving(topK)
+        #Last n-1 words of the text, n-grams go on with the next chunk
+        self.tail = []
+
+    def addWords(self, words):
+        """Counts n-grams of the words, they go on after the words added before."""
+        words = self.tail + list(words)
+        self.tail = words[-(self.n - 1):] if self.n > 1 else []
+        if len(words) < self.n:
+            return
+        keys = ngramHashes(wordHashes(words), self.n)
+        keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        estimates = self.sketch.add(keys, counts)
+        heavyHitters = self.heavyHitters
+        #Monitored n-grams get their counts, then n-grams above the smallest count are offered,
+        #the most common first (the smallest count only grows)
+        monitored = np.isin(keys, np.fromiter(heavyHitters.counters, dtype=np.uint64, count=len(heavyHitters)))
+        for i in np.flatnonzero(monitored).tolist():
+            heavyHitters.add(int(keys[i]), int(counts[i]), None)
+        candidates = np.flatnonzero(~monitored & (estimates > heavyHitters.minimum()))
+        candidates = candidates[np.argsort(-estimates[candidates].astype(np.int64), kind="stable")]
+        for i in candidates.tolist():
+            if estimates[i] <= heavyHitters.minimum():
+                break
+            heavyHitters.add(int(keys[i]), int(counts[i]), " ".join(words[first[i]:first[i] + self.n]),
+                             int(estimates[i]))
+
+    def addText(self, text):
+        self.addWords(self.tokenize(text))
+
+    def endText(self):
+        """The next words don't go on after the words added before."""
+        self.tail = []
+
+    def addFile(self, path, start=0, end=None, encoding="utf-8"):
+        """Counts the lines of the file that start in bytes [start, end) (the whole file by default)."""
+        for text in readLines(path, start, end, encoding):
+            self.addText(text)
+        self.endText()
+
+    def count(self, ngram):
+        """Estimate of the count of the n-gram (never below the true count)."""
+        words = ngram.split(" ")
+        if len(words) != self.n:
+            return 0
+        return int(self.sketch.estimate(ngramHashes(wordHashes(words), self.n))[0])
+
+    def mostCommon(self, k=None):
+        """[(n-gram, count, error)] of the k most common n-grams (k up to topK)."""
+        return self.heavyHitters.mostCommon(k)
+
+    def merge(self, other):
+        """Adds the counts of other NgramSketch of the same size."""
+        self.sketch.merge(other.sketch)
+        self.heavyHitters.merge(other.heavyHitters)
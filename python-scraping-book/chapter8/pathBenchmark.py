@@ -0,0 +1,45 @@
+"""
+Benchmark of shortest path queries of linkGraph on a synthetic link graph: links go from random
+pages to pages chosen with a skew (popular pages get most of the links, as in Wikipedia).
+Reports time of building of the arrays and time of queries between random pages.
+
+Usage: python pathBenchmark.py [pages] [links]   (default: 2000000 20000000)
+"""
+import sys
+import time
+import numpy as np
+from linkGraph import LinkGraph
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    links = int(sys.argv[2]) if len(sys.argv) > 2 else 20000000
+    rng = np.random.default_rng(1)
+    fromIds = rng.integers(1, pages, links, dtype=np.int32)
+    toIds = (1 + (pages - 1) * rng.random(links) ** 3).astype(np.int32)
+
+    start = time.perf_counter()
+    graph = LinkGraph(fromIds, toIds)
+    print("pages {}, links {}, build {:.2f} s".format(graph.nodeCount, graph.edgeCount,
+                                                     time.perf_counter() - start))
+    del fromIds, toIds
+
+    times = []
+    lengths = {}
+    for query in range(200):
+        fromPageId, toPageId = (int(page) for page in rng.integers(1, pages, 2))
+        start = time.perf_counter()
+        path = graph.shortestPath(fromPageId, toPageId)
+        times.append(time.perf_counter() - start)
+        length = None if path is None else len(path) - 1
+        lengths[length] = lengths.get(length, 0) + 1
+    times = np.array(times) * 1000
+    print("queries {}, ms: median {:.2f}, 95% {:.2f}, max {:.2f}".format(
+        len(times), np.median(times), np.percentile(times, 95), times.max()))
+    print("path lengths (links: queries): {}".format(
+        ", ".join("{}: {}".format(length, count) for length, count in
+                  sorted(lengths.items(), key=lambda item: -1 if item[0] is None else item[0]))))
+
+
+if __name__ == "__main__":
+    main()
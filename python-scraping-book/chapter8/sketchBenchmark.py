@@ -0,0 +1,65 @@
+"""
+Benchmark of ngramSketch against exact counts of ngramCounter on a synthetic corpus (the same as in
+ngramBenchmark): for sketches of several memory budgets, the error of estimates of a sample of all
+2-grams and of the most common 2-grams found by Space-Saving.
+
+Usage: python sketchBenchmark.py [corpus MB] [top k]   (default: 50 100)
+"""
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+from ngramBenchmark import makeCorpus
+from ngramCounter import NgramCounter
+from ngramSketch import NgramSketch, ngramHashes, wordHashes
+
+budgets = [2 ** 20, 4 * 2 ** 20, 16 * 2 ** 20, 64 * 2 ** 20]
+sampleSize = 100000
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    directory = tempfile.mkdtemp(prefix="sketch")
+    try:
+        path = makeCorpus(directory, megabytes, 1)[0]
+        start = time.perf_counter()
+        exact = NgramCounter(2)
+        exact.addFile(path)
+        exact.mergePending()
+        exactSeconds = time.perf_counter() - start
+        #Exact counts: arrays of the counter and its vocabulary
+        exactBytes = exact.keys.nbytes + exact.counts.nbytes + sum(sys.getsizeof(word) for word in exact.ids)
+        print("exact: {} 2-grams, {} in total, {:.1f} MB, {:.1f} s".format(
+            len(exact), int(exact.counts.sum()), exactBytes / 2 ** 20, exactSeconds))
+
+        #Sample of all 2-grams (most are rare) and the true top k
+        words = exact.words()
+        sample = np.random.default_rng(1).choice(len(exact), min(sampleSize, len(exact)), replace=False)
+        sampleCounts = exact.counts[sample]
+        sampleKeys = np.concatenate([ngramHashes(wordHashes(exact.ngram(exact.keys[i], words).split(" ")), 2)
+                                     for i in sample])
+        top = exact.mostCommon(k)
+
+        print("{:>8} {:>8} {:>6} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "MB", "width", "s", "bound", "mean err", "max err", "top recall", "top err %"))
+        for memory in budgets:
+            sketch = NgramSketch(2, memory=memory, topK=10 * k)
+            start = time.perf_counter()
+            sketch.addFile(path)
+            seconds = time.perf_counter() - start
+            errors = sketch.sketch.estimate(sampleKeys).astype(np.int64) - sampleCounts
+            assert errors.min() >= 0
+            found = {ngram: count for ngram, count, error in sketch.mostCommon(k)}
+            recall = sum(ngram in found for ngram, count in top) / len(top)
+            topErrors = [(found[ngram] - count) / count for ngram, count in top if ngram in found]
+            print("{:>8.0f} {:>8} {:>6.1f} {:>10.0f} {:>10.2f} {:>10} {:>10.2f} {:>10.3f}".format(
+                memory / 2 ** 20, sketch.sketch.width, seconds, sketch.sketch.errorBound(), errors.mean(),
+                errors.max(), recall, 100 * max(topErrors)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
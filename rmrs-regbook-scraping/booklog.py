@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Low-overhead logging for scraper hot loops.
+    Handlers configured by logging.yml (console, rotating files) are moved to the background thread: root logger
+    gets QueueHandler, records are formatted and written by QueueListener (see start_queue_logging()), so scraper
+    thread only puts records into queue. Per-request debug messages use lazy %-style arguments and are limited by
+    RateLimitFilter (configured in logging.yml).
+"""
+
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# defaults of debug messages rate limit (per message template)
+RATE_LIMIT_MESSAGES = 10
+RATE_LIMIT_PERIOD = 1.0  # seconds
+RATE_LIMIT_MAX_TEMPLATES = 1000  # templates counters are reset after this count (eagerly formatted messages)
+
+
+class LocalQueueHandler(QueueHandler):
+    """Queue handler for listener in the same process: record is put into queue as is (standard handler formats
+    message in the calling thread to make record picklable).
+    """
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Rate limit for debug messages: every message template (logger and message before % formatting) passes not
+    more than rate times per period, the rest is dropped. Count of dropped messages is added to the next passed
+    message of the template. Messages with level above limited level always pass.
+    """
+    def __init__(self, rate=RATE_LIMIT_MESSAGES, period=RATE_LIMIT_PERIOD, level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.period = period
+        self.level = level
+        self.__windows = {}  # (logger, template) -> [window start, passed count, dropped count]
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.msg)
+        window = self.__windows.get(key)
+        if window is None or record.created - window[0] >= self.period:
+            if len(self.__windows) >= RATE_LIMIT_MAX_TEMPLATES:
+                self.__windows.clear()
+            self.__windows[key] = [record.created, 1, 0]
+            if window is not None and window[2]:
+                record.msg = "{} ({} similar message(s) dropped)".format(record.getMessage(), window[2])
+                record.args = None
+            return True
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+def stop_listener(listener):
+    """Stop listener (if it isn't stopped yet), queued records are handled before stop."""
+    if getattr(listener, '_thread', None) is not None:
+        listener.stop()
+
+
+def no_caller(*args, **kwargs):
+    """findCaller() replacement - caller isn't looked up."""
+    return "(unknown file)", 0, "(unknown function)", None
+
+
+def skip_caller_info(*logger_names):
+    """Records of the loggers are created without caller info: formats of logging.yml don't use it, and walking the
+    stack is the most expensive part of record creation. Only findCaller() of these loggers is replaced, globals of
+    logging module aren't changed.
+    :param logger_names: names of loggers of hot loops
+    """
+    for logger_name in logger_names:
+        logging.getLogger(logger_name).findCaller = no_caller
+
+
+def start_queue_logging(logger_name=None):
+    """Move handlers of logger to the background thread: logger gets one LocalQueueHandler, its handlers are
+    served by QueueListener (handlers levels are respected). Listener is stopped (queue is flushed) at exit.
+    :param logger_name: logger with configured handlers, default - root logger
+    :return: QueueListener instance
+    """
+    logger = logging.getLogger(logger_name)
+    handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+    records_queue = queue.Queue(-1)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(LocalQueueHandler(records_queue))
+    listener = QueueListener(records_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
@@ -15,6 +15,7 @@ import xlwt
 from urllib import request, parse
 from bs4 import BeautifulSoup
 from pyutilities.pylog import setup_logging
+from booklog import start_queue_logging, skip_caller_info
 
 # characters for search engine
 RUS_CHARS = "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ"
@@ -30,7 +31,9 @@ OUTPUT_FILE = "regbook.xls"
 
 # setup logging for the whole script
 setup_logging(default_path='logging.yml')
+start_queue_logging()  # handlers work in the background thread
 log = logging.getLogger('scrap_book')
+skip_caller_info('scrap_book')  # per-request messages, formats don't use caller info
 
 
 def perform_request(request_param):
@@ -99,13 +102,13 @@ def process_chars(characters):
     """
     local_ships = {}
     for letter1 in characters:
-        log.debug("Currently processing: " + letter1)
+        log.debug("Currently processing: %s", letter1)
         for letter2 in characters:
             html = perform_request(letter1 + letter2)  # request site and get HTML
             ships = parse_data(html)  # parse data and get ships dictionary
             local_ships.update(ships)  # update main dictionary with found data
-            log.debug("Found ship(s): {}, total: {}, search string: {}"
-                      .format(len(ships), len(local_ships), letter1 + letter2))
+            log.debug("Found ship(s): %s, total: %s, search string: %s", len(ships), len(local_ships),
+                      letter1 + letter2)
     return local_ships
 
 
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Decoding of CIK lk_tree service responses (json array of geo points, windows-1251 charset). This is a library
+    module. Response is decoded from the charset once (for the whole body), from every array item only values
+    stored in db are taken: (id, intid, text, levelid, children). If orjson module is available - array is parsed
+    with it, otherwise items are decoded one by one (only one item dictionary exists at a time).
+"""
+
+import re
+import json
+
+try:  # faster json parser (optional)
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_ENCODING = 'windows-1251'
+
+# items of json array are decoded with raw_decode() of stdlib decoder
+_decoder = json.JSONDecoder()
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+
+def decode_response(http_response):
+    """ Return response text (bytes are decoded from JSON_ENCODING). """
+    if isinstance(http_response, bytes):
+        return http_response.decode(JSON_ENCODING)
+    return http_response
+
+
+def iter_json_array(text):
+    """
+    Decode items of json array one by one.
+    :param text: json text of array
+    :return: generator of decoded items, ValueError is raised for bad json
+    """
+    position = _WHITESPACE_RE.match(text, 0).end()
+    if text[position:position + 1] != '[':
+        raise ValueError('Expecting [ at position {}!'.format(position))
+    position = _WHITESPACE_RE.match(text, position + 1).end()
+    if text[position:position + 1] == ']':
+        return
+    while True:
+        item, position = _decoder.raw_decode(text, position)
+        yield item
+        position = _WHITESPACE_RE.match(text, position).end()
+        char = text[position:position + 1]
+        if char == ']':
+            return
+        if char != ',':
+            raise ValueError('Expecting , or ] at position {}!'.format(position))
+        position = _WHITESPACE_RE.match(text, position + 1).end()
+
+
+def geo_point_values(point):
+    """ Return tuple of values of json geo point, which are stored in db: (id, intid, text, levelid, children). """
+    return (point['id'], point['a_attr']['intid'] or None, point['text'], point['a_attr']['levelid'],
+            '{}'.format(point['children']))
+
+
+def parse_geo_points(http_response):
+    """
+    Parse lk_tree response (json array of geo points).
+    :param http_response: response body (bytes in JSON_ENCODING or text)
+    :return: list of tuples (id, intid, text, levelid, children), see geo_point_values()
+    """
+    text = decode_response(http_response)
+    if orjson is not None:
+        try:
+            return [geo_point_values(point) for point in orjson.loads(text)]
+        except orjson.JSONDecodeError as e:  # subclass of ValueError, but message is the same for all errors
+            raise ValueError('Bad json: {}'.format(e))
+    return [geo_point_values(point) for point in iter_json_array(text)]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Benchmark for decoding of large lk_tree responses (cikjson): synthetic child lists (windows-1251 json with
+    the same fields as the service returns) are decoded the old way (json.loads() of the whole response, then
+    values are taken from dictionaries and every text is encoded to utf-8) and with cikjson.parse_geo_points() -
+    stdlib item by item decoding and orjson (if it's installed). Time (best of repeats) and peak memory
+    (tracemalloc) are reported.
+
+    Usage: python cikjson_bench.py [--children 1000 10000 50000] [--repeat 5]
+"""
+
+import json
+import time
+import argparse
+import tracemalloc
+import cikjson
+from cikjson import JSON_ENCODING, iter_json_array, geo_point_values, decode_response
+
+DATA_ENCODING = 'utf-8'
+
+
+def synthetic_response(count):
+    """ Return json array of count geo points (bytes in JSON_ENCODING). """
+    points = [{'id': 100000 + number, 'text': u'Участковая избирательная комиссия №{}'.format(number),
+               'children': number % 5 != 0,
+               'a_attr': {'intid': 200000 + number, 'levelid': 4, 'href': '#'},
+               'li_attr': {'class': 'jstree-closed'}, 'state': {'opened': False, 'disabled': False}}
+              for number in range(count)]
+    return json.dumps(points, ensure_ascii=False).encode(JSON_ENCODING)
+
+
+def old_parse(http_response):
+    """ Decoding as it was done before cikjson (values as add_geo_points() took them). """
+    values = []
+    for point in json.loads(http_response.decode(JSON_ENCODING)):
+        values.append((point['id'], point['a_attr']['intid'], point['text'].encode(DATA_ENCODING),
+                       point['a_attr']['levelid'], point['children']))
+    return values
+
+
+def stream_parse(http_response):
+    return [geo_point_values(point) for point in iter_json_array(decode_response(http_response))]
+
+
+def measure(function, http_response, repeat):
+    """ Return tuple (best time in ms, peak memory in KB, result). """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(http_response)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function(http_response)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 1024.0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for decoding of lk_tree responses.')
+    parser.add_argument('--children', type=int, nargs='+', default=[1000, 10000, 50000], help='child list sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of every decoder (best time is reported)')
+    args = parser.parse_args()
+
+    decoders = [('old (json.loads + encode)', old_parse), ('stdlib stream', stream_parse)]
+    if cikjson.orjson is not None:
+        decoders.append(('orjson', cikjson.parse_geo_points))
+    else:
+        print('orjson is not installed - skipped.')
+
+    for count in args.children:
+        http_response = synthetic_response(count)
+        print('{} children, response {:.1f} KB:'.format(count, len(http_response) / 1024.0))
+        expected = None
+        for name, function in decoders:
+            elapsed, peak, result = measure(function, http_response, args.repeat)
+            ids = [values[0] for values in result]
+            if expected is None:
+                expected = ids
+            print('  {:<28} {:>9.2f} ms {:>10.1f} KB peak{}'.format(
+                name, elapsed, peak, '' if ids == expected else '  (different result!)'))
+
+
+if __name__ == '__main__':
+    main()
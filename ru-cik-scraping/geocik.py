@@ -8,18 +8,29 @@
 """
 
 import os
+import time
+import heapq
+import hashlib
+import argparse
+import random
+import socket
 import logging
 import json
-import urllib2
+try:  # python 2
+    from urllib2 import urlopen, URLError, ProxyHandler, build_opener, install_opener
+except ImportError:  # python 3
+    from urllib.request import urlopen, ProxyHandler, build_opener, install_opener
+    from urllib.error import URLError
 from sqlite3 import IntegrityError
 from pyutilities.utils import setup_logging, save_file_with_path
-from geodb import DB_NAME, db_create, db_add_single_geo_point, db_get_not_processed_geo_points_ids, \
-    db_add_multiple_geo_points, db_get_geo_point_id, GeoDB
-
-# todo: add cmd line parameters/argparse
+from geotext import TextFilter, to_unicode
+from geolog import start_queue_logging, skip_caller_info
+from cikjson import JSON_ENCODING, parse_geo_points, geo_point_values
+from geodb import DB_NAME, db_create, db_upgrade, db_add_single_geo_point, db_get_frontier_geo_points, \
+    db_add_multiple_geo_points, db_get_geo_point_id, db_redrive_failed_geo_points, db_get_geo_point_children, \
+    db_update_geo_point_children, db_update_subtree_hashes, db_invalidate_subtree_hashes, GeoDB
 
 # some useful constants
-JSON_ENCODING = 'windows-1251'
 DATA_ENCODING = 'utf-8'
 USE_PROXY = False
 PROXY_SERVER = 'webproxy.merck.com:8080'
@@ -31,27 +42,177 @@ URL_POINT = 'http://cikrf.ru/services/lk_tree/?id={}'
 URL_MSK = 'http://cikrf.ru/services/lk_tree/?ret=0&id={}'
 URL_SPB = 'http://cikrf.ru/services/lk_tree/?ret=1&id={}'
 URL_SPB_AREA = 'http://cikrf.ru/services/lk_tree/?ret=0&id={}'
+# regions (top level geo points) for processing, all of them are processed in one pass
+REGIONS = ['Ленинградская область']  # 'Санкт-Петербург', ...
+# retries of one request (exponential backoff with full jitter)
+HTTP_TIMEOUT = 30  # seconds
+RETRY_COUNT = 5
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_MAX = 60.0  # seconds
+# circuit breaker - stop requests if site is down
+BREAKER_FAILURES_THRESHOLD = 10  # consecutive failed requests (after retries) to open breaker
+BREAKER_RESET_TIMEOUT = 120.0    # seconds before trial request
+# re-drive of points processed with errors (status 2)
+MAX_ATTEMPTS = 5
+# order of processing (see Frontier): priority of point = LEVEL_WEIGHT * levelid + weight of its region, deeper
+# levels go first - leaf commissions are reached early
+LEVEL_WEIGHT = 1.0
+REGION_WEIGHTS = {}  # region -> weight, e.g. {'Санкт-Петербург': 10}, other regions - 0
+
+
+class Frontier(object):
+    """ Priority queue of geo points for processing. Points with children go before leaf points (leaves usually have
+    nothing to fetch), then points with higher priority (LEVEL_WEIGHT * levelid + region weight), then the most
+    recently added points - crawl goes depth-first and the first commissions arrive in seconds, not at the end. """
+    def __init__(self, region_weights=None, level_weight=LEVEL_WEIGHT):
+        self.__heap = []
+        self.__counter = 0
+        self.__level_weight = level_weight
+        self.__weights = dict((to_unicode(region), weight) for region, weight in (region_weights or {}).items())
+        self.__filter = TextFilter(list(self.__weights)) if self.__weights else None
+
+    def region_weight(self, region_text):
+        """ Return weight of region by its text (region isn't configured - 0). """
+        region = self.__filter.match(region_text) if self.__filter and region_text else None
+        return self.__weights[region] if region else 0
+
+    def push(self, geo_point_id, id, cik_text, levelid, children, weight=0):
+        """ Add point to the queue, weight - weight of point region. """
+        self.__counter += 1
+        has_children = '{}'.format(children) != 'False'
+        priority = self.__level_weight * (levelid or 0) + weight
+        heapq.heappush(self.__heap, (not has_children, -priority, -self.__counter, geo_point_id, id, cik_text, weight))
+
+    def pop(self):
+        """ Return the next point for processing: tuple (geo_point_id, id, cik_text, region weight). """
+        return heapq.heappop(self.__heap)[3:]
+
+    def __len__(self):
+        return len(self.__heap)
+
+
+class CircuitBreaker(object):
+    """ Circuit breaker for requests to the site. After threshold consecutive failures breaker is open - requests
+    aren't performed (caller waits) until reset timeout passes, then one trial request is allowed (half-open):
+    success closes breaker, failure opens it again. """
+    def __init__(self, failures_threshold=BREAKER_FAILURES_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.__failures_threshold = failures_threshold
+        self.__reset_timeout = reset_timeout
+        self.__failures = 0
+        self.__opened_at = None
+
+    def is_open(self):
+        return self.__opened_at is not None
+
+    def wait(self):
+        """ Wait (sleep) until request is allowed. """
+        if self.__opened_at is not None:
+            delay = self.__opened_at + self.__reset_timeout - time.time()
+            if delay > 0:
+                log.warn('Circuit breaker is open, waiting %.0f sec before trial request.', delay)
+                time.sleep(delay)
+
+    def success(self):
+        if self.__opened_at is not None:
+            log.info('Circuit breaker is closed, site is available.')
+        self.__failures = 0
+        self.__opened_at = None
+
+    def failure(self):
+        self.__failures += 1
+        if self.__opened_at is not None or self.__failures >= self.__failures_threshold:
+            if self.__opened_at is None:
+                log.error('Circuit breaker is open after %s failure(s) in a row.', self.__failures)
+            self.__opened_at = time.time()
+
+
+def fetch_json(url, breaker=None):
+    """
+    Get json from url with retries: failed request (network error, bad json) is repeated up to RETRY_COUNT times
+    with exponential backoff and full jitter. Circuit breaker (if any) is checked before every request, while
+    breaker is open (site is down) failed requests don't spend attempts - we just wait for the site.
+    :param url:
+    :param breaker: CircuitBreaker instance
+    :return: tuple (geo points values - see cikjson.parse_geo_points(), raw response), in case of failure after
+             all retries - last exception is raised
+    """
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.wait()
+        http_response = ''
+        try:
+            http_response = urlopen(url, timeout=HTTP_TIMEOUT).read()  # open url
+        except (URLError, socket.error) as e:
+            if breaker:
+                breaker.failure()
+                if breaker.is_open():
+                    continue
+            error = e
+        else:
+            if breaker:
+                breaker.success()  # site is available, even if response is bad
+            try:
+                return parse_geo_points(http_response), http_response  # parse json
+            except ValueError as e:
+                error = e
+
+        attempt += 1
+        if attempt >= RETRY_COUNT:
+            error.http_response = http_response  # keep response for the errors dump
+            raise error
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+        log.warn('Request [%s] failed (attempt %s), retry in %.1f sec. Message: %s', url, attempt, delay, error)
+        time.sleep(delay)
+
+
+def geo_point_url(id, cik_text):
+    """ Return url for the children of geo point (some regions have own services). """
+    if u'Санкт-Петербург' in cik_text:
+        return URL_SPB.format(id)
+    elif u'Москва' in cik_text:
+        return URL_MSK.format(id)
+    return URL_POINT.format(id)
+
+
+def geo_point_key(id, intid, text, levelid, children):
+    """ Return comparable key (utf-8 bytes) of geo point values - for json point and db row the same way. """
+    if not isinstance(text, bytes):
+        text = text.encode(DATA_ENCODING)
+    return u'{}|{}|{}|{}|'.format(id, intid or '', levelid, children).encode(DATA_ENCODING) + text
+
+
+def children_hash(points):
+    """ Return hash of children of geo point (tuples of values, see cikjson.geo_point_values()). Only stored values
+    are hashed (other json changes don't matter), order of children doesn't matter too. """
+    keys = sorted(geo_point_key(*values) for values in points)
+    return hashlib.sha1(b'\n'.join(keys)).hexdigest()
 
 
-def add_geo_points(json_points, parent_id, batching=True, geodb_instance=None, text_filter=None):
+def add_geo_points(points, parent_id, batching=True, geodb_instance=None, text_filter=None):
+    """
+    Add geo points (children of one point) to db.
+    :param points: tuples of values (id, intid, text, levelid, children), see cikjson.parse_geo_points()
+    :param parent_id:
+    :param batching:
+    :param geodb_instance:
+    :param text_filter: add only points which texts contain filter - string, list of strings or TextFilter
+    :return: list of added points - tuples (geo_point_id, id, cik_text, levelid, children)
+    """
     # log.debug('add_geo_points(): adding geo points to db')  # <- too much output
+    if text_filter and not isinstance(text_filter, TextFilter):
+        text_filter = TextFilter(text_filter)
 
     # iterate over children and put them to db
     points_list = []
-    for point in json_points:
-        point_id = point['id']
-        point_text = point['text'].encode(DATA_ENCODING)
-        point_children = point['children']
-        point_intid = point['a_attr']['intid']
-        if not point_intid:
-            point_intid = 'NULL'
-        point_levelid = point['a_attr']['levelid']
+    added = []
+    for point_id, point_intid, point_text, point_levelid, point_children in points:
 
         # if we use filtering by text - apply it
         if batching:  # if batching -> add point to list
 
             if text_filter:  # apply text filtering
-                if text_filter in point_text:
+                if text_filter.match(point_text):
                     points_list.append([point_id, point_intid, point_text, point_levelid, point_children, parent_id, 0])
             else:
                 points_list.append([point_id, point_intid, point_text, point_levelid, point_children, parent_id, 0])
@@ -59,25 +220,30 @@ def add_geo_points(json_points, parent_id, batching=True, geodb_instance=None, t
         else:  # if not batching -> directly add geo point (one by one)
 
             if text_filter:  # apply text filter
-                if text_filter in point_text:
+                if text_filter.match(point_text):
                     try:
-                        db_add_single_geo_point(DB_NAME, point_id, point_intid, point_text, point_levelid,
-                                                point_children, parent_id)
+                        geo_point_id = db_add_single_geo_point(DB_NAME, point_id, point_intid, point_text,
+                                                               point_levelid, point_children, parent_id)
+                        added.append((geo_point_id, point_id, to_unicode(point_text), point_levelid, point_children))
                     except IntegrityError as ie:
-                        log.warn('Geo point already exists! Message: {}'.format(ie.message))
+                        log.warn('Geo point already exists! Message: %s', ie)
             else:
                 try:
-                    db_add_single_geo_point(DB_NAME, point_id, point_intid, point_text, point_levelid,
-                                            point_children, parent_id)
+                    geo_point_id = db_add_single_geo_point(DB_NAME, point_id, point_intid, point_text, point_levelid,
+                                                           point_children, parent_id)
+                    added.append((geo_point_id, point_id, to_unicode(point_text), point_levelid, point_children))
                 except IntegrityError as ie:
-                    log.warn('Geo point already exists! Message: {}'.format(ie.message))
+                    log.warn('Geo point already exists! Message: %s', ie)
 
     if batching:
         # add a bunch of points (batch)
         if geodb_instance:
-            geodb_instance.db_add_multiple_geo_points(DB_NAME, points_list)
+            ids = geodb_instance.db_add_multiple_geo_points(DB_NAME, points_list)
         else:
-            db_add_multiple_geo_points(DB_NAME, points_list)
+            ids = db_add_multiple_geo_points(DB_NAME, points_list)
+        added = [(geo_point_id, point[0], to_unicode(point[2]), point[3], point[4])
+                 for geo_point_id, point in zip(ids, points_list)]
+    return added
 
 
 def init_geo_points(pretty_debug=False, text_filter=None):
@@ -85,38 +251,49 @@ def init_geo_points(pretty_debug=False, text_filter=None):
     Initializing existing (!) geo points db. Initializes top of geo points hierarchy.
     Operation is idempotent!
     :param pretty_debug:
+    :param text_filter: regions (top level points) for processing - one string or list of strings, all regions
+                        are added from one top level request
     :return:
     """
     log.debug('init_geo_points(): initializing.')
+    if text_filter:
+        text_filter = TextFilter(text_filter)
 
     # get top level json from cikrf web-site
-    myjson = json.load(urllib2.urlopen(URL_TOP), encoding=JSON_ENCODING)
+    myjson = json.loads(urlopen(URL_TOP).read().decode(JSON_ENCODING))
 
     # pretty print json (just debug)
     if pretty_debug:
-        print(json.dumps(myjson, sort_keys=True, indent=4, encoding=JSON_ENCODING))
+        print(json.dumps(myjson, sort_keys=True, indent=4, ensure_ascii=False).encode(DATA_ENCODING))
 
     # get first geo point from json
     id = myjson[0]['id']
-    text = myjson[0]['text'].encode(DATA_ENCODING)
+    text = myjson[0]['text']
     children = 'True'
     intid = myjson[0]['a_attr']['intid']
     levelid = myjson[0]['a_attr']['levelid']
 
     # just debug
-    log.debug('id -> {}, text -> {}, children -> {}, intid -> {}, levelid -> {}'
+    log.debug(u'id -> {}, text -> {}, children -> {}, intid -> {}, levelid -> {}'
               .format(id, text, type(children), intid, levelid))
 
     # add first (top-level) point to db
     try:
         last_id = db_add_single_geo_point(DB_NAME, id, intid, text, levelid, children, 0, processed=1)
     except IntegrityError as ie:
-        log.warn('Top level element already added! Message: {}'.format(ie.message))
+        log.warn('Top level element already added! Message: %s', ie)
         last_id = db_get_geo_point_id(DB_NAME, id, intid, text, levelid)
 
     # add top-level points to db (without batching, one by one). if we use batching and adding one by one, we
     # won't miss any top level point that isn't exist in db (we will add missed and won't touch existing)
-    add_geo_points(myjson[0]['children'], last_id, batching=False, text_filter=text_filter)
+    add_geo_points([geo_point_values(point) for point in myjson[0]['children']], last_id, batching=False,
+                   text_filter=text_filter)
+    if text_filter:
+        for region, count in text_filter.counts.items():
+            if count:
+                log.info('Region [%s] is added for processing.', region)
+            else:
+                log.warn('Region [%s] not found!', region)
 
 
 # todo: add starting point for processing (for top level)
@@ -129,83 +306,172 @@ def process_geo_points():
 
     # use GeoDB instance
     geodb = GeoDB(DB_NAME)
+    breaker = CircuitBreaker()
 
-    http_response = ''  # initialization of variable
-    # get not processed from db and process them
-    not_processed = db_get_not_processed_geo_points_ids(DB_NAME)
+    # get not processed from db and process them in order of priority, new points go to the same queue
+    frontier = Frontier(REGION_WEIGHTS)
+    not_processed = db_get_frontier_geo_points(DB_NAME)
     while len(not_processed) > 0:
+        for geo_point_id, id, cik_text, levelid, children, region_text in not_processed:
+            frontier.push(geo_point_id, id, cik_text, levelid, children, frontier.region_weight(region_text))
 
-        # process not processed points one by one
-        for geo_point in not_processed:
-            # get current point info
-            geo_point_id = geo_point[0]
-            id = geo_point[1]
-            # intid = geo_point[2]
-            cik_text = geo_point[3]
-
-            # select url
-            if u'Санкт-Петербург' in cik_text:
-                url = URL_SPB
-            elif u'Москва' in cik_text:
-                url = URL_MSK
-            else:
-                url = URL_POINT
+        # process points one by one
+        while frontier:
+            geo_point_id, id, cik_text, weight = frontier.pop()
 
             try:
-                # get source data
-                http_response = urllib2.urlopen(url.format(id)).read()  # open url
-                myjson = json.loads(http_response, encoding=JSON_ENCODING)  # parse json
+                # get source data (with retries)
+                points, http_response = fetch_json(geo_point_url(id, cik_text), breaker)
                 # process data
-                add_geo_points(myjson, geo_point_id, geodb_instance=geodb)  # add all found geo points to db
+                added = add_geo_points(points, geo_point_id, geodb_instance=geodb)  # add all found geo points to db
 
-                geodb.db_mark_geo_point_as_processed(DB_NAME, geo_point_id)
+                geodb.db_mark_geo_point_as_processed(DB_NAME, geo_point_id, children_hash=children_hash(points))
                 # db_mark_geo_point_as_processed(DB_NAME, geo_point_id)  # mark current point as processed (= 1)
+                for point in added:
+                    frontier.push(*point, weight=weight)
+                log.debug('Point [%s] processed: children [%s], added [%s], frontier [%s].',
+                          id, len(points), len(added), len(frontier))
 
-            except ValueError as ve:
-                log.error('Error processing object id = [{}]! Message: {}'.format(id, ve.message))
+            except Exception as e:  # one bad point doesn't stop processing
+                log.error('Error processing object id = [%s]! Message: %s', id, e)
 
-                # mark current geo point as processed with errors (= 2)
+                # mark current geo point as processed with errors (= 2), it may be re-driven later
                 geodb.db_mark_geo_point_as_processed(DB_NAME, geo_point_id, processed_status=2)
                 # db_mark_geo_point_as_processed(DB_NAME, geo_point_id, processed_status=2)
 
                 # save on disk only erroneous objects (ids)
-                save_file_with_path('json_errors/{}.json'.format(id), http_response)  # save response to file
+                http_response = getattr(e, 'http_response', '')
+                if http_response:
+                    save_file_with_path('json_errors/{}.json'.format(id), http_response)  # save response to file
 
-        # after processing first part - get new not processed points
-        not_processed = db_get_not_processed_geo_points_ids(DB_NAME)
+        # after processing the queue - check db for not processed points (e.g. added by other process)
+        not_processed = db_get_frontier_geo_points(DB_NAME)
 
     log.info('All points have been processed.')
     return True
 
 
-# module initialization
-setup_logging(default_path='geopython/logging.yml')
-log = logging.getLogger('geocik')
-# starting point for [geocik] module
-log.info('Starting [geocik] module...')
-
-if USE_PROXY:  # setup proxy if needed
-    proxy = urllib2.ProxyHandler({'http': PROXY_SERVER, 'https': PROXY_SERVER})
-    opener = urllib2.build_opener(proxy)
-    urllib2.install_opener(opener)
-    log.info('Proxy for http/https has been installed.')
-
-# create db if not exists
-if not os.path.exists(DB_NAME):
-    log.warn("Database [{}] doesn't exist! Creating...".format(DB_NAME))
-    db_create(DB_NAME)  # create target db
-
-# init db first time
-# init_geo_points(text_filter='Санкт-Петербург')
-init_geo_points(text_filter='Ленинградская область')
-
-# process/continue with geo points information (in case of error - re-try)
-tries_count = 10
-tries = 0
-finished = False
-while tries < tries_count and not finished:
-    try:
-        finished = process_geo_points()
-    except Exception as e:
-        log.error('Something went wrong! Message: {}'.format(e.message))
-    tries += 1
+def redrive_failed_geo_points(max_attempts=MAX_ATTEMPTS):
+    """
+    Re-process geo points processed with errors (status 2) in batches, until there are no failed points with
+    less than max_attempts attempts.
+    """
+    log.debug('redrive_failed_geo_points(): re-processing failed geo points.')
+    redriven = db_redrive_failed_geo_points(DB_NAME, max_attempts)
+    while redriven > 0:
+        log.info('Re-processing [{}] failed point(s).'.format(redriven))
+        process_geo_points()
+        redriven = db_redrive_failed_geo_points(DB_NAME, max_attempts)
+
+
+def recrawl_geo_points(force_depth=None):
+    """
+    Incremental re-crawl of processed geo points. Every processed point keeps hash of its children json, re-crawl
+    fetches children of the point again (starting from regions) and compares hashes:
+      * hash is the same - children aren't changed, they aren't descended;
+      * hash differs - new children are added (they are crawled by process_geo_points() later), removed children
+        are deleted with their subtrees, changed children are updated and descended.
+    Points without hash (processed by previous versions) are descended fully. Subtrees without subtree hash
+    (see geodb.db_update_subtree_hashes()) are descended too: they have not processed or failed points, were
+    changed or weren't re-crawled completely (failed request, interrupted re-crawl) since the last hashing.
+    Service returns only direct children of the point, so changes deep in the unchanged levels aren't visible
+    from above - by default all levels are descended (every processed point is fetched, unchanged children aren't
+    written). Shallower force_depth is faster, but changes below it are found only in changed or reset subtrees.
+    :param force_depth: count of levels (0 - regions) which are always descended, None - all levels
+    :return: tuple (fetched points count, changed points count)
+    """
+    log.debug('recrawl_geo_points(): re-crawl with force depth [{}].'.format(force_depth))
+    if force_depth is not None:
+        log.warn('Re-crawl with force depth [%s] - changes below it in unchanged subtrees are not seen!', force_depth)
+    breaker = CircuitBreaker()
+    fetched = 0
+    changed_count = 0
+
+    # start from regions - children of the top level point(s)
+    stack = []
+    for top in db_get_geo_point_children(DB_NAME, 0):
+        stack.extend((row, 0) for row in db_get_geo_point_children(DB_NAME, top[0]))
+
+    while stack:
+        (geo_point_id, id, intid, cik_text, levelid, children, processed, old_hash, subtree_hash), depth = stack.pop()
+        if processed != 1:  # not processed or failed points are processed by process_geo_points()
+            continue
+        try:
+            points, http_response = fetch_json(geo_point_url(id, cik_text), breaker)
+        except Exception as e:  # subtree is checked on the next re-crawl
+            log.error('Error re-crawling object id = [%s]! Message: %s', id, e)
+            db_invalidate_subtree_hashes(DB_NAME, geo_point_id)
+            continue
+        fetched += 1
+        new_hash = children_hash(points)
+        log.debug('Point [%s] re-crawled: children [%s], changed [%s].', id, len(points), new_hash != old_hash)
+        descend_ids = set()  # children to descend
+        if new_hash != old_hash:
+            changed_count += 1
+            existing = dict((row[1], row) for row in db_get_geo_point_children(DB_NAME, geo_point_id))
+            added = []
+            changed = []
+            for values in points:
+                row = existing.pop(values[0], None)
+                if row is None:
+                    added.append(values)
+                else:
+                    point_changed = geo_point_key(*values) != geo_point_key(*row[1:6])
+                    if point_changed:
+                        changed.append((row[0],) + values[1:])
+                    if point_changed or old_hash is None:  # no hash yet - whole subtree is checked
+                        descend_ids.add(row[0])
+            removed = [row[0] for row in existing.values()]
+            deleted = db_update_geo_point_children(DB_NAME, geo_point_id, added, changed, removed, new_hash)
+            log.info('Point [%s] changed: added [%s], changed [%s], removed [%s] (deleted with subtrees [%s]).',
+                     id, len(added), len(changed), len(removed), deleted)
+
+        # complete subtree (with hash) has complete subtrees of all children - children are read only if needed
+        forced = force_depth is None or depth < force_depth
+        if descend_ids or forced or subtree_hash is None:
+            stack.extend((row, depth + 1) for row in db_get_geo_point_children(DB_NAME, geo_point_id)
+                         if forced or row[0] in descend_ids or row[8] is None)
+
+    log.info('Re-crawl finished: fetched [{}] point(s), changed [{}].'.format(fetched, changed_count))
+    return fetched, changed_count
+
+
+# module logging (setup is done in the main block - module can be imported without side effects)
+log = logging.getLogger(LOGGER_NAME)
+
+if __name__ == '__main__':
+    setup_logging(default_path='geopython/logging.yml')
+    start_queue_logging()  # handlers work in the background thread
+    skip_caller_info(LOGGER_NAME, 'geodb')  # loggers of the crawl loop, formats don't use caller info
+    # starting point for [geocik] module
+    log.info('Starting [geocik] module...')
+
+    if USE_PROXY:  # setup proxy if needed
+        proxy = ProxyHandler({'http': PROXY_SERVER, 'https': PROXY_SERVER})
+        opener = build_opener(proxy)
+        install_opener(opener)
+        log.info('Proxy for http/https has been installed.')
+
+    # create db if not exists
+    if not os.path.exists(DB_NAME):
+        log.warn("Database [{}] doesn't exist! Creating...".format(DB_NAME))
+        db_create(DB_NAME)  # create target db
+    db_upgrade(DB_NAME)
+
+    # command line parameters
+    parser = argparse.ArgumentParser(description='Crawler for CIK geo points.')
+    parser.add_argument('--recrawl', action='store_true', help='incremental re-crawl of processed points')
+    parser.add_argument('--force-depth', type=int, default=None,
+                        help='re-crawl: levels always descended (0 - regions), default - all levels')
+    args = parser.parse_args()
+
+    if args.recrawl:  # re-fetch changed levels only
+        recrawl_geo_points(force_depth=args.force_depth)
+    else:  # init db first time
+        init_geo_points(text_filter=REGIONS)
+
+    # process/continue with geo points information (failed requests are re-tried one by one, failed points are
+    # re-processed in batches after the main pass)
+    process_geo_points()
+    redrive_failed_geo_points()
+    db_update_subtree_hashes(DB_NAME)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Smoke run of one crawl step of geocik (python 2 and 3): small lk_tree is served by local http server
+    (windows-1251 json, as the CIK service returns), geocik crawls it into temporary db the same way as the main
+    block does (init_geo_points(), process_geo_points(), redrive_failed_geo_points(), db_update_subtree_hashes()).
+    Then one commission is renamed and default re-crawl (all levels) finds the change. Another commission is renamed,
+    subtree of its parent is reset (as after failed request) and shallow re-crawl (--force-depth 0) finds the change
+    too. Counts of points and re-crawl results are checked, exit code is not 0 if any check fails.
+
+    Usage: python geocik_smoke.py [--tiks 3] [--uiks 5]
+"""
+
+from __future__ import print_function
+
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import sqlite3 as sql
+import os.path
+
+try:  # python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from urlparse import urlparse, parse_qs
+except ImportError:  # python 3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+
+import geocik
+from cikjson import JSON_ENCODING
+from geodb import db_create, db_close
+
+TOP_ID = 1
+REGION_TEXT = u'Ленинградская область'
+OTHER_REGION_TEXT = u'Новгородская область'  # not in geocik.REGIONS - isn't crawled
+RENAMED_TEXT = u'УИК №0 (новая)'
+RESET_RENAMED_TEXT = u'УИК №100 (новая)'
+
+
+def json_point(id, text, levelid, children):
+    """ Return geo point as lk_tree service returns it. """
+    return {'id': id, 'text': text, 'children': children, 'a_attr': {'intid': id + 100000, 'levelid': levelid},
+            'li_attr': {'class': 'jstree-closed'}, 'state': {'opened': False}}
+
+
+def synthetic_tree(tiks, uiks):
+    """ Return dict: id of point -> list of its children (json points), key None - top level response. """
+    region_id, other_region_id = 10, 20
+    tree = {None: [json_point(TOP_ID, u'Российская Федерация', 1, True)],
+            TOP_ID: [json_point(region_id, REGION_TEXT, 2, True), json_point(other_region_id, OTHER_REGION_TEXT, 2,
+                                                                             True)]}
+    tree[None][0]['children'] = tree[TOP_ID]
+    tree[region_id] = [json_point(1000 + tik, u'Территориальная избирательная комиссия №{}'.format(tik), 3, True)
+                       for tik in range(tiks)]
+    for tik in range(tiks):
+        tree[1000 + tik] = [json_point(10000 + tik * 100 + uik, u'УИК №{}'.format(tik * 100 + uik), 4, False)
+                            for uik in range(uiks)]
+    return tree
+
+
+class TreeHandler(BaseHTTPRequestHandler):
+    """ lk_tree service: top level without id, children of point by ?id=... (leaf points - empty array). """
+    tree = {}
+
+    def do_GET(self):
+        ids = parse_qs(urlparse(self.path).query).get('id')
+        points = self.tree.get(int(ids[0]) if ids else None, [])
+        body = json.dumps(points, ensure_ascii=False).encode(JSON_ENCODING)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=' + JSON_ENCODING)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # no access log
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Smoke run of one crawl step of geocik.')
+    parser.add_argument('--tiks', type=int, default=3, help='territorial commissions in the region')
+    parser.add_argument('--uiks', type=int, default=5, help='sector commissions of every territorial one')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    TreeHandler.tree = synthetic_tree(args.tiks, args.uiks)
+    server = HTTPServer(('127.0.0.1', 0), TreeHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:{}/services/lk_tree'.format(server.server_address[1])
+
+    directory = tempfile.mkdtemp(prefix='geocik_smoke')
+    try:
+        geocik.URL_TOP = url
+        geocik.URL_POINT = url + '/?id={}'
+        geocik.DB_NAME = os.path.join(directory, 'geodb.sqlite')
+        geocik.RETRY_COUNT = 1
+        db_create(geocik.DB_NAME)
+
+        # one crawl step - as in the main block of geocik
+        geocik.init_geo_points(text_filter=geocik.REGIONS)
+        geocik.process_geo_points()
+        geocik.redrive_failed_geo_points()
+        geocik.db_update_subtree_hashes(geocik.DB_NAME)
+        db_close(geocik.DB_NAME)
+
+        connection = sql.connect(geocik.DB_NAME)
+        total, processed, hashed = connection.execute(
+            'SELECT count(*), sum(processed = 1), sum(subtree_hash IS NOT NULL) FROM geo_points').fetchone()
+        regions = [row[0] for row in connection.execute('SELECT cik_text FROM geo_points WHERE levelid = 2')]
+        tik_geo_point_id = connection.execute('SELECT geo_point_id FROM geo_points WHERE id = 1001').fetchone()[0]
+        connection.close()
+
+        # re-crawl steps: (fetched, changed) of the full re-crawl and of the shallow one with reset subtree
+        TreeHandler.tree[1000][0]['text'] = RENAMED_TEXT
+        recrawl_full = geocik.recrawl_geo_points()
+        geocik.process_geo_points()
+        geocik.db_update_subtree_hashes(geocik.DB_NAME)
+        TreeHandler.tree[1001][0]['text'] = RESET_RENAMED_TEXT
+        geocik.db_invalidate_subtree_hashes(geocik.DB_NAME, tik_geo_point_id)
+        recrawl_reset = geocik.recrawl_geo_points(force_depth=0)
+        geocik.process_geo_points()
+        geocik.db_update_subtree_hashes(geocik.DB_NAME)
+        db_close(geocik.DB_NAME)
+
+        connection = sql.connect(geocik.DB_NAME)
+        renamed, rehashed = connection.execute(
+            'SELECT sum(cik_text IN (?, ?)), sum(subtree_hash IS NOT NULL) FROM geo_points',
+            (RENAMED_TEXT, RESET_RENAMED_TEXT)).fetchone()
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(directory)
+
+    expected = 2 + args.tiks * (1 + args.uiks)  # top level point, region, commissions
+    print('points: crawled [{}], processed [{}], hashed [{}], expected [{}]'.format(total, processed, hashed,
+                                                                                 expected))
+    if total != expected or processed != expected or hashed != expected or regions != [REGION_TEXT]:
+        print('FAILED: crawl is incomplete!')
+        return 1
+    # full re-crawl fetches all points below the top level one, shallow re-crawl - region, reset parent and renamed
+    # commission (its children are checked)
+    print('re-crawl (fetched, changed): full {}, shallow with reset subtree {}, renamed [{}], hashed [{}]'.format(
+        recrawl_full, recrawl_reset, renamed, rehashed))
+    if recrawl_full != (expected - 1, 1) or recrawl_reset != (3, 1) or renamed != 2 or rehashed != expected:
+        print('FAILED: re-crawl results differ!')
+        return 1
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,8 +8,15 @@
     Modified: Gusev Dmitrii, 11.02.2017
 """
 
+import os
 import logging
+import threading
 import sqlite3 as sql
+import heapq
+import hashlib
+from collections import defaultdict
+from contextlib import contextmanager
+from geotext import normalize_text, query_tokens, fts_query, search_rank
 
 # init module logging
 log = logging.getLogger(__name__)
@@ -18,6 +25,12 @@ log.addHandler(logging.NullHandler())
 # common constants
 # DB_NAME = 'geodata.sqlite'
 DB_NAME = 'geodb.sqlite'
+# kinds of entries in search index
+SEARCH_GEO_POINT = 'geo_point'
+SEARCH_ADDRESS = 'address'
+SEARCH_LIMIT = 20
+SEARCH_RANK_CANDIDATES = 500  # max number of matches ranked by one search query
+STATEMENTS_CACHE_SIZE = 200   # prepared statements cached by every connection (sqlite3 default is 100)
 
 # database script
 DB_SCRIPT = """
@@ -26,6 +39,9 @@ DB_SCRIPT = """
     DROP TABLE IF EXISTS commissions;
     DROP TABLE IF EXISTS addresses;
     DROP TABLE IF EXISTS geo_points;
+    DROP TABLE IF EXISTS search_index;
+    DROP TABLE IF EXISTS address_links;
+    DROP TABLE IF EXISTS people_rollups;
     -- create tables
     CREATE TABLE areas (id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE, name TEXT);
     CREATE TABLE commissions(id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE, city TEXT, 
@@ -35,75 +51,166 @@ DB_SCRIPT = """
     -- geo points from CIK RF database
     CREATE TABLE geo_points(geo_point_id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT UNIQUE, id INTEGER, 
       intid INTEGER, cik_text TEXT, levelid INTEGER, children TEXT, 
-      parent_id INTEGER REFERENCES geo_points(geo_point_id) ON DELETE RESTRICT, processed INTEGER DEFAULT 0);
+      parent_id INTEGER REFERENCES geo_points(geo_point_id) ON DELETE RESTRICT, processed INTEGER DEFAULT 0,
+      attempts INTEGER DEFAULT 0, children_hash TEXT, subtree_hash TEXT);
     CREATE UNIQUE INDEX geo_point_id_unique ON geo_points(id);
+    -- full-text search index over geo points texts and addresses (text is normalized, see geotext module)
+    CREATE VIRTUAL TABLE search_index USING fts5(text, title UNINDEXED, kind UNINDEXED, ref_id UNINDEXED,
+      tokenize = 'unicode61', prefix = '2 3');
 """
 
+# indexes for read paths (web api), script is idempotent - may be applied to existing db
+DB_INDEXES_SCRIPT = """
+    CREATE INDEX IF NOT EXISTS geo_points_parent_id ON geo_points(parent_id, geo_point_id);
+    CREATE INDEX IF NOT EXISTS addresses_commission_id ON addresses(commission_id, id);
+"""
+
+# columns added to geo_points after first release (column name -> definition), see db_upgrade()
+GEO_POINTS_NEW_COLUMNS = [
+    ('attempts', 'INTEGER DEFAULT 0'),  # failed processing attempts count
+    ('children_hash', 'TEXT'),          # hash of children json (see geocik.children_hash())
+    ('subtree_hash', 'TEXT'),           # rollup hash of the subtree, see db_update_subtree_hashes()
+]
+
+# links between addresses (from xls) and geo points (from CIK), see geomatch module. Script is idempotent.
+DB_ADDRESS_LINKS_SCRIPT = """
+    CREATE TABLE IF NOT EXISTS address_links(address_id INTEGER NOT NULL REFERENCES addresses(id) ON DELETE CASCADE,
+      geo_point_id INTEGER NOT NULL REFERENCES geo_points(geo_point_id) ON DELETE CASCADE, confidence REAL,
+      PRIMARY KEY (address_id, geo_point_id));
+    CREATE INDEX IF NOT EXISTS address_links_geo_point_id ON address_links(geo_point_id);
+"""
+
+# summary of commissions (count and people count) per city, territory commission and sector commission, updated
+# with every load of commissions, see update_people_rollups(). Names of commissions repeat in different cities
+# (sector numbers - in different territory commissions), so rollup is identified by its name and its parents:
+# city and territory commission (empty for upper levels). Script is idempotent.
+DB_ROLLUPS_SCRIPT = """
+    CREATE TABLE IF NOT EXISTS people_rollups(id INTEGER NOT NULL PRIMARY KEY, level TEXT NOT NULL,
+      city TEXT NOT NULL, territory_commission TEXT NOT NULL, name TEXT NOT NULL, commissions_count INTEGER,
+      people_count INTEGER, UNIQUE (level, city, territory_commission, name));
+"""
+# rollup level -> grouping columns of commissions (parents first, the last one is name of rollup)
+ROLLUP_LEVELS = {'city': ('city',), 'territory': ('city', 'territory_commission'),
+                 'sector': ('city', 'territory_commission', 'sector_commission')}
+# aggregation of commissions for one level (all of them or range of ids), see rollup_select_sql()
+ROLLUP_SELECT_SQL = "SELECT '{level}', {city}, {territory_commission}, {name}, COUNT(*), " \
+                    "COALESCE(SUM(people_count), 0) FROM main.commissions WHERE {condition} GROUP BY 2, 3, 4"
+
+
+# geo point insert (all values are parameters - one prepared statement for all points)
+INSERT_GEO_POINT_SQL = "INSERT INTO geo_points(id, intid, cik_text, levelid, children, parent_id, processed) " \
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+class ConnectionManager(object):
+    """ Shared long-lived connections to db files - one connection per thread and db file (sqlite connection can't
+    be used from different threads), so functions of module don't open db on every call and prepared statements
+    (sqlite3 caches them per connection by sql text) are reused between calls. Connections work in autocommit mode,
+    changes are made in explicit transactions - see transaction(). Connections of parent process aren't used after
+    fork. Before removing db file its connection has to be closed (see db_close()). """
+    def __init__(self, cached_statements=STATEMENTS_CACHE_SIZE):
+        self.__cached_statements = cached_statements
+        self.__local = threading.local()
+
+    def __entries(self):
+        """ Connections of the current thread: dictionary dbname -> [connection, transaction depth]. """
+        local = self.__local
+        if getattr(local, 'pid', None) != os.getpid():
+            if getattr(local, 'entries', None):  # inherited from parent process - aren't used and aren't closed
+                local.inherited = local.entries
+            local.pid = os.getpid()
+            local.entries = {}
+        return local.entries
+
+    def __entry(self, dbname):
+        entries = self.__entries()
+        entry = entries.get(dbname)
+        if entry is None:
+            connection = sql.connect(dbname, isolation_level=None, cached_statements=self.__cached_statements)
+            entry = entries[dbname] = [connection, 0]
+        return entry
+
+    def connection(self, dbname):
+        """ Return connection of the current thread to db. """
+        return self.__entry(dbname)[0]
+
+    @contextmanager
+    def transaction(self, dbname, immediate=False):
+        """
+        Transaction on the shared connection: it's committed on exit and rolled back on exception. Nested
+        transaction is a part of the outer one.
+        :param dbname:
+        :param immediate: lock db for writing at start (BEGIN IMMEDIATE)
+        :return: cursor
+        """
+        entry = self.__entry(dbname)
+        connection = entry[0]
+        cursor = connection.cursor()
+        if not entry[1]:
+            cursor.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        entry[1] += 1
+        try:
+            yield cursor
+        except BaseException:
+            entry[1] -= 1
+            if not entry[1]:
+                connection.rollback()
+            raise
+        entry[1] -= 1
+        if not entry[1]:
+            try:
+                connection.commit()
+            except sql.Error:  # e.g. db is locked - transaction isn't left open on the shared connection
+                connection.rollback()
+                raise
+
+    def close(self, dbname=None):
+        """ Close connections of the current thread (to one db or all). """
+        entries = self.__entries()
+        for name in [dbname] if dbname else list(entries):
+            entry = entries.pop(name, None)
+            if entry is not None:
+                entry[0].close()
+
+
+# connections used by all functions of module
+connections = ConnectionManager()
+
+
+def db_close(dbname=None):
+    """
+    Close connections of the current thread (e.g. before removing db file).
+    :param dbname: db to close, None - all
+    :return:
+    """
+    connections.close(dbname)
+
 
 class GeoDB(object):
-    """ Class for utilizing sqlite3 connection. """
+    """ Class for utilizing sqlite3 connection (shared connections of module, see ConnectionManager). """
     def __init__(self, dbname):
         # init logger
         self.log = logging.getLogger(__name__)
         self.log.addHandler(logging.NullHandler())
         self.log.debug('Creating GeoDB instance.')
         self.__dbname = dbname
-        self.__connection = None
-        self.__cursor = None
-
-    # todo: create decorator for closing connection on exception
-    # todo: create executor method for utilizing with all other methods
-    def db_mark_geo_point_as_processed(self, dbname, geo_point_id, processed_status=1):
-        """"""
-        log.debug('GeoDB.db_mark_geo_point_as_processed(): mark point [{}] as processed with status [{}].'
-                  .format(geo_point_id, processed_status))
-        update_sql = "UPDATE geo_points SET processed = {} WHERE geo_point_id = {}" \
-            .format(processed_status, geo_point_id)
-        # check connection
-        if not self.__connection:
-            self.__connection = sql.connect(dbname)
-            self.__cursor = self.__connection.cursor()
+
+    def db_mark_geo_point_as_processed(self, dbname, geo_point_id, processed_status=1, children_hash=None):
+        """ Mark geo point as processed, status 2 (processed with errors) increments failed attempts count.
+        Hash of children json (if any) is saved too. """
+        log.debug('GeoDB.db_mark_geo_point_as_processed(): mark point [%s] as processed with status [%s].',
+                  geo_point_id, processed_status)
         try:
-            # performing db operations
-            self.__cursor.execute(update_sql)
-            self.__connection.commit()
-        except StandardError as se:
-            self.log.error('Error occured: {}'.format(se.message))
-            self.__connection.close()
+            with connections.transaction(dbname) as cursor:
+                cursor.execute('UPDATE geo_points SET processed = ?, attempts = attempts + ?, '
+                               'children_hash = COALESCE(?, children_hash) WHERE geo_point_id = ?',
+                               (processed_status, 1 if processed_status == 2 else 0, children_hash, geo_point_id))
+        except sql.Error as e:
+            self.log.error('Error occured: %s', e)
 
     def db_add_multiple_geo_points(self, dbname, list_of_geo_points):
-        """"""
-        # log.debug('db_add_multiple_geo_points(): adding multiple geo points.')  # <- too much output
-        # if list is empty - quick return
-        if not list_of_geo_points or len(list_of_geo_points) == 0:
-            self.log.debug('List of geo points is empty. Nothing to add.')
-            return
-        # list isn't empty - processing
-        sql_list = []
-        insert_sql = "INSERT INTO geo_points(id, intid, cik_text, levelid, children, parent_id, processed) " \
-                     "VALUES ({}, {}, '{}', {}, '{}', {}, {})"
-        # process all specified geo points
-        for geo_point in list_of_geo_points:
-            # get info from list entry
-            id = geo_point[0]
-            intid = geo_point[1]
-            cik_text = geo_point[2]
-            levelid = geo_point[3]
-            children = geo_point[4]
-            parent_id = geo_point[5]
-            processed = geo_point[6]
-            # add values to query and add query to list
-            sql_list.append(insert_sql.format(id, intid, cik_text, levelid, children, parent_id, processed))
-        # check connection
-        if not self.__connection:
-            self.__connection = sql.connect(dbname)
-            self.__cursor = self.__connection.cursor()
-        # execute multip[le sqls
-        for query in sql_list:
-            self.__cursor.execute(query)
-        # commit all added points
-        self.__connection.commit()
-        self.log.debug('Geo points list [len = {}] has been added.'.format(len(list_of_geo_points)))
+        """ Add list of geo points in one transaction, return list of inserted ids (in order of list). """
+        return db_add_multiple_geo_points(dbname, list_of_geo_points)
 
 
 # todo: add exceptions handling for db operations (in case of exception close connection etc.)
@@ -115,14 +222,228 @@ def db_create(dbname):
     :return:
     """
     log.debug('db_create: creating database structure.')
-    # connect to sqlite db
-    conn = sql.connect(dbname)
-    cur = conn.cursor()
-    log.debug('Connected to DB [{}].'.format(dbname))
+    cursor = connections.connection(dbname).cursor()
     # execute db setup script
     for query in DB_SCRIPT.split(';'):
-        cur.execute(query)
+        cursor.execute(query)
     log.debug('DB structure created.')
+    db_upgrade(dbname)
+    db_create_indexes(dbname)
+    db_create_address_links(dbname)
+    db_create_rollups(dbname)
+
+
+def db_upgrade(dbname):
+    """
+    Add to geo_points table new columns (see GEO_POINTS_NEW_COLUMNS), that db created by previous versions
+    doesn't have. Operation is idempotent!
+    :param dbname:
+    :return:
+    """
+    log.debug('db_upgrade(): upgrading database structure.')
+    with connections.transaction(dbname) as cursor:
+        existing = [row[1] for row in cursor.execute('PRAGMA table_info(geo_points)').fetchall()]
+        for column, definition in GEO_POINTS_NEW_COLUMNS:
+            if column not in existing:
+                cursor.execute('ALTER TABLE geo_points ADD COLUMN {} {}'.format(column, definition))
+                log.info('Added column [{}] to geo_points.'.format(column))
+
+
+def db_create_indexes(dbname):
+    """
+    Create (if not exist yet) indexes for read paths. Operation is idempotent!
+    :param dbname:
+    :return:
+    """
+    log.debug('db_create_indexes(): creating indexes.')
+    connections.connection(dbname).executescript(DB_INDEXES_SCRIPT)
+    log.debug('DB indexes created.')
+
+
+def db_create_address_links(dbname):
+    """
+    Create (if not exists yet) table for links between addresses and geo points. Operation is idempotent!
+    :param dbname:
+    :return:
+    """
+    log.debug('db_create_address_links(): creating links table.')
+    connections.connection(dbname).executescript(DB_ADDRESS_LINKS_SCRIPT)
+
+
+def db_save_address_links(dbname, links_list):
+    """
+    Replace all links between addresses and geo points, in one transaction.
+    :param dbname:
+    :param links_list: list (or iterable) of tuples (address id, geo point id, confidence)
+    :return: saved links count
+    """
+    log.debug('db_save_address_links(): saving links.')
+    db_create_address_links(dbname)
+    with connections.transaction(dbname, immediate=True) as cursor:
+        cursor.execute('DELETE FROM address_links')
+        cursor.executemany('INSERT OR REPLACE INTO address_links(address_id, geo_point_id, confidence) '
+                           'VALUES (?, ?, ?)', links_list)
+        cursor.execute('SELECT count(*) FROM address_links')
+        count = cursor.fetchone()[0]
+    log.debug('Saved [{}] link(s).'.format(count))
+    return count
+
+
+def db_create_rollups(dbname):
+    """
+    Create (if not exists yet) table of rollups, new table is filled from existing commissions. Operation is
+    idempotent!
+    :param dbname:
+    :return:
+    """
+    log.debug('db_create_rollups(): creating rollups table.')
+    connection = connections.connection(dbname)
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(people_rollups)').fetchall()]
+    if columns and 'city' not in columns:  # table of previous version (keyed by name only) is re-created
+        log.info('Re-creating rollups table with keys by parents.')
+        connection.execute('DROP TABLE people_rollups')
+        columns = []
+    connection.executescript(DB_ROLLUPS_SCRIPT)
+    if not columns:
+        db_rebuild_people_rollups(dbname)
+
+
+def rollup_select_sql(level, condition):
+    """ Return aggregation query of commissions for rollup level, rows: (level, city, territory_commission, name,
+    commissions count, people count). """
+    columns = ["COALESCE({}, '')".format(column) for column in ROLLUP_LEVELS[level]]
+    parents = (columns[:-1] + ["''", "''"])[:2]  # empty parents for upper levels
+    return ROLLUP_SELECT_SQL.format(level=level, city=parents[0], territory_commission=parents[1], name=columns[-1],
+                                    condition=condition)
+
+
+def update_people_rollups(cursor, first_id, last_id):
+    """
+    Add commissions with ids in range [first_id, last_id] (just inserted) to rollups, in the current transaction
+    of cursor.
+    :param cursor:
+    :param first_id:
+    :param last_id:
+    :return:
+    """
+    for level in ROLLUP_LEVELS:
+        cursor.execute('INSERT INTO main.people_rollups(level, city, territory_commission, name, commissions_count, '
+                       'people_count) ' + rollup_select_sql(level, 'id BETWEEN ? AND ?') +
+                       ' ON CONFLICT(level, city, territory_commission, name) DO UPDATE SET '
+                       'commissions_count = commissions_count + excluded.commissions_count, '
+                       'people_count = people_count + excluded.people_count', (first_id, last_id))
+
+
+def db_rebuild_people_rollups(dbname):
+    """
+    Recalculate rollups from all commissions.
+    :param dbname:
+    :return:
+    """
+    log.debug('db_rebuild_people_rollups(): recalculating rollups.')
+    with connections.transaction(dbname) as cursor:
+        cursor.execute('DELETE FROM people_rollups')
+        for level in ROLLUP_LEVELS:
+            cursor.execute('INSERT INTO people_rollups(level, city, territory_commission, name, commissions_count, '
+                           'people_count) ' + rollup_select_sql(level, '1'))
+
+
+def db_check_people_rollups(dbname):
+    """
+    Compare rollups with the full recalculation from commissions.
+    :param dbname:
+    :return: list of differences - tuples (level, (city, territory_commission, name), stored (count, people count),
+             recalculated (count, people count)), missing row is None
+    """
+    log.debug('db_check_people_rollups(): checking rollups.')
+    connection = connections.connection(dbname)
+    differences = []
+    for level in ROLLUP_LEVELS:
+        expected = dict((tuple(row[1:4]), tuple(row[4:])) for row in connection.execute(rollup_select_sql(level, '1')))
+        stored = dict((tuple(row[:3]), tuple(row[3:])) for row in connection.execute(
+            'SELECT city, territory_commission, name, commissions_count, people_count FROM people_rollups '
+            'WHERE level = ?', (level,)))
+        for key in set(expected) | set(stored):
+            if expected.get(key) != stored.get(key):
+                differences.append((level, key, stored.get(key), expected.get(key)))
+    log.info('Rollups check: [{}] difference(s).'.format(len(differences)))
+    return differences
+
+
+def db_create_search_index(dbname, rebuild=False):
+    """
+    Create (if not exist yet) search index and fill it from geo points and addresses. Existing index is
+    re-filled only if rebuild is True.
+    :param dbname:
+    :param rebuild:
+    :return:
+    """
+    log.debug('db_create_search_index(): creating search index, rebuild = [{}].'.format(rebuild))
+    with connections.transaction(dbname) as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = 'search_index'")
+        exists = cursor.fetchone()[0] > 0
+        if exists and not rebuild:
+            return
+        if not exists:
+            create_sql = [query for query in DB_SCRIPT.split(';') if 'CREATE VIRTUAL TABLE search_index' in query]
+            cursor.execute(create_sql[0])
+        cursor.execute('DELETE FROM search_index')
+        index_search_rows(cursor, SEARCH_GEO_POINT, cursor.execute(
+            'SELECT geo_point_id, cik_text FROM geo_points').fetchall())
+        index_search_rows(cursor, SEARCH_ADDRESS, [(row[0], address_title(row[1], row[2])) for row in cursor.execute(
+            'SELECT id, street, buildings FROM addresses').fetchall()])
+    log.debug('Search index created.')
+
+
+def address_title(street, buildings):
+    """ Return address text for search index. """
+    if buildings:
+        return u'{}, {}'.format(street, buildings)  # text on python 2 too
+    return street
+
+
+def index_search_rows(cursor, kind, rows):
+    """
+    Add entries into search index (in the current transaction of cursor).
+    :param cursor:
+    :param kind: kind of indexed entries (SEARCH_GEO_POINT, SEARCH_ADDRESS)
+    :param rows: list of tuples (id of indexed entry, text)
+    :return:
+    """
+    cursor.executemany("INSERT INTO search_index(text, title, kind, ref_id) VALUES (?, ?, ?, ?)",
+                       [(normalize_text(text), text, kind, ref_id) for ref_id, text in rows])
+
+
+def db_search(dbname, query, kind=None, limit=SEARCH_LIMIT, connection=None):
+    """
+    Ranked full-text search over geo points texts and addresses. Query is normalized the same way as indexed
+    texts, so 'Невский пр' finds 'проспект Невский'. FTS index selects candidates (all query tokens are
+    required) in bm25 order (fts5 rank), best SEARCH_RANK_CANDIDATES of them are re-ranked with
+    geotext.search_rank() - the limit cuts the worst matches of broad queries, not arbitrary ones.
+    :param dbname:
+    :param query: user query
+    :param kind: search only entries of this kind (SEARCH_GEO_POINT, SEARCH_ADDRESS), None - all kinds
+    :param limit:
+    :param connection: use this connection instead of the shared one
+    :return: list of tuples (kind, id, title, rank), better matches first
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    select_sql = "SELECT kind, ref_id, title, text FROM search_index WHERE search_index MATCH ?"
+    params = [match]
+    if kind:
+        select_sql += " AND kind = ?"
+        params.append(kind)
+    select_sql += " ORDER BY rank LIMIT ?"
+    params.append(SEARCH_RANK_CANDIDATES)
+
+    if connection is None:
+        connection = connections.connection(dbname)
+    candidates = connection.execute(select_sql, params).fetchall()
+    tokens = query_tokens(query)
+    ranked = [(row[0], row[1], row[2], search_rank(tokens, row[3])) for row in candidates]
+    return heapq.nsmallest(limit, ranked, key=lambda row: row[3])
 
 
 def db_add_areas(dbname, areas_list):
@@ -133,26 +454,45 @@ def db_add_areas(dbname, areas_list):
     :return:
     """
     log.debug('db_add_areas(): adding areas {}.'.format(areas_list))
-    insert_sql = 'INSERT INTO areas(name) VALUES ("{}")'
-    # connect to db and in cycle insert records
-    connection = sql.connect(dbname)
-    cursor = connection.cursor()
-    log.debug('Connected to DB [{}].'.format(dbname))
-    for area in areas_list:
-        cursor.execute(insert_sql.format(area))
-    connection.commit()
+    with connections.transaction(dbname) as cursor:
+        cursor.executemany('INSERT INTO areas(name) VALUES (?)', [(area,) for area in areas_list])
     log.debug('All areas added.')
 
 
-def db_add_commissions(dbname, commissions_list):
+def db_add_commissions(dbname, commissions_list, addresses_list=None):
     """
-    Add multiple commissions at a time.
+    Add multiple commissions (and their addresses) at a time - with executemany() in one transaction. Ids of new
+    commissions are assigned here (continue max id in table), so addresses reference commissions by index in
+    commissions list and there is no lastrowid round trip for every commission.
     :param dbname:
-    :param commissions_list:
-    :return:
+    :param commissions_list: list of tuples (city, territory_commission, sector_commission, people_count)
+    :param addresses_list: list of tuples (street, buildings, index of commission in commissions_list), index
+                           None means address without commission (commission_id = 0)
+    :return: list of inserted commissions ids (in order of commissions_list)
     """
-    log.debug('db_add_commissions(): adding commissions.')
-    raise StandardError('Not implemented!')
+    if not addresses_list:
+        addresses_list = []
+    log.debug('db_add_commissions(): adding commissions [{}] and addresses [{}].'
+              .format(len(commissions_list), len(addresses_list)))
+    with connections.transaction(dbname, immediate=True) as cursor:  # lock db for writing before reading max id
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM commissions')
+        first_id = cursor.fetchone()[0] + 1
+        ids = list(range(first_id, first_id + len(commissions_list)))
+        cursor.executemany("INSERT INTO commissions(id, city, territory_commission, sector_commission, people_count) "
+                           "VALUES (?, ?, ?, ?, ?)",
+                           [(ids[index],) + tuple(commission) for index, commission in enumerate(commissions_list)])
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM addresses')
+        first_address_id = cursor.fetchone()[0] + 1
+        cursor.executemany("INSERT INTO addresses(id, street, buildings, commission_id) VALUES (?, ?, ?, ?)",
+                           [(first_address_id + number, street, buildings, ids[index] if index is not None else 0)
+                            for number, (street, buildings, index) in enumerate(addresses_list)])
+        index_search_rows(cursor, SEARCH_ADDRESS,
+                          [(first_address_id + number, address_title(street, buildings))
+                           for number, (street, buildings, index) in enumerate(addresses_list)])
+        if ids:
+            update_people_rollups(cursor, ids[0], ids[-1])
+    log.debug('Commissions [{}] and addresses [{}] have been added.'.format(len(commissions_list), len(addresses_list)))
+    return ids
 
 
 def db_add_commission(dbname, city, territory_commission, sector_commission, people_count):
@@ -165,20 +505,56 @@ def db_add_commission(dbname, city, territory_commission, sector_commission, peo
     :param people_count:
     :return:
     """
-    log.debug('db_add_commission(): adding commission [{}, {}, {}, {}].'
-              .format(city, territory_commission, sector_commission, people_count))
-    insert_sql = "INSERT INTO commissions(city, territory_commission, sector_commission, people_count) " \
-                 "VALUES ('{}', '{}', '{}', {})".format(city, territory_commission, sector_commission, people_count)
-    connection = sql.connect(dbname)
-    cursor = connection.cursor()
-    log.debug('Connected to DB [{}].'.format(dbname))
-    cursor.execute(insert_sql)
-    last_id = cursor.lastrowid
-    connection.commit()
+    log.debug('db_add_commission(): adding commission [%s, %s, %s, %s].',
+              city, territory_commission, sector_commission, people_count)
+    with connections.transaction(dbname) as cursor:
+        cursor.execute('INSERT INTO commissions(city, territory_commission, sector_commission, people_count) '
+                       'VALUES (?, ?, ?, ?)', (city, territory_commission, sector_commission, people_count))
+        last_id = cursor.lastrowid
+        update_people_rollups(cursor, last_id, last_id)
     log.debug('Last inserted id = [{}].'.format(last_id))
     return last_id
 
 
+def db_merge_staging(dbname, staging_dbname):
+    """
+    Merge commissions and addresses from staging db (db with the same structure, filled by one loader worker)
+    into the main db, in one transaction. Staging commissions and addresses ids are shifted after max ids in the
+    main db, addresses references and search index entries are shifted accordingly.
+    :param dbname:
+    :param staging_dbname:
+    :return: tuple (merged commissions count, merged addresses count)
+    """
+    log.debug('db_merge_staging(): merging [{}] into [{}].'.format(staging_dbname, dbname))
+    connection = connections.connection(dbname)
+    connection.execute('ATTACH DATABASE ? AS staging', (staging_dbname,))
+    try:
+        with connections.transaction(dbname, immediate=True) as cursor:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM main.commissions')
+            offset = cursor.fetchone()[0]
+            cursor.execute("INSERT INTO main.commissions(id, city, territory_commission, sector_commission, "
+                           "people_count) SELECT id + ?, city, territory_commission, sector_commission, people_count "
+                           "FROM staging.commissions ORDER BY id", (offset,))
+            commissions_count = cursor.rowcount
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM main.commissions')
+            update_people_rollups(cursor, offset + 1, cursor.fetchone()[0])
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM main.addresses')
+            addresses_offset = cursor.fetchone()[0]
+            cursor.execute("INSERT INTO main.addresses(id, street, buildings, commission_id) "
+                           "SELECT id + ?, street, buildings, "
+                           "CASE WHEN commission_id = 0 THEN 0 ELSE commission_id + ? END "
+                           "FROM staging.addresses ORDER BY id", (addresses_offset, offset))
+            addresses_count = cursor.rowcount
+            # search index entries are already normalized in staging db
+            cursor.execute("INSERT INTO main.search_index(text, title, kind, ref_id) "
+                           "SELECT text, title, kind, ref_id + ? FROM staging.search_index WHERE kind = ?",
+                           (addresses_offset, SEARCH_ADDRESS))
+    finally:
+        connection.execute('DETACH DATABASE staging')
+    log.debug('Merged commissions [{}] and addresses [{}].'.format(commissions_count, addresses_count))
+    return commissions_count, addresses_count
+
+
 def db_add_address(dbname, street, buildings, commission_id):
     """
     Add one address at a time, return inserted id.
@@ -188,115 +564,239 @@ def db_add_address(dbname, street, buildings, commission_id):
     :param commission_id:
     :return:
     """
-    log.debug('db_add_address(): adding address [{}, {}, {}].'
-              .format(street, buildings, commission_id))
-    insert_sql = "INSERT INTO addresses(street, buildings, commission_id) VALUES ('{}', '{}', '{}')" \
-        .format(street, buildings, commission_id)
-    connection = sql.connect(dbname)
-    cursor = connection.cursor()
-    log.debug('Connected to DB [{}].'.format(dbname))
-    cursor.execute(insert_sql)
-    last_id = cursor.lastrowid
-    connection.commit()
+    log.debug('db_add_address(): adding address [%s, %s, %s].', street, buildings, commission_id)
+    with connections.transaction(dbname) as cursor:
+        cursor.execute('INSERT INTO addresses(street, buildings, commission_id) VALUES (?, ?, ?)',
+                       (street, buildings, commission_id))
+        last_id = cursor.lastrowid
+        index_search_rows(cursor, SEARCH_ADDRESS, [(last_id, address_title(street, buildings))])
     log.debug('Last inserted id = [{}].'.format(last_id))
     return last_id
 
 
 def db_add_single_geo_point(dbname, id, intid, cik_text, levelid, children, parent_id, processed=0):
     """"""
-    if not intid:
-        intid = 'NULL'
-    insert_sql = "INSERT INTO geo_points(id, intid, cik_text, levelid, children, parent_id, processed) " \
-                 "VALUES ({}, {}, '{}', {}, '{}', {}, {})"\
-        .format(id, intid, cik_text, levelid, children, parent_id, processed)
-    log.debug('db_add_geo_point(): adding geopoint.\n\tSQL -> [{}].'.format(insert_sql))
-
-    connection = sql.connect(dbname)
-    try:
-        cursor = connection.cursor()
-        cursor.execute(insert_sql)
+    log.debug('db_add_geo_point(): adding geopoint [%s].', id)
+    with connections.transaction(dbname) as cursor:
+        cursor.execute(INSERT_GEO_POINT_SQL, (id, intid or None, cik_text, levelid, children, parent_id, processed))
         last_id = cursor.lastrowid
-        connection.commit()
-        log.debug('Geo point has been added. Last inserted id = [{}].'.format(last_id))
-        return last_id
-    finally:
-        connection.close()
+        index_search_rows(cursor, SEARCH_GEO_POINT, [(last_id, cik_text)])
+    log.debug('Geo point has been added. Last inserted id = [%s].', last_id)
+    return last_id
 
 
-# todo: remove this method - it has been moved to GeoDB object
 def db_add_multiple_geo_points(dbname, list_of_geo_points):
-    """"""
+    """ Add list of geo points in one transaction, return list of inserted ids (in order of list).
+    :param list_of_geo_points: list of tuples (id, intid, cik_text, levelid, children, parent_id, processed)
+    """
     # log.debug('db_add_multiple_geo_points(): adding multiple geo points.')  # <- too much output
 
     # if list is empty - quick return
     if not list_of_geo_points or len(list_of_geo_points) == 0:
         log.debug('List of geo points is empty. Nothing to add.')
-        return
-
-    # list isn't empty - processing
-    sql_list = []
-    insert_sql = "INSERT INTO geo_points(id, intid, cik_text, levelid, children, parent_id, processed) " \
-                 "VALUES ({}, {}, '{}', {}, '{}', {}, {})"
-    # process all specified geo points
-    for geo_point in list_of_geo_points:
-        # get info from list entry
-        id = geo_point[0]
-        intid = geo_point[1]
-        cik_text = geo_point[2]
-        levelid = geo_point[3]
-        children = geo_point[4]
-        parent_id = geo_point[5]
-        processed = geo_point[6]
-        # add values to query and add query to list
-        sql_list.append(insert_sql.format(id, intid, cik_text, levelid, children, parent_id, processed))
-
-    # execute multip[le sqls
-    connection = sql.connect(dbname)
-    cursor = connection.cursor()
-    for query in sql_list:
-        cursor.execute(query)
-    # commit all added points
-    connection.commit()
-    log.debug('Geo points list [len = {}] has been added.'.format(len(list_of_geo_points)))
+        return []
+
+    # batch is added all or nothing
+    search_rows = []
+    with connections.transaction(dbname) as cursor:
+        for id, intid, cik_text, levelid, children, parent_id, processed in list_of_geo_points:
+            cursor.execute(INSERT_GEO_POINT_SQL, (id, intid or None, cik_text, levelid, children, parent_id, processed))
+            search_rows.append((cursor.lastrowid, cik_text))
+        index_search_rows(cursor, SEARCH_GEO_POINT, search_rows)
+    log.debug('Geo points list [len = %s] has been added.', len(list_of_geo_points))
+    return [geo_point_id for geo_point_id, cik_text in search_rows]
 
 
 def db_get_not_processed_geo_points_ids(dbname):
     """"""
     log.debug('db_get_not_processed_geo_points_ids(): processing.')
     select_sql = "SELECT geo_point_id, id, intid, cik_text FROM geo_points WHERE processed = 0"
-    connection = sql.connect(dbname)
-    cursor = connection.cursor()
-    cursor.execute(select_sql)
-    # iterate over rows and put them into result
-    result = []
-    for row in cursor:
-        result.append(row)
-    return result
+    return connections.connection(dbname).execute(select_sql).fetchall()
+
+
+def db_get_frontier_geo_points(dbname):
+    """
+    Return not processed geo points with their regions (region - point, which parent is top level point).
+    :param dbname:
+    :return: list of tuples (geo_point_id, id, cik_text, levelid, children, region cik_text)
+    """
+    log.debug('db_get_frontier_geo_points(): processing.')
+    select_sql = """
+        WITH RECURSIVE ancestors(geo_point_id, ancestor_id) AS (
+          SELECT geo_point_id, geo_point_id FROM geo_points WHERE processed = 0
+          UNION ALL
+          SELECT a.geo_point_id, g.parent_id FROM ancestors a JOIN geo_points g ON g.geo_point_id = a.ancestor_id
+          WHERE g.parent_id != 0)
+        SELECT p.geo_point_id, p.id, p.cik_text, p.levelid, p.children, r.cik_text FROM geo_points p
+          LEFT JOIN (SELECT a.geo_point_id, region.cik_text FROM ancestors a
+                     JOIN geo_points region ON region.geo_point_id = a.ancestor_id
+                     JOIN geo_points top ON top.geo_point_id = region.parent_id AND top.parent_id = 0) r
+          ON r.geo_point_id = p.geo_point_id
+        WHERE p.processed = 0
+    """
+    return connections.connection(dbname).execute(select_sql).fetchall()
+
+
+def db_redrive_failed_geo_points(dbname, max_attempts):
+    """
+    Return geo points processed with errors (status 2) back to processing (status 0), only points with less
+    than max_attempts failed attempts are returned.
+    :param dbname:
+    :param max_attempts:
+    :return: count of returned points
+    """
+    log.debug('db_redrive_failed_geo_points(): re-drive points with less than [{}] attempts.'.format(max_attempts))
+    with connections.transaction(dbname) as cursor:
+        cursor.execute('UPDATE geo_points SET processed = 0 WHERE processed = 2 AND attempts < ?', (max_attempts,))
+        count = cursor.rowcount
+    log.debug('Returned [{}] point(s) to processing.'.format(count))
+    return count
+
+
+def db_get_geo_point_children(dbname, geo_point_id):
+    """
+    Return children of geo point.
+    :param dbname:
+    :param geo_point_id:
+    :return: list of tuples (geo_point_id, id, intid, cik_text, levelid, children, processed, children_hash,
+             subtree_hash)
+    """
+    return connections.connection(dbname).execute(
+        'SELECT geo_point_id, id, intid, cik_text, levelid, children, processed, children_hash, subtree_hash '
+        'FROM geo_points WHERE parent_id = ? ORDER BY geo_point_id', (geo_point_id,)).fetchall()
+
+
+def invalidate_subtree_hashes(cursor, geo_point_id):
+    """
+    Reset subtree hashes of geo point and all its ancestors (subtree isn't checked completely), in the current
+    transaction of cursor. See db_update_subtree_hashes().
+    :param cursor:
+    :param geo_point_id:
+    :return:
+    """
+    cursor.execute('WITH RECURSIVE ancestors(geo_point_id) AS (SELECT ? UNION ALL SELECT g.parent_id '
+                   'FROM geo_points g JOIN ancestors a ON g.geo_point_id = a.geo_point_id WHERE g.parent_id != 0) '
+                   'UPDATE geo_points SET subtree_hash = NULL WHERE geo_point_id IN ancestors', (geo_point_id,))
+
+
+def db_invalidate_subtree_hashes(dbname, geo_point_id):
+    """ Reset subtree hashes of geo point and its ancestors - subtree is checked by the next re-crawl. """
+    log.debug('db_invalidate_subtree_hashes(): point [%s].', geo_point_id)
+    with connections.transaction(dbname) as cursor:
+        invalidate_subtree_hashes(cursor, geo_point_id)
+
+
+def db_update_geo_point_children(dbname, parent_id, added, changed, removed, children_hash):
+    """
+    Apply changes of geo point children (found by re-crawl) and save new hash of children json. All changes
+    are applied in one transaction, subtree hashes of the point, its ancestors and changed children are reset.
+    :param dbname:
+    :param parent_id: geo_point_id of the parent point
+    :param added: list of tuples (id, intid, cik_text, levelid, children) - new points (not processed)
+    :param changed: list of tuples (geo_point_id, intid, cik_text, levelid, children) - changed points
+    :param removed: list of geo_point_id - removed points, they are deleted with their subtrees
+    :param children_hash:
+    :return: count of deleted points (with subtrees)
+    """
+    log.debug('db_update_geo_point_children(): point [%s], added [%s], changed [%s], removed [%s].',
+              parent_id, len(added), len(changed), len(removed))
+    with connections.transaction(dbname, immediate=True) as cursor:
+        # collect removed subtrees
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS removed_points(geo_point_id INTEGER PRIMARY KEY)')
+        cursor.execute('DELETE FROM temp.removed_points')
+        for geo_point_id in removed:
+            cursor.execute('WITH RECURSIVE subtree(geo_point_id) AS (SELECT ? UNION ALL SELECT g.geo_point_id '
+                           'FROM geo_points g JOIN subtree s ON g.parent_id = s.geo_point_id) '
+                           'INSERT OR IGNORE INTO temp.removed_points SELECT geo_point_id FROM subtree',
+                           (geo_point_id,))
+        deleted = cursor.execute('SELECT COUNT(*) FROM temp.removed_points').fetchone()[0]
+        # search index entries of removed and changed points (one scan of index)
+        cursor.executemany('INSERT OR IGNORE INTO temp.removed_points VALUES (?)',
+                           [(point[0],) for point in changed])
+        cursor.execute('DELETE FROM search_index WHERE kind = ? AND ref_id IN '
+                       '(SELECT geo_point_id FROM temp.removed_points)', (SEARCH_GEO_POINT,))
+        cursor.executemany('DELETE FROM temp.removed_points WHERE geo_point_id = ?',
+                           [(point[0],) for point in changed])
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'address_links'").fetchone():
+            cursor.execute('DELETE FROM address_links WHERE geo_point_id IN '
+                           '(SELECT geo_point_id FROM temp.removed_points)')
+        cursor.execute('DELETE FROM geo_points WHERE geo_point_id IN (SELECT geo_point_id FROM temp.removed_points)')
+        # changed and new points
+        cursor.executemany('UPDATE geo_points SET intid = ?, cik_text = ?, levelid = ?, children = ?, '
+                           'subtree_hash = NULL WHERE geo_point_id = ?',
+                           [(intid, cik_text, levelid, children, geo_point_id)
+                            for geo_point_id, intid, cik_text, levelid, children in changed])
+        search_rows = [(point[0], point[2]) for point in changed]
+        for id, intid, cik_text, levelid, children in added:
+            cursor.execute('INSERT INTO geo_points(id, intid, cik_text, levelid, children, parent_id, processed) '
+                           'VALUES (?, ?, ?, ?, ?, ?, 0)', (id, intid, cik_text, levelid, children, parent_id))
+            search_rows.append((cursor.lastrowid, cik_text))
+        index_search_rows(cursor, SEARCH_GEO_POINT, search_rows)
+        cursor.execute('UPDATE geo_points SET children_hash = ? WHERE geo_point_id = ?', (children_hash, parent_id))
+        invalidate_subtree_hashes(cursor, parent_id)
+    return deleted
+
+
+def db_update_subtree_hashes(dbname):
+    """
+    Recalculate rollup hashes of subtrees (Merkle tree over geo points): subtree hash of the point is the hash
+    of its children json hash and subtree hashes of its children (ordered by geo_point_id). Changed subtree
+    changes hashes of all its ancestors, so equal subtree hash means the subtree isn't changed. Subtree with not
+    processed (or failed) points has no hash (NULL), as well as all its ancestors - re-crawl descends into such
+    subtrees (see geocik.recrawl_geo_points()). Only changed hashes are written.
+    :param dbname:
+    :return: count of updated points
+    """
+    log.debug('db_update_subtree_hashes(): calculating subtree hashes.')
+    connection = connections.connection(dbname)
+    children = defaultdict(list)
+    children_hashes = {}
+    subtree_hashes = {}
+    for geo_point_id, parent_id, processed, children_hash, subtree_hash in connection.execute(
+            'SELECT geo_point_id, parent_id, processed, children_hash, subtree_hash FROM geo_points '
+            'ORDER BY geo_point_id'):
+        children[parent_id].append(geo_point_id)
+        if parent_id == 0:  # top level point isn't re-crawled (re-crawl starts from regions), it has no json hash
+            children_hash = children_hash or ''
+        children_hashes[geo_point_id] = children_hash if processed == 1 else None
+        subtree_hashes[geo_point_id] = subtree_hash
+
+    # order points from the top (parent_id = 0) down, then calculate hashes bottom up
+    ordered = []
+    stack = list(children.get(0, ()))
+    while stack:
+        geo_point_id = stack.pop()
+        ordered.append(geo_point_id)
+        stack.extend(children.get(geo_point_id, ()))
+    calculated = {}
+    updates = []
+    for geo_point_id in reversed(ordered):
+        child_hashes = [calculated[child_id] for child_id in children.get(geo_point_id, ())]
+        if children_hashes[geo_point_id] is None or None in child_hashes:  # subtree isn't complete
+            calculated[geo_point_id] = None
+        else:
+            digest = hashlib.sha1(children_hashes[geo_point_id].encode('ascii'))
+            for child_hash in child_hashes:
+                digest.update(child_hash.encode('ascii'))
+            calculated[geo_point_id] = digest.hexdigest()
+        if calculated[geo_point_id] != subtree_hashes[geo_point_id]:
+            updates.append((calculated[geo_point_id], geo_point_id))
+
+    with connections.transaction(dbname) as cursor:
+        cursor.executemany('UPDATE geo_points SET subtree_hash = ? WHERE geo_point_id = ?', updates)
+    log.info('Subtree hashes: [{}] point(s), [{}] changed.'.format(len(calculated), len(updates)))
+    return len(updates)
 
 
 def db_get_geo_point_id(dbname, id, intid, cik_text, levelid):
     """"""
-    if not intid:
-        intid = 'is NULL'
-    else:
-        intid = '= {}'.format(intid)
-    select_sql = "SELECT geo_point_id FROM geo_points WHERE id = {} AND intid {} AND cik_text = '{}' AND levelid = {}"\
-        .format(id, intid, cik_text, levelid)
-    log.debug('db_get_geo_point_id(): selecting id.\n\tSQL -> [{}]'.format(select_sql))
-    connection = sql.connect(dbname)
-    cursor = connection.cursor()
-    cursor.execute(select_sql)
-
-    # process result
-    result = cursor.fetchone()
+    log.debug('db_get_geo_point_id(): selecting id for point [{}].'.format(id))
+    result = connections.connection(dbname).execute(
+        'SELECT geo_point_id FROM geo_points WHERE id = ? AND intid IS ? AND cik_text = ? AND levelid = ?',
+        (id, intid or None, cik_text, levelid)).fetchone()
     if result:  # something found
-        id = result[0]
-    else:  # nothing found
-        id = -1
-
-    connection.close()
-    # cursor.close()
-    return id
+        return result[0]
+    return -1  # nothing found
 
 
 if __name__ == '__main__':
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Micro-benchmark for per-call overhead of geodb functions: shared connections with statements cache (see
+    geodb.ConnectionManager) vs connection opened for every call (as db functions did before). Calls are made
+    on a small temporary db, so time is mostly the overhead (connect, sql compilation, commit).
+
+    Usage: python geodb_bench.py [--calls 2000] [--points 10000]
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import sqlite3 as sql
+from geodb import db_create, db_close, db_add_multiple_geo_points, db_get_geo_point_id, db_get_geo_point_children, \
+    db_add_address, GeoDB, SEARCH_ADDRESS
+from geotext import normalize_text
+
+
+def connect_per_call(dbname, query, params=(), commit=False, more_queries=()):
+    """ Previous way of db calls: new connection for every call. """
+    connection = sql.connect(dbname)
+    try:
+        result = connection.execute(query, params).fetchall()
+        for more_query, more_params in more_queries:
+            connection.execute(more_query, more_params)
+        if commit:
+            connection.commit()
+        return result
+    finally:
+        connection.close()
+
+
+def timed(function, calls):
+    """ Return average time of call in microseconds. """
+    start = time.perf_counter()
+    for number in range(calls):
+        function(number)
+    return (time.perf_counter() - start) * 1000000 / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark for per-call overhead of geodb functions.')
+    parser.add_argument('--calls', type=int, default=2000, help='calls of every operation')
+    parser.add_argument('--points', type=int, default=10000, help='geo points in test db')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='geodb_bench_')
+    dbname = os.path.join(directory, 'bench.sqlite')
+    try:
+        db_create(dbname)
+        db_add_multiple_geo_points(dbname, [(number, number, u'Точка {}'.format(number), 3, 'True', number // 10, 0)
+                                            for number in range(1, args.points + 1)])
+        points = args.points
+        geodb = GeoDB(dbname)
+
+        operations = [
+            ('get geo point id', lambda n: connect_per_call(
+                dbname, 'SELECT geo_point_id FROM geo_points WHERE id = ? AND intid IS ? AND cik_text = ? AND '
+                        'levelid = ?', (n % points + 1, n % points + 1, u'Точка {}'.format(n % points + 1), 3)),
+             lambda n: db_get_geo_point_id(dbname, n % points + 1, n % points + 1, u'Точка {}'.format(n % points + 1),
+                                           3)),
+            ('get children', lambda n: connect_per_call(
+                dbname, 'SELECT geo_point_id, id, intid, cik_text, levelid, children, processed, '
+                        'children_hash, subtree_hash FROM geo_points WHERE parent_id = ? ORDER BY geo_point_id',
+                (n % (points // 10),)),
+             lambda n: db_get_geo_point_children(dbname, n % (points // 10))),
+            ('mark failed', lambda n: connect_per_call(
+                dbname, 'UPDATE geo_points SET processed = 2, attempts = attempts + 1 WHERE geo_point_id = ?',
+                (n % points + 1,), commit=True),
+             lambda n: geodb.db_mark_geo_point_as_processed(dbname, n % points + 1, processed_status=2)),
+            ('add address', lambda n: connect_per_call(
+                dbname, 'INSERT INTO addresses(street, buildings, commission_id) VALUES (?, ?, ?)',
+                (u'ул. Тестовая', str(n), 1), commit=True,
+                more_queries=[('INSERT INTO search_index(text, title, kind, ref_id) VALUES (?, ?, ?, ?)',
+                               (normalize_text(u'ул. Тестовая, {}'.format(n)), u'ул. Тестовая, {}'.format(n),
+                                SEARCH_ADDRESS, n))]),
+             lambda n: db_add_address(dbname, u'ул. Тестовая', str(n), 1)),
+        ]
+        print('{:<20} {:>22} {:>22}'.format('operation', 'connect per call, us', 'shared connection, us'))
+        for name, before, after in operations:
+            print('{:<20} {:>22.1f} {:>22.1f}'.format(name, timed(before, args.calls), timed(after, args.calls)))
+    finally:
+        db_close(dbname)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Export of geo db (geo points, commissions, addresses) for downstream tools. Supported formats:
+      * jsonl   - JSON lines, one row per line;
+      * parquet - Parquet files (row group per batch), needs pyarrow;
+      * arrow   - Arrow IPC files, needs pyarrow;
+      * tree    - nested JSON tree of geo points (node has list of child nodes), one file per region.
+    Tables are streamed with keyset pagination in batches (memory usage doesn't depend on db size) into chunk
+    files (part-NNNNN.<ext>, not more than chunk_rows rows). Finished chunks are recorded in manifest.json in the
+    output dir, so interrupted export continues after the last finished chunk. Chunk file is written under the
+    temporary name and renamed when it is complete.
+
+    Usage: python geoexport.py <output dir> [--format jsonl] [--tables geo_points commissions addresses]
+"""
+
+from __future__ import unicode_literals  # text files are written with unicode strings on python 2 too
+import io
+import os
+import json
+import logging
+import argparse
+import sqlite3 as sql
+from geodb import DB_NAME
+from geotext import to_unicode
+
+try:  # python 3
+    from os import replace as replace_file
+except ImportError:  # python 2 - rename replaces existing file on posix only
+    from os import rename as replace_file
+
+try:  # parquet/arrow formats are optional
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# common constants
+FORMATS = ['jsonl', 'parquet', 'arrow', 'tree']
+TABLES = ['geo_points', 'commissions', 'addresses']
+TABLE_KEYS = {'geo_points': 'geo_point_id', 'commissions': 'id', 'addresses': 'id'}
+BATCH_SIZE = 10000     # rows fetched (and written) at once
+CHUNK_ROWS = 500000    # max rows in one chunk file
+MANIFEST_NAME = 'manifest.json'
+TREE_CHILDREN_KEY = 'nodes'  # geo_points table has own column 'children' (flag)
+
+# geo points subtree in depth-first order (ORDER BY depth DESC makes recursive queue a stack), children of
+# the node are ordered by id
+TREE_SQL = """
+    WITH RECURSIVE subtree(depth, {columns}) AS (
+      SELECT 0, {columns} FROM geo_points WHERE geo_point_id = ?
+      UNION ALL
+      SELECT s.depth + 1, {g_columns} FROM geo_points g JOIN subtree s ON g.parent_id = s.geo_point_id
+      ORDER BY 1 DESC, 2)
+    SELECT * FROM subtree
+"""
+
+# init module logging
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+def table_columns(connection, table):
+    """ Return list of tuples (column name, declared type) of table. """
+    return [(row[1], row[2].upper()) for row in connection.execute('PRAGMA table_info({})'.format(table))]
+
+
+def to_int(value):
+    """ Convert value of INTEGER column (sqlite doesn't check types) to int, not convertible value -> None. """
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value):
+    """ Convert value of REAL column to float, not convertible value -> None. """
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_text(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def column_converter(declared_type):
+    """ Return (arrow type, converter) for the declared sqlite column type (sqlite type affinity rules). """
+    if 'INT' in declared_type:
+        return pyarrow.int64(), to_int
+    if 'REAL' in declared_type or 'FLOA' in declared_type or 'DOUB' in declared_type:
+        return pyarrow.float64(), to_float
+    return pyarrow.string(), to_text
+
+
+class JsonLinesWriter(object):
+    """ Writer of rows into JSON lines file. """
+    def __init__(self, path, columns):
+        self.__columns = [name for name, declared_type in columns]
+        self.__file = io.open(path, 'w', encoding='utf-8')
+
+    def write(self, rows):
+        self.__file.writelines(to_unicode(json.dumps(dict(zip(self.__columns, row)), ensure_ascii=False)) + '\n'
+                               for row in rows)
+
+    def close(self):
+        self.__file.close()
+
+
+class ArrowWriter(object):
+    """ Writer of rows into parquet (row group per batch) or Arrow IPC file. """
+    def __init__(self, path, columns, parquet=True):
+        converters = [column_converter(declared_type) for name, declared_type in columns]
+        self.__schema = pyarrow.schema([(name, arrow_type) for (name, declared_type), (arrow_type, converter)
+                                        in zip(columns, converters)])
+        self.__converters = [converter for arrow_type, converter in converters]
+        if parquet:
+            self.__writer = pyarrow.parquet.ParquetWriter(path, self.__schema)
+        else:
+            self.__writer = pyarrow.ipc.new_file(path, self.__schema)
+
+    def write(self, rows):
+        if not rows:
+            return
+        arrays = [pyarrow.array([converter(value) for value in values], type=field.type)
+                  for values, converter, field in zip(zip(*rows), self.__converters, self.__schema)]
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=self.__schema)
+        if isinstance(self.__writer, pyarrow.parquet.ParquetWriter):
+            self.__writer.write_table(pyarrow.Table.from_batches([batch]))
+        else:
+            self.__writer.write_batch(batch)
+
+    def close(self):
+        self.__writer.close()
+
+
+def open_writer(export_format, path, columns):
+    """ Create writer for the format. """
+    if export_format == 'jsonl':
+        return JsonLinesWriter(path, columns)
+    return ArrowWriter(path, columns, parquet=(export_format == 'parquet'))
+
+
+class Manifest(object):
+    """ Export progress (finished chunks of tables), saved into the output dir after every chunk. """
+    def __init__(self, out_dir, export_format):
+        self.__path = os.path.join(out_dir, MANIFEST_NAME)
+        self.data = {'format': export_format, 'tables': {}}
+        if os.path.exists(self.__path):
+            with io.open(self.__path, encoding='utf-8') as manifest_file:
+                self.data = json.load(manifest_file)
+            if self.data['format'] != export_format:
+                raise ValueError('Output dir contains export in other format [{}]!'.format(self.data['format']))
+            log.info('Resuming export, manifest [{}].'.format(self.__path))
+
+    def table(self, table):
+        """ Return progress of table (dictionary: chunks list, done flag). """
+        return self.data['tables'].setdefault(table, {'chunks': [], 'done': False})
+
+    def add_chunk(self, table, file_name, rows, last_key):
+        self.table(table)['chunks'].append({'file': file_name, 'rows': rows, 'last_key': last_key})
+        self.save()
+
+    def finish(self, table):
+        self.table(table)['done'] = True
+        self.save()
+
+    def save(self):
+        tmp_path = self.__path + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+            manifest_file.write(to_unicode(json.dumps(self.data, ensure_ascii=False, indent=2)))
+        replace_file(tmp_path, self.__path)
+
+
+def export_table(connection, table, out_dir, export_format, manifest, batch_size=BATCH_SIZE,
+                 chunk_rows=CHUNK_ROWS):
+    """
+    Export table into chunk files (keyset pagination by primary key, continues after the last finished chunk).
+    :return: count of exported rows (in this run)
+    """
+    progress = manifest.table(table)
+    if progress['done']:
+        log.info('Table [{}] is already exported.'.format(table))
+        return 0
+    key = TABLE_KEYS[table]
+    columns = table_columns(connection, table)
+    select_sql = 'SELECT {} FROM {} WHERE {} > ? ORDER BY {} LIMIT ?'.format(
+        ', '.join(name for name, declared_type in columns), table, key, key)
+    key_index = [name for name, declared_type in columns].index(key)
+    table_dir = os.path.join(out_dir, table)
+    if not os.path.exists(table_dir):
+        os.makedirs(table_dir)
+
+    exported = 0
+    last_key = progress['chunks'][-1]['last_key'] if progress['chunks'] else -1
+    while True:
+        file_name = 'part-{:05d}.{}'.format(len(progress['chunks']), export_format)
+        path = os.path.join(table_dir, file_name)
+        writer = open_writer(export_format, path + '.tmp', columns)
+        rows_count = 0
+        try:
+            cursor = connection.execute(select_sql, (last_key, chunk_rows))
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                writer.write(rows)
+                rows_count += len(rows)
+                last_key = rows[-1][key_index]
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            writer.close()
+        if rows_count == 0:  # nothing more
+            os.remove(path + '.tmp')
+            break
+        replace_file(path + '.tmp', path)
+        manifest.add_chunk(table, file_name, rows_count, last_key)
+        exported += rows_count
+        log.info('Table [{}]: chunk [{}], [{}] row(s).'.format(table, file_name, rows_count))
+        if rows_count < chunk_rows:  # last chunk
+            break
+    manifest.finish(table)
+    return exported
+
+
+def write_tree(connection, root_id, tree_file, columns):
+    """ Stream subtree of geo point into file as nested JSON (node is written when it is read, only the path
+    from the root is kept open). Return count of written nodes. """
+    select_sql = TREE_SQL.format(columns=', '.join(columns), g_columns=', '.join('g.' + name for name in columns))
+    open_nodes = []  # stack of (depth, has children written)
+    count = 0
+    for row in connection.execute(select_sql, (root_id,)):
+        depth = row[0]
+        while open_nodes and open_nodes[-1][0] >= depth:
+            tree_file.write(']}')
+            open_nodes.pop()
+        if open_nodes:
+            if open_nodes[-1][1]:
+                tree_file.write(',')
+            open_nodes[-1] = (open_nodes[-1][0], True)
+        node = to_unicode(json.dumps(dict(zip(columns, row[1:])), ensure_ascii=False))
+        tree_file.write('{}, "{}": ['.format(node[:-1], TREE_CHILDREN_KEY))
+        open_nodes.append((depth, False))
+        count += 1
+    tree_file.write(']}' * len(open_nodes))
+    return count
+
+
+def export_tree(connection, out_dir, manifest):
+    """
+    Export geo points as nested JSON trees, one file per region (children of the top level points). Regions
+    are exported in order of ids, export continues after the last finished region.
+    :return: count of exported nodes (in this run)
+    """
+    progress = manifest.table('tree')
+    if progress['done']:
+        log.info('Tree is already exported.')
+        return 0
+    columns = [name for name, declared_type in table_columns(connection, 'geo_points')]
+    regions = [row[0] for row in connection.execute(
+        'SELECT geo_point_id FROM geo_points WHERE parent_id IN (SELECT geo_point_id FROM geo_points '
+        'WHERE parent_id = 0) ORDER BY geo_point_id')]
+    tree_dir = os.path.join(out_dir, 'tree')
+    if not os.path.exists(tree_dir):
+        os.makedirs(tree_dir)
+
+    exported = 0
+    last_key = progress['chunks'][-1]['last_key'] if progress['chunks'] else -1
+    for region_id in regions:
+        if region_id <= last_key:
+            continue
+        file_name = 'part-{:05d}.json'.format(len(progress['chunks']))
+        path = os.path.join(tree_dir, file_name)
+        with io.open(path + '.tmp', 'w', encoding='utf-8') as tree_file:
+            count = write_tree(connection, region_id, tree_file, columns)
+        replace_file(path + '.tmp', path)
+        manifest.add_chunk('tree', file_name, count, region_id)
+        exported += count
+        log.info('Tree: region [{}] -> [{}], [{}] node(s).'.format(region_id, file_name, count))
+    manifest.finish('tree')
+    return exported
+
+
+def export_db(dbname, out_dir, export_format='jsonl', tables=None, batch_size=BATCH_SIZE, chunk_rows=CHUNK_ROWS):
+    """
+    Export db into output dir (resumable, see module description).
+    :param dbname:
+    :param out_dir:
+    :param export_format: one of FORMATS
+    :param tables: list of tables (default - all), ignored for tree format
+    :param batch_size:
+    :param chunk_rows:
+    :return: count of exported rows/nodes (in this run)
+    """
+    log.debug('export_db(): exporting [{}] into [{}], format [{}].'.format(dbname, out_dir, export_format))
+    if export_format not in FORMATS:
+        raise ValueError('Unknown export format [{}]!'.format(export_format))
+    if export_format in ('parquet', 'arrow') and pyarrow is None:
+        raise ImportError('Module pyarrow is required for [{}] export!'.format(export_format))
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    manifest = Manifest(out_dir, export_format)
+
+    connection = sql.connect(dbname)
+    try:
+        if export_format == 'tree':
+            return export_tree(connection, out_dir, manifest)
+        return sum(export_table(connection, table, out_dir, export_format, manifest, batch_size, chunk_rows)
+                   for table in (tables or TABLES))
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Export geo db (resumable, in chunks).')
+    parser.add_argument('out_dir', help='output dir (contains manifest of export)')
+    parser.add_argument('--db', default=DB_NAME, help='geo db file')
+    parser.add_argument('--format', default='jsonl', choices=FORMATS, help='output format')
+    parser.add_argument('--tables', nargs='+', choices=TABLES, help='tables for export (default - all)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows fetched at once')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='max rows in chunk file')
+    args = parser.parse_args()
+    log.info('Exported [{}] row(s).'.format(export_db(args.db, args.out_dir, args.format, args.tables,
+                                                       args.batch_size, args.chunk_rows)))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Low-overhead logging for crawler hot paths. This is a library module.
+    Handlers configured by logging.yml (console, rotating files) are moved to the background thread: root logger
+    gets QueueHandler, records are formatted and written by QueueListener (see start_queue_logging()), so crawl
+    thread only puts records into queue. Debug messages of hot loops use lazy %-style arguments (message isn't
+    formatted if it's filtered out) and are limited by RateLimitFilter (configured in logging.yml).
+"""
+
+import sys
+import atexit
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:  # python 2
+    import Queue as queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:  # python 2 - minimal implementations of handler and listener
+    class QueueHandler(logging.Handler):
+        """ Handler puts records into queue. """
+        def __init__(self, records_queue):
+            logging.Handler.__init__(self)
+            self.queue = records_queue
+
+        def prepare(self, record):
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        """ Thread takes records from queue and passes them to handlers. """
+        _sentinel = None
+
+        def __init__(self, records_queue, *handlers, **kwargs):
+            self.queue = records_queue
+            self.handlers = handlers
+            self.respect_handler_level = kwargs.get('respect_handler_level', False)
+            self._thread = None
+
+        def start(self):
+            self._thread = threading.Thread(target=self._monitor)
+            self._thread.daemon = True
+            self._thread.start()
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is self._sentinel:
+                    break
+                for handler in self.handlers:
+                    if not self.respect_handler_level or record.levelno >= handler.level:
+                        handler.handle(record)
+
+        def stop(self):
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+
+# defaults of debug messages rate limit (per message template)
+RATE_LIMIT_MESSAGES = 10
+RATE_LIMIT_PERIOD = 1.0  # seconds
+RATE_LIMIT_MAX_TEMPLATES = 1000  # templates counters are reset after this count (eagerly formatted messages)
+# caller info of records without it (see skip_caller_info()), findCaller() of python 2 returns 3 values
+NO_CALLER = ('(unknown file)', 0, '(unknown function)', None)[:4 if sys.version_info[0] >= 3 else 3]
+
+
+class LocalQueueHandler(QueueHandler):
+    """ Queue handler for listener in the same process: record is put into queue as is (standard handler formats
+    message in the calling thread to make record picklable). """
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """ Rate limit for debug messages: every message template (logger and message before % formatting) passes not
+    more than rate times per period, the rest is dropped. Count of dropped messages is added to the next passed
+    message of the template. Messages with level above limited level always pass. """
+    def __init__(self, rate=RATE_LIMIT_MESSAGES, period=RATE_LIMIT_PERIOD, level=logging.DEBUG):
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self.period = period
+        self.level = level
+        self.__windows = {}  # (logger, template) -> [window start, passed count, dropped count]
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        key = (record.name, record.msg)
+        window = self.__windows.get(key)
+        if window is None or record.created - window[0] >= self.period:
+            if len(self.__windows) >= RATE_LIMIT_MAX_TEMPLATES:
+                self.__windows.clear()
+            self.__windows[key] = [record.created, 1, 0]
+            if window is not None and window[2]:
+                record.msg = u'{} ({} similar message(s) dropped)'.format(record.getMessage(), window[2])
+                record.args = None
+            return True
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+def stop_listener(listener):
+    """ Stop listener (if it isn't stopped yet), queued records are handled before stop. """
+    if getattr(listener, '_thread', None) is not None:
+        listener.stop()
+
+
+def no_caller(*args, **kwargs):
+    """ findCaller() replacement - caller isn't looked up. """
+    return NO_CALLER
+
+
+def skip_caller_info(*logger_names):
+    """
+    Records of the loggers are created without caller info (file, line, function): formats of logging.yml don't
+    use it, and walking the stack is the most expensive part of record creation. Only findCaller() of these loggers
+    is replaced, globals of logging module aren't changed.
+    :param logger_names: names of loggers of hot loops
+    """
+    for logger_name in logger_names:
+        logging.getLogger(logger_name).findCaller = no_caller
+
+
+def start_queue_logging(logger_name=None):
+    """
+    Move handlers of logger to the background thread: logger gets one LocalQueueHandler, its handlers are served
+    by QueueListener (handlers levels are respected). Listener is stopped (queue is flushed) at exit.
+    :param logger_name: logger with configured handlers, default - root logger
+    :return: QueueListener instance
+    """
+    logger = logging.getLogger(logger_name)
+    handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+    records_queue = queue.Queue(-1)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(LocalQueueHandler(records_queue))
+    listener = QueueListener(records_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+if __name__ == '__main__':
+    print("Don't execute library as an application!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Benchmark for logging overhead in crawl loop (geolog): simulated requests (sleep) with the same debug messages
+    per point as geocik/geodb write, time spent in logging calls is measured on the crawl thread and compared with
+    crawl time. Handlers are the same as in logging.yml (console and rotating files, console goes to devnull here).
+    Configurations:
+      * sync, eager - handlers in the crawl thread, messages formatted with str.format() (as before);
+      * queue, lazy - handlers in the background thread, %-style arguments;
+      * queue, lazy, rate limit - the same with RateLimitFilter (as configured in logging.yml).
+    Budget: logging should cost less than 1% of crawl time.
+
+    Usage: python geolog_bench.py [--requests 300] [--request-ms 20]
+"""
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import argparse
+from logging.handlers import RotatingFileHandler
+from geolog import start_queue_logging, stop_listener, skip_caller_info, RateLimitFilter
+
+BUDGET = 0.01  # share of crawl time
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure(directory, queued, rate_limit):
+    """ Configure root logger as logging.yml does, return list of objects to close. """
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    devnull = open(os.devnull, 'w')
+    handlers = [logging.StreamHandler(devnull),
+                RotatingFileHandler(os.path.join(directory, 'log_info.log'), maxBytes=10485760, backupCount=20),
+                RotatingFileHandler(os.path.join(directory, 'log_errors.log'), maxBytes=10485760, backupCount=20)]
+    handlers[2].setLevel(logging.ERROR)
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(FORMAT))
+        root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    for name in ('geodb', 'geocik'):
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.DEBUG)
+        logger.filters = [RateLimitFilter()] if rate_limit else []
+    listener = None
+    if queued:  # as geocik starts it
+        listener = start_queue_logging()
+        skip_caller_info('geodb', 'geocik')
+    return devnull, listener, handlers
+
+
+def crawl(requests, request_ms, lazy):
+    """ Simulated crawl loop, return tuple (crawl time, time in logging calls) in seconds. """
+    db_log = logging.getLogger('geodb')
+    cik_log = logging.getLogger('geocik')
+    logging_time = 0.0
+    start = time.perf_counter()
+    for number in range(requests):
+        time.sleep(request_ms / 1000.0)  # request and parsing
+        log_start = time.perf_counter()
+        if lazy:
+            db_log.debug('Geo points list [len = %s] has been added.', 25)
+            db_log.debug('GeoDB.db_mark_geo_point_as_processed(): mark point [%s] as processed with status [%s].',
+                         number, 1)
+            cik_log.debug('Point [%s] processed: children [%s], added [%s], frontier [%s].', number, 25, 25, number)
+        else:
+            db_log.debug('Geo points list [len = {}] has been added.'.format(25))
+            db_log.debug('GeoDB.db_mark_geo_point_as_processed(): mark point [{}] as processed with status [{}].'
+                         .format(number, 1))
+            cik_log.debug('Point [{}] processed: children [{}], added [{}], frontier [{}].'
+                          .format(number, 25, 25, number))
+        logging_time += time.perf_counter() - log_start
+    return time.perf_counter() - start, logging_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for logging overhead in crawl loop.')
+    parser.add_argument('--requests', type=int, default=300, help='simulated requests count')
+    parser.add_argument('--request-ms', type=float, default=20.0, help='time of one request (ms)')
+    args = parser.parse_args()
+
+    print('{:<28} {:>16} {:>14} {:>8}'.format('configuration', 'logging, us/req', 'crawl share', 'budget'))
+    for name, queued, lazy, rate_limit in (('sync, eager', False, False, False),
+                                           ('queue, lazy', True, True, False),
+                                           ('queue, lazy, rate limit', True, True, True)):
+        directory = tempfile.mkdtemp(prefix='geolog_bench_')
+        devnull, listener, handlers = configure(directory, queued, rate_limit)
+        try:
+            crawl_time, logging_time = crawl(args.requests, args.request_ms, lazy)
+        finally:
+            if listener:
+                stop_listener(listener)
+            for handler in handlers:
+                handler.close()
+            devnull.close()
+            shutil.rmtree(directory, ignore_errors=True)
+        share = logging_time / crawl_time
+        print('{:<28} {:>16.1f} {:>13.3f}% {:>8}'.format(name, logging_time * 1000000 / args.requests, share * 100,
+                                                        'ok' if share < BUDGET else 'OVER'))
+
+
+if __name__ == '__main__':
+    main()
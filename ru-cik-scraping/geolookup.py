@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    In-memory index for lookups "street + building -> sector commission". This is a library module.
+    Addresses (free text cells from xls, see geoprocessor) are split into streets and parsed buildings lists (see
+    geotext.split_address(), geotext.parse_buildings()), streets are stored in the trie by normalized name tokens
+    (street types are dropped from the path, so 'пр. Энергетиков' and 'Энергетиков проспект' are the same
+    street), trie leaf keeps buildings rules of the street: separate numbers, ranges (with parity) and 'all
+    buildings' - with commission id of every rule.
+"""
+
+import logging
+from collections import defaultdict
+from geotext import street_key, split_address, parse_buildings, parse_building, fold_text
+
+# lookup results (match kinds), from the most specific
+MATCH_BUILDING = 'building'  # number and suffix (корпус, letter) are the same
+MATCH_NUMBER = 'number'      # number is the same, suffix differs
+MATCH_RANGE = 'range'
+MATCH_ALL = 'all'            # commission serves all buildings of the street
+MATCH_STREET = 'street'      # building isn't specified - all commissions of the street
+MATCH_UNPARSED_BUILDING = 'unparsed_building'  # building is specified, but it isn't a number - nothing is found
+MAX_PREFIX_STREETS = 20      # max streets found by prefix of name (street isn't found exactly)
+
+# init module logging
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class StreetTrie(object):
+    """ Trie over name tokens of streets, node is a dictionary token -> child node, value of node is kept
+    under key None. """
+    def __init__(self):
+        self.__root = {}
+        self.size = 0
+
+    def setdefault(self, tokens, factory):
+        """ Return value for tokens, create it with factory if there is no value yet. """
+        node = self.__root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if None not in node:
+            node[None] = factory()
+            self.size += 1
+        return node[None]
+
+    def get(self, tokens):
+        node = self.__root
+        for token in tokens:
+            node = node.get(token)
+            if node is None:
+                return None
+        return node.get(None)
+
+    def with_prefix(self, tokens, limit=MAX_PREFIX_STREETS):
+        """ Return values of streets which names start with tokens (not more than limit). """
+        node = self.__root
+        for token in tokens:
+            node = node.get(token)
+            if node is None:
+                return []
+        values = []
+        stack = [node]
+        while stack and len(values) < limit:
+            node = stack.pop()
+            for token, child in node.items():
+                if token is None:
+                    values.append(child)
+                else:
+                    stack.append(child)
+        return values[:limit]
+
+
+class StreetBuildings(object):
+    """ Buildings rules of one street (with one set of street types). """
+    def __init__(self):
+        self.all_ids = []
+        self.numbers = defaultdict(list)  # number -> list of tuples (suffix, commission id)
+        self.ranges = []                  # list of tuples (first, last, parity, commission id)
+
+    def add(self, rules, commission_id):
+        for rule in rules:
+            if rule[0] == 'all':
+                self.all_ids.append(commission_id)
+            elif rule[0] == 'range':
+                self.ranges.append((rule[1], rule[2], rule[3], commission_id))
+            else:
+                self.numbers[rule[1]].append((rule[2], commission_id))
+
+    def match(self, number, suffix):
+        """ Return dictionary match kind -> list of commission ids for the building. """
+        found = defaultdict(list)
+        for rule_suffix, commission_id in self.numbers.get(number, ()):
+            found[MATCH_BUILDING if rule_suffix == suffix else MATCH_NUMBER].append(commission_id)
+        for first, last, parity, commission_id in self.ranges:
+            if first <= number <= last and (parity is None or number % 2 == parity):
+                found[MATCH_RANGE].append(commission_id)
+        if self.all_ids:
+            found[MATCH_ALL].extend(self.all_ids)
+        return found
+
+    def commissions(self):
+        ids = list(self.all_ids)
+        ids.extend(commission_id for values in self.numbers.values() for suffix, commission_id in values)
+        ids.extend(commission_id for first, last, parity, commission_id in self.ranges)
+        return ids
+
+
+class AddressIndex(object):
+    """ Index street -> buildings -> commission id over addresses. """
+    def __init__(self, rows):
+        """
+        :param rows: iterable of tuples (street, buildings, commission id, city, sector commission)
+        """
+        self.trie = StreetTrie()
+        self.commissions = {}  # commission id -> (folded city, city, sector commission)
+        addresses_count = 0
+        for street, buildings, commission_id, city, sector_commission in rows:
+            addresses_count += 1
+            if commission_id not in self.commissions:
+                self.commissions[commission_id] = (fold_text(city), city, sector_commission)
+            for street_text, buildings_text in split_address(street, buildings):
+                names, types = street_key(street_text)
+                if names:
+                    streets = self.trie.setdefault(names, dict)
+                    if types not in streets:
+                        streets[types] = StreetBuildings()
+                    streets[types].add(parse_buildings(buildings_text), commission_id)
+        log.info('Address index: [{}] address(es), [{}] street(s).'.format(addresses_count, self.trie.size))
+
+    @classmethod
+    def from_db(cls, connection):
+        """ Build index over all addresses of db. """
+        return cls(connection.execute('SELECT a.street, a.buildings, a.commission_id, c.city, c.sector_commission '
+                                      'FROM addresses a LEFT JOIN commissions c ON c.id = a.commission_id'))
+
+    def lookup(self, street, building=None, city=None):
+        """
+        Find commissions for the address. If street isn't found exactly - streets with the names starting with
+        street name are used. The most specific match wins: building (with suffix), number, range, all buildings.
+        :param street: street name (with or without type, abbreviations are allowed)
+        :param building: building number ('30', '30 к1', '103А'), if None - all commissions of the street
+        :param city: if specified - only commissions with the city containing this text
+        :return: dictionary (match kind, exact street flag, list of commissions (id, city, sector commission)),
+            match kind is MATCH_UNPARSED_BUILDING (no commissions) if building isn't recognized
+        """
+        names, types = street_key(street)
+        result = {'match': None, 'exact_street': True, 'commissions': []}
+        if not names:
+            return result
+        parsed = parse_building(building) if building else None
+        if building and not parsed:  # not all commissions of the street - they don't serve this building
+            result['match'] = MATCH_UNPARSED_BUILDING
+            return result
+        found = self.trie.get(names)
+        if found is None:
+            result['exact_street'] = False
+            found = {}
+            for streets in self.trie.with_prefix(names):
+                for street_types, street_buildings in streets.items():
+                    found.setdefault(street_types, []).append(street_buildings)
+        else:
+            found = dict((street_types, [street_buildings]) for street_types, street_buildings in found.items())
+        # street types are compared only if both query and index have them
+        candidates = [street_buildings for street_types, values in found.items()
+                      if not types or not street_types or street_types == types for street_buildings in values]
+
+        matches = defaultdict(list)
+        for street_buildings in candidates:
+            if parsed:
+                for kind, ids in street_buildings.match(*parsed).items():
+                    matches[kind].extend(ids)
+            else:
+                matches[MATCH_STREET].extend(street_buildings.commissions())
+
+        folded_city = fold_text(city) if city else None
+        for kind in (MATCH_BUILDING, MATCH_NUMBER, MATCH_RANGE, MATCH_ALL, MATCH_STREET):
+            ids = sorted(set(commission_id for commission_id in matches.get(kind, ())
+                             if not folded_city or folded_city in self.commissions[commission_id][0]))
+            if ids:
+                result['match'] = kind
+                result['commissions'] = [{'id': commission_id, 'city': self.commissions[commission_id][1],
+                                          'sector_commission': self.commissions[commission_id][2]}
+                                         for commission_id in ids]
+                break
+        return result
+
+
+if __name__ == '__main__':
+    print("Don't execute library as an application!")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Benchmark for address lookups (geolookup): in-memory trie index vs SQL path (full-text search of addresses
+    candidates in db, then parsing of their buildings lists). Queries are random buildings of random addresses
+    from db, both paths have to find the same commissions.
+
+    Usage: python geolookup_bench.py [--db geodb.sqlite] [--queries 5000]
+"""
+
+import time
+import random
+import argparse
+import sqlite3 as sql
+from geodb import DB_NAME, SEARCH_ADDRESS, db_create_search_index
+from geotext import street_key, split_address, parse_buildings, MAX_BUILDING_NUMBER
+from geolookup import AddressIndex
+
+CANDIDATES_SQL = "SELECT a.street, a.buildings, a.commission_id, c.city, c.sector_commission FROM search_index s " \
+                 "JOIN addresses a ON a.id = s.ref_id LEFT JOIN commissions c ON c.id = a.commission_id " \
+                 "WHERE search_index MATCH ? AND s.kind = ?"
+
+
+def sql_lookup(connection, street, building):
+    """ Lookup without in-memory index: addresses with all street name tokens are selected from db with full-text
+    search and matched with the same rules. """
+    names, types = street_key(street)
+    match = ' '.join('"{}"'.format(token.replace('"', '""')) for token in names)
+    return AddressIndex(connection.execute(CANDIDATES_SQL, (match, SEARCH_ADDRESS))).lookup(street, building)
+
+
+def random_building(rnd, rules):
+    """ Return random building text for the buildings rules. """
+    rule = rnd.choice(rules)
+    if rule[0] == 'number':
+        return '{} {}'.format(rule[1], rule[2]).strip()
+    if rule[0] == 'range' and rule[1] <= rule[2]:  # source cells have reversed ranges too ('33-10')
+        number = rnd.randint(rule[1], min(rule[2], rule[1] + 100))
+        if rule[3] is not None and number % 2 != rule[3]:
+            number = number + 1 if number < min(rule[2], MAX_BUILDING_NUMBER) else number - 1
+        return str(number)
+    return str(rnd.randint(1, 100))
+
+
+def generate_queries(connection, count, seed=1):
+    """ Return list of tuples (street, building) for random addresses of db. """
+    rnd = random.Random(seed)
+    addresses = connection.execute('SELECT street, buildings FROM addresses').fetchall()
+    queries = []
+    while len(queries) < count:
+        street, buildings = rnd.choice(addresses)
+        parts = [(street_text, parse_buildings(buildings_text)) for street_text, buildings_text
+                 in split_address(street, buildings)]
+        parts = [(street_text, rules) for street_text, rules in parts if rules and street_key(street_text)[0]]
+        if parts:
+            street_text, rules = rnd.choice(parts)
+            queries.append((street_text, random_building(rnd, rules)))
+    return queries
+
+
+def timed(function, queries):
+    """ Run function for all queries, return (results, sorted latencies in microseconds). """
+    results = []
+    latencies = []
+    for street, building in queries:
+        start = time.perf_counter()
+        results.append(function(street, building))
+        latencies.append((time.perf_counter() - start) * 1000000)
+    latencies.sort()
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for address lookups: trie index vs SQL.')
+    parser.add_argument('--db', default=DB_NAME, help='geo db file (with commissions and addresses)')
+    parser.add_argument('--queries', type=int, default=5000, help='lookups count')
+    args = parser.parse_args()
+
+    db_create_search_index(args.db)
+    connection = sql.connect(args.db)
+    queries = generate_queries(connection, args.queries)
+
+    start = time.perf_counter()
+    index = AddressIndex.from_db(connection)
+    print('index: {} street(s), built in {:.2f} sec'.format(index.trie.size, time.perf_counter() - start))
+
+    trie_results, trie_latencies = timed(index.lookup, queries)
+    sql_results, sql_latencies = timed(lambda street, building: sql_lookup(connection, street, building), queries)
+    for name, latencies in (('trie', trie_latencies), ('sql', sql_latencies)):
+        print('{}: p50 {:.1f} us, p99 {:.1f} us, mean {:.1f} us'.format(
+            name, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)],
+            sum(latencies) / len(latencies)))
+
+    same = sum(1 for first, second in zip(trie_results, sql_results)
+               if [item['id'] for item in first['commissions']] == [item['id'] for item in second['commissions']])
+    found = sum(1 for result in trie_results if result['commissions'])
+    print('found: {} of {}, same results: {} of {}'.format(found, len(queries), same, len(queries)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Matching engine for addresses (loaded from xls, see geoprocessor) and geo points (crawled from CIK, see
+    geocik). Naive fuzzy matching compares every address with every geo point, here matching is done with
+    blocking indexes instead:
+      * commission city is resolved to localities (geo points with the same name, token index over all geo
+        points, trigram index as fallback for spelling differences);
+      * address street(s) are matched only with geo points of the locality subtree - with token index over
+        street names (exact words) and trigram index as fallback;
+      * candidates are scored (trigram Dice similarity of names + agreement of street types), the best candidate
+        over the threshold is linked with its score as confidence.
+    Links are saved into address_links table.
+"""
+
+import logging
+import argparse
+import sqlite3 as sql
+from collections import defaultdict, Counter
+from geodb import DB_NAME, db_save_address_links
+from geotext import normalize_tokens, trigrams, split_streets, MATCH_COMMON_WORDS, STREET_TYPES
+
+# matching parameters
+MIN_CONFIDENCE = 0.6         # candidates with lower score aren't linked
+MIN_LOCALITY_SIMILARITY = 0.5
+MAX_BLOCK_SIZE = 5000        # blocks (postings) bigger than this are too common to be useful for blocking
+MAX_CANDIDATES = 50          # max candidates scored for one street
+NAME_WEIGHT = 0.85
+TYPE_WEIGHT = 0.15
+
+# init module logging
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class BlockingIndex(object):
+    """ Inverted index key -> ids of records. Candidates for the query keys are records sharing the most keys,
+    keys with too big blocks (postings) are skipped. """
+    def __init__(self, max_block_size=MAX_BLOCK_SIZE):
+        self.__postings = defaultdict(list)
+        self.__max_block_size = max_block_size
+
+    def add(self, record_id, keys):
+        for key in set(keys):
+            self.__postings[key].append(record_id)
+
+    def candidates(self, keys, limit=MAX_CANDIDATES):
+        """ Return ids of records sharing the most keys with the query keys (not more than limit). """
+        counter = Counter()
+        for key in set(keys):
+            block = self.__postings.get(key)
+            if block and len(block) <= self.__max_block_size:
+                counter.update(block)
+        return [record_id for record_id, count in counter.most_common(limit)]
+
+    def all_of(self, keys):
+        """ Return set of ids of records having all the keys. """
+        result = None
+        for key in set(keys):
+            block = self.__postings.get(key, ())
+            result = set(block) if result is None else result.intersection(block)
+            if not result:
+                return set()
+        return result or set()
+
+
+def dice(first, second):
+    """ Dice similarity of two sets (more tolerant to one typo in short names than Jaccard). """
+    if not first or not second:
+        return 0.0
+    return 2.0 * len(first & second) / (len(first) + len(second))
+
+
+class GeoPoints(object):
+    """ Geo points tree (in memory, only what is needed for matching) with indexes over names. """
+    def __init__(self, rows):
+        """
+        :param rows: iterable of tuples (geo_point_id, parent_id, cik_text)
+        """
+        self.names = {}                   # geo point id -> name tokens (without street/locality types)
+        self.types = {}                   # geo point id -> street type tokens
+        self.children = defaultdict(list)
+        self.tokens_index = BlockingIndex(max_block_size=float('inf'))  # localities lookup needs all postings
+        for geo_point_id, parent_id, cik_text in rows:
+            tokens = normalize_tokens(cik_text)
+            self.names[geo_point_id] = [token for token in tokens if token not in MATCH_COMMON_WORDS]
+            self.types[geo_point_id] = [token for token in tokens if token in STREET_TYPES]
+            self.children[parent_id].append(geo_point_id)
+            self.tokens_index.add(geo_point_id, self.names[geo_point_id])
+        self.__localities_index = None
+        log.info('Loaded [{}] geo point(s).'.format(len(self.names)))
+
+    def name_trigrams(self, geo_point_id):
+        return trigrams(' '.join(self.names[geo_point_id]))
+
+    def subtree(self, geo_point_id):
+        """ Return ids of all descendants of geo point. """
+        result = []
+        stack = list(self.children.get(geo_point_id, ()))
+        while stack:
+            current = stack.pop()
+            result.append(current)
+            stack.extend(self.children.get(current, ()))
+        return result
+
+    def find_localities(self, city):
+        """
+        Find geo points (with children) for the city name: points having all name tokens of the city, the
+        shortest names win. If there are no such points - the most similar by trigrams.
+        :param city:
+        :return: list of geo points ids
+        """
+        tokens = [token for token in normalize_tokens(city) if token not in MATCH_COMMON_WORDS]
+        if not tokens:
+            return []
+        found = [geo_point_id for geo_point_id in self.tokens_index.all_of(tokens) if geo_point_id in self.children]
+        if found:
+            shortest = min(len(self.names[geo_point_id]) for geo_point_id in found)
+            return [geo_point_id for geo_point_id in found if len(self.names[geo_point_id]) == shortest]
+
+        # fallback - trigram blocking over geo points with children
+        if self.__localities_index is None:
+            self.__localities_index = BlockingIndex()
+            for geo_point_id in self.children:
+                if geo_point_id in self.names:
+                    self.__localities_index.add(geo_point_id, self.name_trigrams(geo_point_id))
+        city_trigrams = trigrams(' '.join(tokens))
+        scored = [(dice(city_trigrams, self.name_trigrams(geo_point_id)), geo_point_id)
+                  for geo_point_id in self.__localities_index.candidates(city_trigrams)]
+        if not scored:
+            return []
+        best = max(scored)
+        if best[0] < MIN_LOCALITY_SIMILARITY:
+            return []
+        return [geo_point_id for score, geo_point_id in scored if score == best[0]]
+
+
+class StreetsMatcher(object):
+    """ Blocking indexes (tokens and trigrams of names) over set of geo points (usually - locality subtree). """
+    def __init__(self, geo_points, ids):
+        self.__geo_points = geo_points
+        self.__tokens = BlockingIndex()
+        self.__trigrams = BlockingIndex()
+        self.__name_trigrams = {}
+        for geo_point_id in ids:
+            names = geo_points.names[geo_point_id]
+            if not names:
+                continue
+            name_trigrams = trigrams(' '.join(names))
+            self.__name_trigrams[geo_point_id] = name_trigrams
+            self.__tokens.add(geo_point_id, names)
+            self.__trigrams.add(geo_point_id, name_trigrams)
+
+    def match(self, names, types):
+        """
+        Find the best geo point for the street.
+        :param names: street name tokens
+        :param types: street type tokens
+        :return: tuple (geo point id, confidence) or None
+        """
+        candidates = self.__tokens.candidates(names)
+        street_trigrams = trigrams(' '.join(names))
+        if not candidates:  # no common words - maybe spelling differs
+            candidates = self.__trigrams.candidates(street_trigrams)
+
+        best = None
+        for geo_point_id in candidates:
+            name_score = dice(street_trigrams, self.__name_trigrams[geo_point_id])
+            point_types = self.__geo_points.types[geo_point_id]
+            if not types or not point_types:
+                type_score = 0.5  # type is unknown
+            elif set(types) & set(point_types):
+                type_score = 1.0
+            else:
+                type_score = 0.0
+            score = NAME_WEIGHT * name_score + TYPE_WEIGHT * type_score
+            if best is None or score > best[1]:
+                best = (geo_point_id, score)
+        if best and best[1] >= MIN_CONFIDENCE:
+            return best[0], round(best[1], 3)
+        return None
+
+
+def match_addresses(geo_points, addresses):
+    """
+    Match addresses with geo points. Addresses are processed grouped by city, street indexes are built for
+    the city localities once per group.
+    :param geo_points: GeoPoints instance
+    :param addresses: iterable of tuples (address id, street, city)
+    :return: generator of tuples (address id, geo point id, confidence)
+    """
+    by_city = defaultdict(list)
+    for address_id, street, city in addresses:
+        by_city[city].append((address_id, street))
+    log.info('Matching addresses for [{}] city(ies).'.format(len(by_city)))
+
+    global_matcher = None
+    for city, city_addresses in by_city.items():
+        localities = geo_points.find_localities(city)
+        if localities:
+            ids = []
+            for locality in localities:
+                ids.extend(geo_points.subtree(locality))
+            matcher = StreetsMatcher(geo_points, ids)
+        else:  # city isn't found - match with the whole tree
+            log.debug('Locality for city [{}] not found.'.format(city))
+            if global_matcher is None:
+                global_matcher = StreetsMatcher(geo_points, list(geo_points.names))
+            matcher = global_matcher
+
+        for address_id, street in city_addresses:
+            links = {}
+            for names, types in split_streets(street):
+                found = matcher.match(names, types)
+                if found and found[1] > links.get(found[0], 0):
+                    links[found[0]] = found[1]
+            for geo_point_id, confidence in links.items():
+                yield address_id, geo_point_id, confidence
+
+
+def match_db(dbname):
+    """
+    Match all addresses with geo points in db and save links (replacing existing).
+    :param dbname:
+    :return: links count
+    """
+    log.debug('match_db(): matching addresses in [{}].'.format(dbname))
+    connection = sql.connect(dbname)
+    try:
+        geo_points = GeoPoints(connection.execute('SELECT geo_point_id, parent_id, cik_text FROM geo_points'))
+        addresses = connection.execute('SELECT a.id, a.street, c.city FROM addresses a '
+                                       'LEFT JOIN commissions c ON c.id = a.commission_id').fetchall()
+    finally:
+        connection.close()
+    log.info('Loaded [{}] address(es).'.format(len(addresses)))
+    count = db_save_address_links(dbname, match_addresses(geo_points, addresses))
+    log.info('Linked addresses: [{}] link(s).'.format(count))
+    return count
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Match addresses with CIK geo points.')
+    parser.add_argument('--db', default=DB_NAME, help='geo db file')
+    args = parser.parse_args()
+    match_db(args.db)
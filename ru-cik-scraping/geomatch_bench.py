@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Benchmark for addresses matching engine (geomatch). Generates synthetic country: geo points tree (regions ->
+    cities -> streets) and addresses for commissions with the noise of real data (abbreviations, different
+    street types order, typos, lists of streets in one cell), runs matching and reports time, precision and
+    recall against the known truth.
+
+    Usage: python geomatch_bench.py [--addresses 300000] [--cities 2000] [--streets 150]
+"""
+
+import time
+import random
+import argparse
+from geomatch import GeoPoints, match_addresses
+
+SYLLABLES = ['ка', 'ли', 'но', 'ра', 'ве', 'сто', 'мир', 'лен', 'гор', 'зо', 'пу', 'шки', 'ты', 'бе', 'ре', 'зов',
+             'дач', 'ле', 'сна', 'ми', 'ро', 'ва', 'тер', 'ско', 'ки', 'ров', 'ба', 'ду', 'ше', 'ё']
+ENDINGS = ['ая', 'ова', 'ина', 'ский', 'ная', 'ево']
+STREET_TYPES = [('улица', ['ул.', 'улица', 'Ул']), ('проспект', ['пр.', 'пр-т', 'проспект']),
+                ('переулок', ['пер.', 'переулок']), ('набережная', ['наб.', 'набережная'])]
+
+
+def random_name(rnd):
+    return (''.join(rnd.choice(SYLLABLES) for i in range(rnd.randint(2, 3))) + rnd.choice(ENDINGS)).capitalize()
+
+
+def typo(rnd, name):
+    """ Swap two neighbour letters. """
+    if len(name) < 5:
+        return name
+    i = rnd.randint(1, len(name) - 3)
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def generate(addresses_count, cities_count, streets_per_city, seed=1):
+    """
+    Generate synthetic geo points and addresses.
+    :return: tuple (geo points rows, addresses rows, truth: address id -> set of geo points ids)
+    """
+    rnd = random.Random(seed)
+    points = [(1, 0, 'Российская Федерация')]
+    cities = []
+    streets = {}  # city point id -> list of (point id, name, type)
+    for region in range(cities_count // 20 + 1):
+        region_id = len(points) + 1
+        points.append((region_id, 1, '{} область'.format(random_name(rnd))))
+        for i in range(20):
+            city_id = len(points) + 1
+            city = random_name(rnd)
+            points.append((city_id, region_id, 'город {}'.format(city)))
+            cities.append((city_id, city))
+            streets[city_id] = []
+            for j in range(streets_per_city):
+                street_id = len(points) + 1
+                name = random_name(rnd)
+                street_type = rnd.choice(STREET_TYPES)
+                points.append((street_id, city_id, '{} {}'.format(street_type[0], name)))
+                streets[city_id].append((street_id, name, street_type))
+
+    addresses = []
+    truth = {}
+    for address_id in range(1, addresses_count + 1):
+        city_id, city = cities[rnd.randint(0, len(cities) - 1)]
+        parts = []
+        truth[address_id] = set()
+        for k in range(1 if rnd.random() < 0.8 else rnd.randint(2, 4)):  # sometimes - list of streets
+            street_id, name, street_type = rnd.choice(streets[city_id])
+            if rnd.random() < 0.1:
+                name = typo(rnd, name)
+            abbreviation = rnd.choice(street_type[1])
+            text = '{} {}'.format(name, abbreviation) if rnd.random() < 0.5 else '{} {}'.format(abbreviation, name)
+            if rnd.random() < 0.3:
+                text += ' дома № {}, {}'.format(rnd.randint(1, 99), rnd.randint(1, 99))
+            parts.append(text)
+            truth[address_id].add(street_id)
+        addresses.append((address_id, '; '.join(parts), city))
+    return points, addresses, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark for addresses matching engine.')
+    parser.add_argument('--addresses', type=int, default=300000, help='addresses count')
+    parser.add_argument('--cities', type=int, default=2000, help='cities count')
+    parser.add_argument('--streets', type=int, default=150, help='streets per city')
+    args = parser.parse_args()
+
+    print('Generating synthetic data...')
+    points, addresses, truth = generate(args.addresses, args.cities, args.streets)
+    print('geo points: {}, addresses: {}'.format(len(points), len(addresses)))
+
+    start = time.perf_counter()
+    geo_points = GeoPoints(points)
+    loaded = time.perf_counter()
+    links = list(match_addresses(geo_points, addresses))
+    finished = time.perf_counter()
+
+    expected = sum(len(ids) for ids in truth.values())
+    correct = sum(1 for address_id, geo_point_id, confidence in links if geo_point_id in truth[address_id])
+    print('load: {:.1f} sec, matching: {:.1f} sec ({:.0f} addresses/sec)'
+          .format(loaded - start, finished - loaded, len(addresses) / (finished - loaded)))
+    print('links: {}, precision: {:.3f}, recall: {:.3f}'
+          .format(len(links), float(correct) / max(1, len(links)), float(correct) / expected))
+
+
+if __name__ == '__main__':
+    main()
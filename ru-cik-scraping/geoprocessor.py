@@ -11,23 +11,35 @@
 """
 
 import os
+import shutil
 import logging
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import xlrd  # most suitable for xls
 from pyutilities.utils import setup_logging, get_str_val, get_int_val
-from geodb import DB_NAME, db_create, db_add_commission, db_add_address
+from geodb import DB_NAME, db_create, db_add_commissions, db_merge_staging, db_create_rollups, \
+    db_check_people_rollups, db_close
 
 # common constants
 LOGGER_NAME = 'geoprocessor'
 LOGGER_CONFIG = 'logging.yml'
 XLS_SOURCE_FILE = 'nw-uiks.xls'
+XLS_ENCODING = 'cp1251'
 DEFAULT_ENCODING = 'utf-8'
 # module initialization
 setup_logging(default_path='logging.yml')
 log = logging.getLogger(LOGGER_NAME)
 
 
-def load_one_sheet(sheet):
-    log.debug('load_one_sheet(): processing sheet [{}].'.format(sheet.name.encode(DEFAULT_ENCODING)))
+def read_sheet(sheet):
+    """
+    Read commissions and addresses from one sheet into memory. Sheet is read by whole rows (values and types),
+    not cell by cell.
+    :param sheet:
+    :return: tuple (commissions list, addresses list) - see geodb.db_add_commissions() for entries format
+    """
+    log.debug('read_sheet(): reading sheet [{}].'.format(sheet.name.encode(DEFAULT_ENCODING)))
 
     # special actions for SPb and Novgorod
     is_spb_novg = False
@@ -37,22 +49,23 @@ def load_one_sheet(sheet):
         is_spb_novg = True
         people_count_index = 5
 
+    commissions = []
+    addresses = []
     city = ''
     territory_commission = ''
-    # sector_commission = ''
     people_count = 0
-    last_commission_id = 0
+    last_commission_index = None  # index of the last read commission in commissions list
     street = ''
-    # building_number = 0
     for rownumber in range(sheet.nrows):
         if rownumber == 0:  # skip first row
             continue
         if rownumber == 1 and (is_spb_novg or sheet_name in 'Вологда'):
             continue
 
-        for colnumber in range(sheet.ncols):
-            value = sheet.cell_value(rownumber, colnumber)
-            value_type = sheet.cell_type(rownumber, colnumber)
+        values = sheet.row_values(rownumber)
+        types = sheet.row_types(rownumber)
+        for colnumber, value in enumerate(values):
+            value_type = types[colnumber]
 
             if value and value_type != xlrd.XL_CELL_EMPTY:  # cell isn't empty
                 # commission information
@@ -61,56 +74,131 @@ def load_one_sheet(sheet):
                 elif colnumber == 1:  # territory commission
                     territory_commission = get_str_val(value, value_type, DEFAULT_ENCODING)
                     # calculate people count for commission / todo: move check to db module
-                    people_count = get_int_val(sheet.cell_value(rownumber, people_count_index),
-                                               sheet.cell_type(rownumber, people_count_index), DEFAULT_ENCODING)
+                    people_count = get_int_val(values[people_count_index], types[people_count_index],
+                                               DEFAULT_ENCODING)
                 elif colnumber == 2:  # sector commission (end of cells for commission)
                     sector_commission = get_int_val(value, value_type, DEFAULT_ENCODING)
-                    # insert new commission into db
-                    last_commission_id = db_add_commission(DB_NAME, city, territory_commission,
-                                                           sector_commission, people_count)
+                    commissions.append((city, territory_commission, sector_commission, people_count))
+                    last_commission_index = len(commissions) - 1
                 # address information
                 elif colnumber == 3:
                     street = get_str_val(value, value_type, DEFAULT_ENCODING)
                     if not is_spb_novg:
-                        building_number = ''
-                        db_add_address(DB_NAME, street, building_number, last_commission_id)
+                        addresses.append((street, '', last_commission_index))
                 elif colnumber == 4 and is_spb_novg:  # read buildings numbers only for SPb and Novgorod
                     building_number = get_str_val(value, value_type, DEFAULT_ENCODING)
-                    db_add_address(DB_NAME, street, building_number, last_commission_id)
+                    addresses.append((street, building_number, last_commission_index))
 
-            # just debug
-            #log.debug('cell[{}, {}]: type -> {}, value -> {}'.format(rownumber, colnumber, value_type,
-            #                                                         get_str_val(value, value_type, DEFAULT_ENCODING)))
-            #print '\n===============================================\n'
+    return commissions, addresses
 
 
-def load_xls_data(xls_file):
+def load_one_sheet(sheet, dbname=DB_NAME):
+    """
+    Load one sheet into db: read whole sheet into memory and write it with one transaction.
+    :param sheet:
+    :param dbname:
+    :return:
+    """
+    log.debug('load_one_sheet(): processing sheet [{}].'.format(sheet.name.encode(DEFAULT_ENCODING)))
+    commissions, addresses = read_sheet(sheet)
+    db_add_commissions(dbname, commissions, addresses)
+    log.info('Sheet [{}] loaded: commissions [{}], addresses [{}].'
+             .format(sheet.name.encode(DEFAULT_ENCODING), len(commissions), len(addresses)))
+
+
+def load_xls_data(xls_file, dbname=DB_NAME):
+    """
+    Load all sheets of one workbook, sheet by sheet (serial loading).
+    :param xls_file:
+    :param dbname:
+    :return:
+    """
     log.debug('load_xls_data(): loading data from source file [{}].'.format(xls_file))
 
-    # Load the whole spreadsheet
-    excel_book = xlrd.open_workbook(XLS_SOURCE_FILE, encoding_override='cp1251')
-
-    # load areas in database
-    # sheets_names = []
-    # sheets = []
-
-    for sheet in excel_book.sheet_names():
-        log.debug('Loading sheet [{}] from source file.'.format(sheet.encode(DEFAULT_ENCODING)))
-        load_one_sheet(excel_book.sheet_by_name(sheet))
-        # sheets_names.append(sheet.encode(DEFAULT_ENCODING))  # encode value to UTF-8
-        # sheet_object = excel_book.sheet_by_name(sheet)
-        # sheets.append(sheet_object)
-
-    # sheet = excel_book.sheet_by_index(0)
-    # load_one_sheet(sheet)
+    # open the spreadsheet, sheets are loaded on demand (one by one)
+    excel_book = xlrd.open_workbook(xls_file, encoding_override=XLS_ENCODING, on_demand=True)
+    try:
+        for sheet in excel_book.sheet_names():
+            log.debug('Loading sheet [{}] from source file.'.format(sheet.encode(DEFAULT_ENCODING)))
+            load_one_sheet(excel_book.sheet_by_name(sheet), dbname)
+            excel_book.unload_sheet(sheet)
+    finally:
+        excel_book.release_resources()
+
+
+def load_sheet_to_staging(task):
+    """
+    Worker for parallel loading: open workbook (on demand), read one sheet and write it into own staging db.
+    :param task: tuple (xls file, sheet name, staging db name)
+    :return: tuple (staging db name, commissions count, addresses count)
+    """
+    xls_file, sheet_name, staging_dbname = task
+    excel_book = xlrd.open_workbook(xls_file, encoding_override=XLS_ENCODING, on_demand=True)
+    try:
+        commissions, addresses = read_sheet(excel_book.sheet_by_name(sheet_name))
+    finally:
+        excel_book.release_resources()
+    db_create(staging_dbname)
+    db_add_commissions(staging_dbname, commissions, addresses)
+    db_close(staging_dbname)  # staging db is removed after merge
+    return staging_dbname, len(commissions), len(addresses)
+
+
+def load_xls_data_parallel(xls_files, dbname=DB_NAME, workers=None):
+    """
+    Load multiple workbooks in parallel: every sheet of every workbook is a separate task for the process pool,
+    worker writes sheet into own staging db. Staging dbs are merged into the main db in order of tasks (so
+    result doesn't depend on the workers timing), merging of finished sheets overlaps with loading of others.
+    :param xls_files: list of workbooks
+    :param dbname:
+    :param workers: processes count, default - cpu count
+    :return: tuple (loaded commissions count, loaded addresses count)
+    """
+    log.debug('load_xls_data_parallel(): loading [{}] file(s) with [{}] worker(s).'.format(len(xls_files), workers))
+
+    staging_dir = tempfile.mkdtemp(prefix='geo_staging_')
+    tasks = []
+    for xls_file in xls_files:  # only sheets names are read here
+        excel_book = xlrd.open_workbook(xls_file, encoding_override=XLS_ENCODING, on_demand=True)
+        for sheet_name in excel_book.sheet_names():
+            tasks.append((xls_file, sheet_name, os.path.join(staging_dir, 'staging_{}.sqlite'.format(len(tasks)))))
+        excel_book.release_resources()
+    log.info('Found [{}] sheet(s) in [{}] file(s).'.format(len(tasks), len(xls_files)))
+
+    commissions_count = 0
+    addresses_count = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for staging_dbname, commissions, addresses in executor.map(load_sheet_to_staging, tasks):
+                db_merge_staging(dbname, staging_dbname)
+                os.remove(staging_dbname)
+                commissions_count += commissions
+                addresses_count += addresses
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    log.info('Loaded commissions [{}] and addresses [{}].'.format(commissions_count, addresses_count))
+    return commissions_count, addresses_count
 
 
 if __name__ == '__main__':
     log.info('Starting GeoProcessor module...')
 
+    parser = argparse.ArgumentParser(description='Load commissions data from excel file(s) into db.')
+    parser.add_argument('xls_files', nargs='*', default=[XLS_SOURCE_FILE], help='source excel files')
+    parser.add_argument('--workers', type=int, default=None, help='loading processes count (default - cpu count)')
+    parser.add_argument('--check-rollups', action='store_true', help='compare rollups with full recalculation')
+    args = parser.parse_args()
+
     if not os.path.exists(DB_NAME):
         log.warn("Database [{}] doesn't exist! Creating...".format(DB_NAME))
         db_create(DB_NAME)  # create target db
+    db_create_rollups(DB_NAME)  # db created by previous versions doesn't have rollups
+
+    # load data from xls file(s)
+    load_xls_data_parallel(args.xls_files, DB_NAME, args.workers)
 
-    # load data from xls file
-    load_xls_data(XLS_SOURCE_FILE)
+    if args.check_rollups:
+        for level, key, stored, expected in db_check_people_rollups(DB_NAME):
+            log.error('Rollup [%s: %s] differs: stored %s, recalculated %s.', level, u' / '.join(key), stored,
+                      expected)
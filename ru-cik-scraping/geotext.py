@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Text normalization for russian geo names (commissions names, streets). This is a library module.
+    Normalized text is lower case, letter 'ё' is replaced with 'е', punctuation is removed and common
+    abbreviations are expanded ('ул.' -> 'улица', 'пр.' -> 'проспект', 'УИК' -> 'участковая избирательная
+    комиссия', etc.), so 'Невский пр.' and 'проспект Невский' have the same tokens.
+"""
+
+from __future__ import unicode_literals  # literals are text on python 2 too (data is decoded to unicode)
+import re
+
+DATA_ENCODING = 'utf-8'
+
+# abbreviations (without trailing dot) -> full form
+ABBREVIATIONS = {
+    'ул': 'улица',
+    'пр': 'проспект',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пер': 'переулок',
+    'наб': 'набережная',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'пр-д': 'проезд',
+    'туп': 'тупик',
+    'д': 'дом',  # or 'деревня' - see normalize_tokens()
+    'дд': 'дома',
+    'корп': 'корпус',
+    'кор': 'корпус',
+    'лит': 'литера',
+    'стр': 'строение',
+    'г': 'город',
+    'пос': 'поселок',
+    'пгт': 'поселок городского типа',
+    'дер': 'деревня',
+    'мкр': 'микрорайон',
+    'р-н': 'район',
+    'уик': 'участковая избирательная комиссия',
+    'тик': 'территориальная избирательная комиссия',
+}
+
+# street types - low information words (they are in almost every address)
+STREET_TYPES = frozenset(['улица', 'улицы', 'проспект', 'переулок', 'набережная', 'площадь', 'шоссе', 'бульвар',
+                          'проезд', 'тупик', 'дом', 'дома', 'корпус', 'литера', 'строение'])
+# locality types - low information words in names of cities, settlements and districts
+LOCALITY_TYPES = frozenset(['город', 'поселок', 'городского', 'типа', 'деревня', 'село', 'микрорайон', 'район',
+                            'района', 'муниципальный', 'муниципального', 'городское', 'сельское', 'поселение',
+                            'городской', 'округ'])
+# low information words for search queries - street types and words of (almost) every commission name
+COMMON_WORDS = STREET_TYPES | frozenset(['участковая', 'территориальная', 'избирательная', 'комиссия'])
+# low information words for matching of addresses with geo points - locality types are dropped too ('город
+# Тосно' is 'Тосно' in the geo points tree), search queries keep them ('город' finds cities)
+MATCH_COMMON_WORDS = COMMON_WORDS | LOCALITY_TYPES
+# words after which street part of address contains only buildings numbers
+BUILDINGS_WORDS = frozenset(['дом', 'дома'])
+
+# last query token shorter than this is matched exactly (short prefixes match too many words)
+MIN_PREFIX_LENGTH = 2
+
+# separator of streets in the list of streets (one address cell may contain many streets), new line isn't
+# separator - long names are wrapped in the source cells
+STREETS_SEPARATOR_RE = re.compile(r';+', re.UNICODE)
+
+# buildings: separators of list items, 'все дома' (all buildings of street), range of numbers with parity, number
+# with suffix (letter, корпус, fraction), корпус of the previous number ('д.58, к.2, 3'), start of buildings
+# list in the street cell ('Ул Восточная, д.38А,40А')
+BUILDINGS_SEPARATOR_RE = re.compile(r',+', re.UNICODE)
+NUMBERS_RE = re.compile(r'^\d+(?:\s+\d+)+$', re.UNICODE)  # numbers separated with spaces/new lines only
+BUILDINGS_ALL_RE = re.compile(r'все\s+дома|полностью|в\s+границах', re.UNICODE)
+BUILDING_RANGE_RE = re.compile(r'^(?:№+\s*)?(?:с\s*)?(\d+)[\w/]*\s*(?:-|по)\s*(\d+)[\w/]*\s*(?:\((не)?четн[^)]*\)?)?$',
+                               re.UNICODE)
+BUILDINGS_SIDE_RE = re.compile(r'^\(?(не)?четная\s+сторона\)?$', re.UNICODE)  # all even/odd buildings
+BUILDING_LIST_RE = re.compile(r'^\d+(?:\s*-\s*\d+){2,}$', re.UNICODE)
+BUILDING_RE = re.compile(r'^(?:(?:д(?:ом)?|№)\.?\s*)?(\d+)(.*)$', re.UNICODE)
+KORPUS_RE = re.compile(r'^к(?:орп(?:ус)?)?\.?\s*(\d+)(.*)$', re.UNICODE)
+STREET_BUILDINGS_RE = re.compile(r',?\s*\bд\.\s*(?=\d)', re.UNICODE)
+# parity of buildings range
+EVEN = 0
+ODD = 1
+MAX_BUILDING_NUMBER = 100000  # last number of range for the whole street side
+
+# token: letters/digits, possibly joined with hyphen (пр-т, б-р, 25-го)
+TOKEN_RE = re.compile(r'[^\W_]+(?:-[^\W_]+)*', re.UNICODE)
+
+
+def to_unicode(text):
+    """ Return text as unicode string (db values may be utf-8 encoded bytes). """
+    if text is None:
+        return ''
+    if isinstance(text, bytes):
+        return text.decode(DATA_ENCODING, 'replace')
+    return text if isinstance(text, type(u'')) else u'{}'.format(text)
+
+
+def fold_text(text):
+    """ Return text for case insensitive comparison: lower case, 'ё' -> 'е'. """
+    return to_unicode(text).lower().replace('ё', 'е')
+
+
+class TextFilter(object):
+    """ Filter for texts by the set of patterns (substrings, e.g. regions names), compiled into one regular
+    expression - text is scanned once for all patterns. Comparison is case insensitive, 'ё' = 'е'. """
+    def __init__(self, patterns):
+        """
+        :param patterns: one pattern (string) or list of patterns
+        """
+        if isinstance(patterns, (type(''), bytes)):
+            patterns = [patterns]
+        self.__patterns = {}  # folded pattern -> original pattern
+        for pattern in patterns:
+            self.__patterns[fold_text(pattern)] = to_unicode(pattern)
+        # longer patterns first - the longest match wins
+        self.__regex = re.compile('|'.join(re.escape(pattern) for pattern in
+                                           sorted(self.__patterns, key=len, reverse=True)), re.UNICODE)
+        self.counts = dict((pattern, 0) for pattern in self.__patterns.values())
+
+    def match(self, text):
+        """ Return matched pattern (as it was provided) or None. """
+        found = self.__regex.search(fold_text(text))
+        if not found:
+            return None
+        pattern = self.__patterns[found.group(0)]
+        self.counts[pattern] += 1
+        return pattern
+
+    @property
+    def patterns(self):
+        return list(self.__patterns.values())
+
+
+def normalize_tokens(text):
+    """
+    Split text into normalized tokens: lower case, 'ё' -> 'е', abbreviations expanded. 'д' is 'дом' only before
+    number ('д.38А'), otherwise it is 'деревня' ('ЕНАНГСКОЕ, д.ВАСИНО').
+    :param text:
+    :return: list of tokens
+    """
+    tokens = []
+    words = TOKEN_RE.findall(to_unicode(text).lower().replace('ё', 'е'))
+    for i, token in enumerate(words):
+        expanded = ABBREVIATIONS.get(token)
+        if token == 'д' and not (i + 1 < len(words) and words[i + 1][0].isdigit()):
+            expanded = 'деревня'  # 'д.38' is building, 'д.Васино' is village
+        if expanded:
+            tokens.extend(expanded.split(' '))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def normalize_text(text):
+    """ Return normalized text (normalized tokens joined with space). """
+    return ' '.join(normalize_tokens(text))
+
+
+def query_tokens(text):
+    """
+    Return normalized tokens of the search query. Common words are dropped if query has other tokens - they
+    match almost every row.
+    :param text:
+    :return: list of tokens
+    """
+    tokens = normalize_tokens(text)
+    significant = [token for token in tokens if token not in COMMON_WORDS]
+    return significant if significant else tokens
+
+
+def fts_query(text):
+    """
+    Build FTS5 MATCH expression for the user query: all tokens are required, the last token is matched as
+    prefix (query may be typed partially).
+    :param text:
+    :return: MATCH expression or None (query is empty)
+    """
+    tokens = query_tokens(text)
+    if not tokens:
+        return None
+    terms = ['"{}"'.format(token.replace('"', '""')) for token in tokens]
+    if len(tokens[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_rank(tokens, normalized_text):
+    """
+    Rank of the matched text for the query tokens (lower is better): exact token matches weigh more than
+    prefix matches of the last token, shorter texts are better.
+    :param tokens: query tokens (see query_tokens())
+    :param normalized_text: normalized text of the matched entry
+    :return: rank
+    """
+    text_tokens = normalized_text.split(' ')
+    words = set(text_tokens)
+    score = 0.0
+    for token in tokens:
+        if token in words:
+            score += 1.0
+        elif any(word.startswith(token) for word in text_tokens):
+            score += 0.5
+    return len(text_tokens) / 100.0 - score
+
+
+def trigrams(text):
+    """ Return set of character trigrams of normalized text (words are padded with spaces). """
+    padded = ' {} '.format(text)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def split_streets(text):
+    """
+    Split address text (one street or list of streets, separated by ';') into streets. Street is
+    returned as tuple of name tokens and type tokens (улица, проспект, ...), buildings numbers are cut off.
+    :param text:
+    :return: list of tuples (name tokens, type tokens), streets without name are skipped
+    """
+    streets = []
+    for part in STREETS_SEPARATOR_RE.split(to_unicode(text)):
+        names = []
+        types = []
+        for token in normalize_tokens(part):
+            if token in BUILDINGS_WORDS:
+                break
+            if token in STREET_TYPES:
+                types.append(token)
+            elif token not in MATCH_COMMON_WORDS:
+                names.append(token)
+        if names:
+            streets.append((names, types))
+    return streets
+
+
+def street_key(text):
+    """
+    Return key of street for lookups: normalized name tokens without street types (in order), and types. Settlement
+    before comma is dropped ('НИКОЛЬСК, переулок Восточный' -> 'восточный').
+    :param text:
+    :return: tuple (tuple of name tokens, tuple of sorted type tokens)
+    """
+    tokens = normalize_tokens(to_unicode(text).split(',')[-1])
+    names = tuple(token for token in tokens if token not in MATCH_COMMON_WORDS)
+    types = tuple(sorted(set(token for token in tokens if token in STREET_TYPES)))
+    return names, types
+
+
+def split_address(street, buildings):
+    """
+    Split address (street and buildings cells) into streets with their buildings. Street cell may contain list
+    of streets (separated by ';') with buildings after 'д.' - 'Ул Восточная, д.38А,40А; Ул Зеленая'.
+    :param street:
+    :param buildings:
+    :return: list of tuples (street text, buildings text), streets without buildings have buildings cell text
+    """
+    result = []
+    for part in STREETS_SEPARATOR_RE.split(to_unicode(street)):
+        found = STREET_BUILDINGS_RE.search(part)
+        if found:
+            result.append((part[:found.start()], part[found.end():]))
+        elif part.strip():
+            result.append((part, to_unicode(buildings)))
+    return result
+
+
+def building_suffix(text):
+    """ Return normalized suffix of building number: '(корпус 1)' -> 'к1', ' лит. А' -> 'а', '/69' -> '/69'. """
+    text = fold_text(text)
+    for long_form, short_form in (('корпус', 'к'), ('корп', 'к'), ('литера', ''), ('лит', '')):
+        text = text.replace(long_form, short_form)
+    return re.sub(r'[^\w/]', '', text, flags=re.UNICODE).replace('_', '')
+
+
+def parse_buildings(text):
+    """
+    Parse free text list of buildings.
+    :param text: 'все дома', '20, 22, 24', '11-19(нечетн.)', 'с 1 по 19', 'четная сторона', 'д.58, к.2, 3; д.60',
+                 '30 к1; 30 к2', '1-3-5', ...
+    :return: list of rules - tuples ('all',), ('range', first, last, parity or None), ('number', number, suffix)
+    """
+    text = fold_text(text)
+    if not text.strip() or BUILDINGS_ALL_RE.search(text):
+        return [('all',)]
+    rules = []
+    for group in text.split(';'):
+        house = None
+        korpus = False  # bare numbers after 'к.' are корпуса of the house
+        items = []
+        for item in BUILDINGS_SEPARATOR_RE.split(group):
+            item = ' '.join(item.split())  # long lists are wrapped in the source cells
+            items.extend(item.split(' ') if NUMBERS_RE.match(item) else [item])
+        for item in items:
+            if not item:
+                continue
+            found = KORPUS_RE.match(item)
+            if found and house is not None:
+                korpus = True
+                rules.append(('number', house, building_suffix('к' + found.group(1) + found.group(2))))
+                continue
+            if korpus and item.isdigit():
+                rules.append(('number', house, 'к' + item))
+                continue
+            korpus = False
+            found = BUILDINGS_SIDE_RE.match(item)
+            if found:
+                rules.append(('range', 1, MAX_BUILDING_NUMBER, ODD if found.group(1) else EVEN))
+                continue
+            found = BUILDING_RANGE_RE.match(item)
+            if found:
+                parity = None if found.group(3) is None and '(' not in item else (ODD if found.group(3) else EVEN)
+                rules.append(('range', int(found.group(1)), int(found.group(2)), parity))
+                continue
+            if BUILDING_LIST_RE.match(item):  # '1-3-5' - list of numbers
+                rules.extend(('number', int(number), '') for number in item.split('-'))
+                continue
+            found = BUILDING_RE.match(item)
+            if found:
+                house = int(found.group(1))
+                rules.append(('number', house, building_suffix(found.group(2))))
+    return rules
+
+
+def parse_building(text):
+    """
+    Parse one building (lookup query): '30 к1', '103А', 'д. 25 корпус 5'.
+    :param text:
+    :return: tuple (number, suffix) or None
+    """
+    for rule in parse_buildings(text):
+        if rule[0] == 'number':
+            return rule[1], rule[2]
+    return None
@@ -2,22 +2,366 @@
 # coding=utf-8
 
 """
-    Simple web application for geo module.
+    Simple web application for geo module. Read-only REST API over geo points db: geo points (with children),
+    commissions and addresses, ranked full-text search over geo points and addresses, rollups of people count
+    (per city, territory commission and sector commission), lookup of sector commission by street and building
+    (in-memory index, rebuilt when db changes). Lists use keyset
+    pagination (?after=<last id>&limit=<page size>), all responses have ETag (conditional requests are answered
+    with 304) and are cached in the in-process LRU cache. Cache is dropped as soon as any other process
+    (crawler, xls loader) commits into the db.
+
     Created: Gusev Dmitrii, 10.02.2017
     Modified:
 """
 
-from flask import Flask
+import hashlib
+import json
+import logging
+import threading
+import sqlite3 as sql
+from collections import OrderedDict
+from flask import Flask, Response, abort, request
+from geodb import DB_NAME, SEARCH_LIMIT, ROLLUP_LEVELS, db_create_indexes, db_create_search_index, db_search, \
+    db_create_rollups
+from geolookup import AddressIndex
+
+# common constants
+CACHE_SIZE = 4096
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+JSON_MIMETYPE = 'application/json'
+
+# init module logging
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
 
 # flask application
 app = Flask(__name__)
+app.config.setdefault('GEO_DB', DB_NAME)
+app.config.setdefault('GEO_CACHE_SIZE', CACHE_SIZE)
+
+
+class LRUCache(object):
+    """ Thread-safe LRU cache for rendered responses. Cache watches db with the dedicated connection: value of
+    PRAGMA data_version changes every time when other connection commits into db, in this case the whole cache
+    is dropped. """
+    def __init__(self, dbname, size=CACHE_SIZE):
+        self.log = logging.getLogger(__name__)
+        self.log.addHandler(logging.NullHandler())
+        self.log.debug('Creating LRUCache instance, size [{}].'.format(size))
+        self.__dbname = dbname
+        self.__size = size
+        self.__items = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__connection = None
+        self.__data_version = None
+        self.hits = 0
+        self.misses = 0
+
+    def __check_data_version(self):
+        """ Drop all cached items if db has been changed by other connection. Call only under lock. """
+        if not self.__connection:
+            self.__connection = sql.connect(self.__dbname, check_same_thread=False)
+        data_version = self.__connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self.__data_version:
+            if self.__data_version is not None:
+                self.log.info('DB [{}] has been changed, dropping [{}] cached item(s).'
+                              .format(self.__dbname, len(self.__items)))
+            self.__items.clear()
+            self.__data_version = data_version
+
+    def get(self, key):
+        """ Return cached value or None. """
+        with self.__lock:
+            self.__check_data_version()
+            value = self.__items.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            self.__items[key] = value  # re-insert - most recently used is the last (python 2 has no move_to_end)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Put value into cache, evict least recently used items over the size. """
+        if self.__size <= 0:
+            return
+        with self.__lock:
+            self.__check_data_version()
+            self.__items.pop(key, None)  # re-inserted item becomes the last one
+            self.__items[key] = value
+            while len(self.__items) > self.__size:
+                self.__items.popitem(last=False)
+
+    def invalidate(self):
+        """ Drop all cached items. """
+        with self.__lock:
+            self.__items.clear()
+
+    def __len__(self):
+        return len(self.__items)
+
+
+class AddressLookup(object):
+    """ Holder of address index (see geolookup module). Index is rebuilt when db is changed by other connection
+    (PRAGMA data_version, as in LRUCache), while new index is being built by one request other requests are
+    answered by the old one. """
+    def __init__(self, dbname):
+        self.log = logging.getLogger(__name__)
+        self.log.addHandler(logging.NullHandler())
+        self.__dbname = dbname
+        self.__lock = threading.Lock()
+        self.__build_lock = threading.Lock()  # only one request builds index
+        self.__connection = sql.connect(dbname, check_same_thread=False)
+        self.__index = None
+        self.__index_version = None  # data version of db, when current index was started to build
+
+    def __build(self):
+        connection = sql.connect(self.__dbname)
+        try:
+            return AddressIndex.from_db(connection)
+        finally:
+            connection.close()
+
+    def __current(self):
+        """ Return tuple (data version of db, current index or None if it's outdated). Call only under lock. """
+        data_version = self.__connection.execute('PRAGMA data_version').fetchone()[0]
+        return data_version, self.__index if self.__index_version == data_version else None
+
+    def get_index(self):
+        """
+        Return tuple (index, data version of db it's built from). Outdated index is rebuilt by one request, other
+        requests get the old index meanwhile (the first build - they wait for it). Version is saved only after
+        successful build: if build fails, the next request builds index again.
+        """
+        with self.__lock:
+            data_version, index = self.__current()
+            if index is not None:
+                return index, data_version
+            index, index_version = self.__index, self.__index_version
+        if not self.__build_lock.acquire(index is None):  # other request is building index
+            return index, index_version
+        try:
+            with self.__lock:  # index may be built by other request while we waited for it
+                data_version, index = self.__current()
+                if index is not None:
+                    return index, data_version
+            self.log.info('Building address index of DB [%s], data version [%s].', self.__dbname, data_version)
+            index = self.__build()
+            with self.__lock:
+                self.__index = index
+                self.__index_version = data_version
+            return index, data_version
+        finally:
+            self.__build_lock.release()
+
+
+# thread-local storage for read connections
+_local = threading.local()
+
+
+def get_cache():
+    """ Return cache instance for the current application (created on first use). """
+    cache = app.extensions.get('geo_cache')
+    if cache is None:
+        cache = LRUCache(app.config['GEO_DB'], app.config['GEO_CACHE_SIZE'])
+        app.extensions['geo_cache'] = cache
+    return cache
+
+
+def get_lookup():
+    """ Return address lookup for the current application (created on first use). """
+    lookup = app.extensions.get('geo_lookup')
+    if lookup is None:
+        lookup = AddressLookup(app.config['GEO_DB'])
+        app.extensions['geo_lookup'] = lookup
+    return lookup
+
+
+def get_connection():
+    """ Return read connection for the current thread (connections are long-lived). """
+    dbname = app.config['GEO_DB']
+    connection = getattr(_local, 'connection', None)
+    if connection is None or getattr(_local, 'dbname', None) != dbname:
+        connection = sql.connect(dbname)
+        connection.row_factory = sql.Row
+        _local.connection = connection
+        _local.dbname = dbname
+    return connection
+
+
+def query_all(select_sql, params=()):
+    """ Execute query and return list of dictionaries. """
+    return [dict(row) for row in get_connection().execute(select_sql, params)]
+
+
+def query_one(select_sql, params=()):
+    """ Execute query and return one row as dictionary (or None, if nothing found). """
+    row = get_connection().execute(select_sql, params).fetchone()
+    return dict(row) if row else None
+
+
+def get_page_args(key_type=int):
+    """ Return keyset pagination parameters (after, limit) from the current request. """
+    after = request.args.get('after', key_type(), type=key_type)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return after, max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def query_page(select_sql, key, params=(), key_type=int):
+    """
+    Execute keyset paginated query. Query should have condition [key > ?], ordering by key and limit placeholder
+    as the last parameters (after, limit). One extra row is selected to find out - is there next page or not.
+    :param select_sql:
+    :param key: name of key column
+    :param params: query parameters (without after/limit)
+    :param key_type: type of key column values (int or str)
+    :return:
+    """
+    after, limit = get_page_args(key_type)
+    items = query_all(select_sql, tuple(params) + (after, limit + 1))
+    next_after = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_after = items[-1][key]
+    return {'items': items, 'next_after': next_after}
+
+
+def cached_json(producer, key=None):
+    """
+    Return JSON response for the current request. Body is rendered by producer (if producer returns None ->
+    404) and cached by the full request path, ETag is calculated from the body. Conditional request with the
+    matching If-None-Match header is answered with 304 (without body).
+    :param producer:
+    :param key: cache key instead of the request path (e.g. with version of data the producer uses)
+    :return:
+    """
+    cache = get_cache()
+    if key is None:
+        key = request.full_path
+    entry = cache.get(key)
+    if entry is None:
+        data = producer()
+        if data is None:
+            abort(404)
+        body = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        entry = (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+        cache.put(key, entry)
+
+    body, etag = entry
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=JSON_MIMETYPE)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # clients have to re-validate with ETag
+    return response
 
 
 # route for root of web app
 @app.route("/")
 def index():
-    return "Hello, World!"
+    return cached_json(lambda: {'resources': ['/geo_points', '/commissions', '/addresses', '/search', '/rollups',
+                                              '/lookup']})
+
+
+@app.route("/geo_points")
+def geo_points():
+    return cached_json(lambda: query_page(
+        "SELECT * FROM geo_points WHERE geo_point_id > ? ORDER BY geo_point_id LIMIT ?", 'geo_point_id'))
+
+
+@app.route("/geo_points/<int:geo_point_id>")
+def geo_point(geo_point_id):
+    return cached_json(lambda: query_one("SELECT * FROM geo_points WHERE geo_point_id = ?", (geo_point_id,)))
+
+
+@app.route("/geo_points/<int:geo_point_id>/children")
+def geo_point_children(geo_point_id):
+    return cached_json(lambda: query_page(
+        "SELECT * FROM geo_points WHERE parent_id = ? AND geo_point_id > ? ORDER BY geo_point_id LIMIT ?",
+        'geo_point_id', (geo_point_id,)))
+
+
+@app.route("/commissions")
+def commissions():
+    return cached_json(lambda: query_page(
+        "SELECT * FROM commissions WHERE id > ? ORDER BY id LIMIT ?", 'id'))
+
+
+@app.route("/commissions/<int:commission_id>")
+def commission(commission_id):
+    return cached_json(lambda: query_one("SELECT * FROM commissions WHERE id = ?", (commission_id,)))
+
+
+@app.route("/commissions/<int:commission_id>/addresses")
+def commission_addresses(commission_id):
+    return cached_json(lambda: query_page(
+        "SELECT * FROM addresses WHERE commission_id = ? AND id > ? ORDER BY id LIMIT ?", 'id', (commission_id,)))
+
+
+@app.route("/addresses")
+def addresses():
+    return cached_json(lambda: query_page(
+        "SELECT * FROM addresses WHERE id > ? ORDER BY id LIMIT ?", 'id'))
+
+
+@app.route("/addresses/<int:address_id>")
+def address(address_id):
+    return cached_json(lambda: query_one("SELECT * FROM addresses WHERE id = ?", (address_id,)))
+
+
+@app.route("/search")
+def search():
+    query = request.args.get('q', '')
+    kind = request.args.get('kind') or None
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int), MAX_PAGE_SIZE))
+    return cached_json(lambda: {'items': [{'kind': row[0], 'id': row[1], 'title': row[2], 'rank': row[3]}
+                                          for row in db_search(None, query, kind, limit, get_connection())]})
+
+
+@app.route("/lookup")
+def lookup():
+    street = request.args.get('street', '')
+    building = request.args.get('building') or None
+    city = request.args.get('city') or None
+    # answers of old index (while the new one is being built) are cached under the old version
+    index, version = get_lookup().get_index()
+    return cached_json(lambda: index.lookup(street, building, city), '{}#{}'.format(request.full_path, version))
+
+
+@app.route("/rollups")
+def rollup_levels():
+    return cached_json(lambda: {'levels': sorted(ROLLUP_LEVELS)})
+
+
+# rollups of the level, may be filtered by parents (?city=...&territory_commission=...)
+@app.route("/rollups/<level>")
+def rollups(level):
+    if level not in ROLLUP_LEVELS:
+        abort(404)
+    select_sql = "SELECT * FROM people_rollups WHERE level = ?"
+    params = [level]
+    for parent in ('city', 'territory_commission'):
+        if parent in request.args:
+            select_sql += " AND {} = ?".format(parent)
+            params.append(request.args[parent])
+    return cached_json(lambda: query_page(select_sql + " AND id > ? ORDER BY id LIMIT ?", 'id', params))
+
+
+# one rollup, names of territory and sector commissions repeat - their parents are required
+# (?city=...&territory_commission=..., missing parent is empty)
+@app.route("/rollups/<level>/<path:name>")
+def rollup(level, name):
+    city = request.args.get('city', '')
+    territory_commission = request.args.get('territory_commission', '')
+    return cached_json(lambda: query_one("SELECT * FROM people_rollups WHERE level = ? AND city = ? AND "
+                                         "territory_commission = ? AND name = ?",
+                                         (level, city, territory_commission, name)))
 
 
 if __name__ == '__main__':
+    db_create_indexes(app.config['GEO_DB'])  # api needs indexes for children/addresses lookups
+    db_create_search_index(app.config['GEO_DB'])
+    db_create_rollups(app.config['GEO_DB'])
     app.run(port=5000, debug=True)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+    Load test for geo web application. Creates synthetic geo db (geo points tree, commissions, addresses),
+    performs requests to the read API (in-process, with flask test client) from several threads and reports
+    latency percentiles (p50/p99) and throughput (requests/sec).
+
+    Usage: python geoweb_loadtest.py [--requests 20000] [--threads 4] [--cache-size 4096]
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+import sqlite3 as sql
+from geodb import db_create, db_create_search_index
+import geoweb
+
+# synthetic db size
+POINTS_COUNT = 100000
+POINTS_FAN_OUT = 20
+COMMISSIONS_COUNT = 20000
+ADDRESSES_PER_COMMISSION = 10
+STREET_NAMES = ['Ленина', 'Гагарина', 'Пушкина', 'Кирова', 'Садовая', 'Московский', 'Невский', 'Лесная', 'Советская',
+                'Школьная', 'Мира', 'Победы', 'Заречная', 'Полевая', 'Новая', 'Строителей', 'Молодежная', 'Ёлкина']
+STREET_TYPES = ['ул.', 'пр.', 'пер.', 'наб.', 'ш.', 'б-р']
+SEARCH_QUERIES = ['невский пр', 'Ленина', 'ул. Ёлкина 12', 'УИК 1234', 'комиссия №55', 'мира 3', 'гагарин',
+                  'пер. Садовая', 'Участковая', 'строителей 40']
+
+
+def create_synthetic_db(dbname, points_count=POINTS_COUNT, commissions_count=COMMISSIONS_COUNT):
+    """ Create db and fill it with generated data. """
+    db_create(dbname)
+    connection = sql.connect(dbname)
+    with connection:
+        connection.executemany(
+            "INSERT INTO geo_points(geo_point_id, id, intid, cik_text, levelid, children, parent_id, processed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 1)",
+            ((i, 1000000 + i, i, 'Участковая избирательная комиссия №{}'.format(i), min(i // POINTS_FAN_OUT, 4),
+              'True', i // POINTS_FAN_OUT) for i in range(1, points_count + 1)))
+        connection.executemany(
+            "INSERT INTO commissions(id, city, territory_commission, sector_commission, people_count) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((i, 'Город {}'.format(i % 50), 'ТИК №{}'.format(i % 300), i, random.randint(500, 3000))
+             for i in range(1, commissions_count + 1)))
+        connection.executemany(
+            "INSERT INTO addresses(street, buildings, commission_id) VALUES (?, ?, ?)",
+            (('{} {} {}'.format(STREET_TYPES[i % len(STREET_TYPES)], i % 300, STREET_NAMES[i % len(STREET_NAMES)]),
+              '{}, {}к1'.format(i % 100, i % 100), i // ADDRESSES_PER_COMMISSION + 1)
+             for i in range(commissions_count * ADDRESSES_PER_COMMISSION)))
+    connection.close()
+    db_create_search_index(dbname, rebuild=True)
+
+
+def random_url(points_count, commissions_count):
+    """ Generate random request url (mix of single items, children and pages). """
+    kind = random.randint(0, 6)
+    if kind == 0:
+        return '/geo_points/{}'.format(random.randint(1, points_count))
+    elif kind == 1:
+        return '/geo_points/{}/children'.format(random.randint(0, points_count // POINTS_FAN_OUT))
+    elif kind == 2:
+        return '/commissions/{}'.format(random.randint(1, commissions_count))
+    elif kind == 3:
+        return '/commissions/{}/addresses'.format(random.randint(1, commissions_count))
+    elif kind == 5:
+        return '/search?q={}'.format(random.choice(SEARCH_QUERIES))
+    elif kind == 4:
+        return '/geo_points?after={}&limit=100'.format(random.randint(0, points_count))
+    return '/addresses?after={}&limit=100'.format(random.randint(0, commissions_count * ADDRESSES_PER_COMMISSION))
+
+
+def run_worker(requests_count, urls, latencies, errors):
+    """ Perform requests with own test client, collect latencies (seconds). """
+    client = geoweb.app.test_client()
+    for i in range(requests_count):
+        url = urls[random.randint(0, len(urls) - 1)]
+        start = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code not in (200, 304):
+            errors.append(url)
+
+
+def percentile(sorted_values, pct):
+    """ Nearest-rank percentile for the sorted list. """
+    index = max(0, int(round(pct / 100.0 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for geo web application.')
+    parser.add_argument('--requests', type=int, default=20000, help='total requests count')
+    parser.add_argument('--threads', type=int, default=4, help='concurrent clients count')
+    parser.add_argument('--cache-size', type=int, default=geoweb.CACHE_SIZE, help='LRU cache size, 0 - disabled')
+    parser.add_argument('--urls', type=int, default=2000, help='distinct urls count (working set)')
+    args = parser.parse_args()
+
+    dbname = os.path.join(tempfile.mkdtemp(), 'geodb_loadtest.sqlite')
+    print('Creating synthetic db [{}]...'.format(dbname))
+    create_synthetic_db(dbname)
+
+    geoweb.app.config['GEO_DB'] = dbname
+    geoweb.app.config['GEO_CACHE_SIZE'] = args.cache_size
+    urls = [random_url(POINTS_COUNT, COMMISSIONS_COUNT) for i in range(args.urls)]
+
+    latencies = []
+    errors = []
+    per_thread = args.requests // args.threads
+    threads = [threading.Thread(target=run_worker, args=(per_thread, urls, latencies, errors))
+               for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    cache = geoweb.get_cache()
+    print('requests: {}, threads: {}, errors: {}'.format(len(latencies), args.threads, len(errors)))
+    print('p50: {:.3f} ms, p99: {:.3f} ms'.format(percentile(latencies, 50) * 1000,
+                                                  percentile(latencies, 99) * 1000))
+    print('throughput: {:.0f} requests/sec'.format(len(latencies) / elapsed))
+    print('cache: hits {}, misses {}'.format(cache.hits, cache.misses))
+
+
+if __name__ == '__main__':
+    main()